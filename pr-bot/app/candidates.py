@@ -8,65 +8,94 @@ from __future__ import annotations
 
 import re
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
 
+from .metrics import timed
 from .models import Candidate
 from .path_utils import safe_relpath
 
 
+TODO_RE = re.compile(r"\b(todo|fixme|hack)\b", re.IGNORECASE)
+BARE_EXCEPT_RE = re.compile(r"^\s*except\s*:\s*(#.*)?$", re.MULTILINE)
+SHELL_TRUE_RE = re.compile(r"shell\s*=\s*True")
+LUA_GLOBAL_RE = re.compile(r"^\s*[A-Za-z_]\w*\s*=\s*.*$", re.MULTILINE)
+
+# evidence kept per file and kind; candidates only ever use the first few overall
+PER_FILE_CAP = {"todo": 6, "lua_todo": 12, "lua_globals": 6}
+
+Findings = dict[str, list[dict[str, Any]]]
+
+
+def scan_file(f: Path, repo_path: Path) -> Findings:
+    """
+    evidence found in one file, by kind. only non-empty kinds are present.
+    """
+    suffix = f.suffix.lower()
+    if suffix not in (".py", ".lua"):
+        return {}
+    try:
+        text = f.read_text(encoding="utf-8", errors="ignore")
+    except Exception:
+        return {}
+
+    rel = safe_relpath(f, repo_path)
+    found: Findings = {}
+
+    def add(kind: str, line: int, end: int, why: str) -> bool:
+        # true once the kind is full for this file
+        items = found.setdefault(kind, [])
+        items.append({"path": rel, "start": line, "end": end, "why": why})
+        return len(items) >= PER_FILE_CAP.get(kind, 1)
+
+    if suffix == ".py":
+        for m in TODO_RE.finditer(text):
+            line = text[: m.start()].count("\n") + 1
+            if add("todo", line, line, "todo/fixme/hack marker"):
+                break
+
+        m = BARE_EXCEPT_RE.search(text)
+        if m:
+            line = text[: m.start()].count("\n") + 1
+            add("except", line, line + 2, "bare except")
+
+        m = SHELL_TRUE_RE.search(text)
+        if m:
+            line = text[: m.start()].count("\n") + 1
+            add("shell", line, line + 3, "subprocess shell=True")
+
+    if suffix == ".lua":
+        for m in TODO_RE.finditer(text):
+            line = text[: m.start()].count("\n") + 1
+            if add("lua_todo", line, line, "todo/fixme/hack marker (lua)"):
+                break
+
+        for m in LUA_GLOBAL_RE.finditer(text):
+            if m.group(0).lstrip().startswith("local "):
+                continue
+            line = text[: m.start()].count("\n") + 1
+            if add("lua_globals", line, line, "possible implicit global assignment"):
+                break
+
+    return found
+
+
+@timed("grep_candidates")
 def grep_candidates(files: list[Path], repo_path: Path) -> list[Candidate]:
-    todo_re = re.compile(r"\b(todo|fixme|hack)\b", re.IGNORECASE)
-    bare_except_re = re.compile(r"^\s*except\s*:\s*(#.*)?$", re.MULTILINE)
-    shell_true_re = re.compile(r"shell\s*=\s*True")
-    lua_global_re = re.compile(r"^\s*[A-Za-z_]\w*\s*=\s*.*$", re.MULTILINE)
+    return build_candidates(scan_file(f, repo_path) for f in files)
+
 
+def build_candidates(findings: Iterable[Findings]) -> list[Candidate]:
+    """
+    aggregates per-file findings, in file order, into candidates.
+    """
     cands: list[Candidate] = []
+    evid: dict[str, list[dict[str, Any]]] = {"todo": [], "lua_todo": [], "except": [], "shell": [], "lua_globals": []}
+    for found in findings:
+        for kind, items in found.items():
+            evid[kind].extend(items)
 
-    evid_todo: list[dict[str, Any]] = []
-    evid_lua_todo: list[dict[str, Any]] = []
-    evid_except: list[dict[str, Any]] = []
-    evid_shell: list[dict[str, Any]] = []
-    evid_lua_globals: list[dict[str, Any]] = []
-
-    for f in files:
-        suffix = f.suffix.lower()
-        try:
-            text = f.read_text(encoding="utf-8", errors="ignore")
-        except Exception:
-            continue
-
-        if suffix == ".py":
-            for m in todo_re.finditer(text):
-                line = text[: m.start()].count("\n") + 1
-                evid_todo.append({"path": safe_relpath(f, repo_path), "start": line, "end": line, "why": "todo/fixme/hack marker"})
-                if len(evid_todo) >= 6:
-                    break
-
-            m = bare_except_re.search(text)
-            if m:
-                line = text[: m.start()].count("\n") + 1
-                evid_except.append({"path": safe_relpath(f, repo_path), "start": line, "end": line + 2, "why": "bare except"})
-
-            m = shell_true_re.search(text)
-            if m:
-                line = text[: m.start()].count("\n") + 1
-                evid_shell.append({"path": safe_relpath(f, repo_path), "start": line, "end": line + 3, "why": "subprocess shell=True"})
-
-        if suffix == ".lua":
-            for m in todo_re.finditer(text):
-                line = text[: m.start()].count("\n") + 1
-                evid_lua_todo.append({"path": safe_relpath(f, repo_path), "start": line, "end": line, "why": "todo/fixme/hack marker (lua)"})
-                if len(evid_lua_todo) >= 12:
-                    break
-
-            for m in lua_global_re.finditer(text):
-                line_txt = m.group(0)
-                if line_txt.lstrip().startswith("local "):
-                    continue
-                line = text[: m.start()].count("\n") + 1
-                evid_lua_globals.append({"path": safe_relpath(f, repo_path), "start": line, "end": line, "why": "possible implicit global assignment"})
-                if len(evid_lua_globals) >= 6:
-                    break
+    evid_todo, evid_lua_todo = evid["todo"], evid["lua_todo"]
+    evid_except, evid_shell, evid_lua_globals = evid["except"], evid["shell"], evid["lua_globals"]
 
     if evid_except:
         cands.append(Candidate(
@@ -3,53 +3,131 @@ config_store.py
 
 persistent config wrapper
 
-TODO:
-- atomic writes
+reads are served from memory and only re-parse repos.json when its
+mtime/size/inode change. writes go to a temp file in the same directory and are
+renamed into place, so readers never see torn json. read-modify-write cycles
+(update/upsert/delete) hold an fcntl lock on a sidecar .lock file, which keeps
+concurrent uvicorn workers from losing each other's updates.
 """
 
 from __future__ import annotations
 
+import copy
+import fcntl
 import json
-from dataclasses import dataclass
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator
 
 from fastapi import HTTPException
 
 
-@dataclass(frozen=True)
 class ConfigStore:
-    path: Path
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp: tuple[int, int, int] | None = None
+        self._cfg: dict[str, Any] = {"repos": {}}
+
+    def _stat(self) -> tuple[int, int, int] | None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _read(self, force: bool = False) -> dict[str, Any]:
+        # the cached dict itself; callers copy before handing it out
+        with self._lock:
+            stamp = self._stat()
+            if stamp is None:
+                self._stamp, self._cfg = None, {"repos": {}}
+            elif force or stamp != self._stamp:
+                self._cfg = json.loads(self.path.read_text(encoding="utf-8"))
+                self._stamp = stamp
+            return self._cfg
 
     def load(self) -> dict[str, Any]:
-        if not self.path.exists():
-            return {"repos": {}}
-        return json.loads(self.path.read_text(encoding="utf-8"))
+        return copy.deepcopy(self._read())
 
-    def save(self, cfg: dict[str, Any]) -> None:
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.path.write_text(json.dumps(cfg, indent=2), encoding="utf-8")
+        lock_path = self.path.with_name(self.path.name + ".lock")
+        with open(lock_path, "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _write(self, cfg: dict[str, Any]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(self.path.parent), prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(json.dumps(cfg, indent=2))
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._cfg = copy.deepcopy(cfg)
+            self._stamp = self._stat()
+
+    def save(self, cfg: dict[str, Any]) -> None:
+        with self._locked():
+            self._write(cfg)
+
+    def update(self, fn: Callable[[dict[str, Any]], Any]) -> Any:
+        """
+        locked read-modify-write: fn mutates a fresh copy of the config, which is then saved.
+        returns whatever fn returns; an exception from fn leaves the file untouched.
+        """
+        with self._locked():
+            # re-read under the lock; another worker may have written within our mtime granularity
+            cfg = copy.deepcopy(self._read(force=True))
+            out = fn(cfg)
+            self._write(cfg)
+            return out
 
     def get_repo(self, name: str) -> dict[str, Any]:
-        cfg = self.load()
-        repo = cfg.get("repos", {}).get(name)
+        repo = self._read().get("repos", {}).get(name)
         if not repo:
             raise HTTPException(status_code=404, detail=f"unknown repo: {name}")
-        return repo
+        return copy.deepcopy(repo)
 
     def upsert_repo(self, name: str, repo_cfg: dict[str, Any]) -> None:
-        cfg = self.load()
-        cfg.setdefault("repos", {})
-        cfg["repos"][name] = repo_cfg
-        self.save(cfg)
+        def apply(cfg: dict[str, Any]) -> None:
+            cfg.setdefault("repos", {})[name] = repo_cfg
+
+        self.update(apply)
+
+    def update_repo(self, name: str, fn: Callable[[dict[str, Any]], None]) -> dict[str, Any]:
+        """
+        locked read-modify-write of one repo entry; returns the updated entry.
+        """
+        def apply(cfg: dict[str, Any]) -> dict[str, Any]:
+            repo = cfg.get("repos", {}).get(name)
+            if not repo:
+                raise HTTPException(status_code=404, detail=f"unknown repo: {name}")
+            fn(repo)
+            return copy.deepcopy(repo)
+
+        return self.update(apply)
 
     def delete_repo(self, name: str) -> None:
-        cfg = self.load()
-        if name not in cfg.get("repos", {}):
-            raise HTTPException(status_code=404, detail=f"unknown repo: {name}")
-        del cfg["repos"][name]
-        self.save(cfg)
+        def apply(cfg: dict[str, Any]) -> None:
+            if name not in cfg.get("repos", {}):
+                raise HTTPException(status_code=404, detail=f"unknown repo: {name}")
+            del cfg["repos"][name]
+
+        self.update(apply)
 
     def list_repos(self) -> dict[str, Any]:
-        cfg = self.load()
-        return cfg.get("repos", {})
+        return copy.deepcopy(self._read().get("repos", {}))
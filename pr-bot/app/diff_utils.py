@@ -2,27 +2,211 @@
 diff_utils.py
 
 sanitize and analyze patch diffs
+
+diffs are parsed once into a ParsedDiff (files, hunks, added/removed lines) and
+every guard consumes that structure. hunk headers are checked against their
+bodies in-process so malformed diffs never reach git or a worktree.
 """
 
 from __future__ import annotations
 
 import re
+from dataclasses import dataclass, field
 from pathlib import Path
+from fastapi import HTTPException
+
 from .path_utils import safe_relpath
 
 
-def _diff_touched_files(diff: str) -> set[str]:
-    files: set[str] = set()
-    for line in diff.splitlines():
+DIFF_GIT_RE = re.compile(r"^diff --git a/(.+?) b/(.+)$")
+HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+
+@dataclass
+class DiffHunk:
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+    section: str = ""
+    # body lines keep their ' ', '+', '-' or '\' prefix; blank context lines are normalized to ' '
+    lines: list[str] = field(default_factory=list)
+
+    @property
+    def added(self) -> list[str]:
+        return [ln[1:] for ln in self.lines if ln.startswith("+")]
+
+    @property
+    def removed(self) -> list[str]:
+        return [ln[1:] for ln in self.lines if ln.startswith("-")]
+
+    def header(self) -> str:
+        return f"@@ -{self.old_start},{self.old_count} +{self.new_start},{self.new_count} @@{self.section}"
+
+
+@dataclass
+class DiffFile:
+    old_path: str
+    new_path: str
+    # extended header lines between 'diff --git' and the first hunk ('--- a/x', 'new file mode', ...)
+    headers: list[str] = field(default_factory=list)
+    hunks: list[DiffHunk] = field(default_factory=list)
+
+    @property
+    def is_new(self) -> bool:
+        return "--- /dev/null" in self.headers
+
+    @property
+    def is_deleted(self) -> bool:
+        return "+++ /dev/null" in self.headers
+
+
+@dataclass
+class ParsedDiff:
+    text: str
+    files: list[DiffFile] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    bad_headers: list[str] = field(default_factory=list)
+    has_index_line: bool = False
+
+    @property
+    def touched_paths(self) -> set[str]:
+        return {f.new_path for f in self.files}
+
+    @property
+    def added_lines(self) -> list[str]:
+        return [ln for f in self.files for h in f.hunks for ln in h.added]
+
+    @property
+    def removed_lines(self) -> list[str]:
+        return [ln for f in self.files for h in f.hunks for ln in h.removed]
+
+    @property
+    def is_empty(self) -> bool:
+        return not any(f.hunks for f in self.files)
+
+    def compact(self) -> str:
+        """
+        canonical rendering: no index lines, recomputed hunk headers, normalized context lines.
+        two diffs that apply identically render the same, which makes it a stable hash input.
+        """
+        out: list[str] = []
+        for f in self.files:
+            out.append(f"diff --git a/{f.old_path} b/{f.new_path}")
+            out.extend(h for h in f.headers if not h.startswith("index "))
+            for h in f.hunks:
+                out.append(h.header())
+                out.extend(h.lines)
+        return "\n".join(out) + "\n" if out else ""
+
+
+def parse_diff(diff: str) -> ParsedDiff:
+    """
+    single linear pass over a unified git diff.
+    structural problems are collected in .errors rather than raised so callers choose the response.
+    """
+    parsed = ParsedDiff(text=diff)
+    cur: DiffFile | None = None
+    hunk: DiffHunk | None = None
+    old_left = new_left = 0
+
+    def close_hunk() -> None:
+        if hunk is not None and (old_left or new_left):
+            parsed.errors.append(
+                f"{cur.new_path}: hunk {hunk.header()} is truncated "
+                f"({hunk.old_count - old_left}/{hunk.old_count} old, {hunk.new_count - new_left}/{hunk.new_count} new lines present)"
+            )
+
+    for lineno, line in enumerate(diff.splitlines(), start=1):
         if line.startswith("diff --git "):
-            m = re.match(r"diff --git a/(.+?) b/(.+)$", line)
-            if m:
-                files.add(m.group(2))
-    return files
+            close_hunk()
+            hunk = None
+            m = DIFF_GIT_RE.match(line)
+            if not m:
+                parsed.errors.append(f"line {lineno}: malformed diff header: {line[:200]}")
+                parsed.bad_headers.append(line)
+                cur = None
+                continue
+            cur = DiffFile(old_path=m.group(1), new_path=m.group(2))
+            parsed.files.append(cur)
+            continue
+
+        if hunk is not None and (old_left or new_left):
+            tag = line[:1]
+            if line == "" or tag == " ":
+                hunk.lines.append(line or " ")
+                old_left -= 1
+                new_left -= 1
+            elif tag == "-":
+                hunk.lines.append(line)
+                old_left -= 1
+            elif tag == "+":
+                hunk.lines.append(line)
+                new_left -= 1
+            elif tag == "\\":
+                hunk.lines.append(line)
+                continue
+            else:
+                close_hunk()
+                hunk = None
+                # fall through so the line is handled as a header / stray line
+            if hunk is not None:
+                if old_left < 0 or new_left < 0:
+                    parsed.errors.append(f"{cur.new_path}: hunk {hunk.header()} has more lines than its header declares")
+                    old_left = max(old_left, 0)
+                    new_left = max(new_left, 0)
+                continue
+
+        if line.startswith("\\") and hunk is not None:
+            hunk.lines.append(line)
+            continue
+
+        m = HUNK_RE.match(line)
+        if m:
+            if cur is None:
+                parsed.errors.append(f"line {lineno}: hunk outside of a file section")
+                continue
+            hunk = DiffHunk(
+                old_start=int(m.group(1)),
+                old_count=int(m.group(2)) if m.group(2) is not None else 1,
+                new_start=int(m.group(3)),
+                new_count=int(m.group(4)) if m.group(4) is not None else 1,
+                section=m.group(5),
+            )
+            cur.hunks.append(hunk)
+            old_left, new_left = hunk.old_count, hunk.new_count
+            continue
+
+        if line.startswith("index "):
+            parsed.has_index_line = True
+
+        if not line.strip():
+            continue
+
+        if cur is not None and not cur.hunks:
+            cur.headers.append(line)
+            continue
+
+        # other trailing prose is ignored, as git apply does
+        if line[:1] in "+- ":
+            where = f"{cur.new_path}: " if cur is not None else ""
+            parsed.errors.append(f"{where}line {lineno} is outside any hunk (hunk header line counts are wrong?)")
+            hunk = None
 
+    close_hunk()
+    return parsed
 
-def _diff_files_exist(repo_root: Path, diff: str) -> tuple[bool, str]:
-    for rel in _diff_touched_files(diff):
+
+def _as_parsed(diff: str | ParsedDiff) -> ParsedDiff:
+    return diff if isinstance(diff, ParsedDiff) else parse_diff(diff)
+
+
+def _diff_touched_files(diff: str | ParsedDiff) -> set[str]:
+    return _as_parsed(diff).touched_paths
+
+
+def _diff_files_exist(repo_root: Path, diff: str | ParsedDiff) -> tuple[bool, str]:
+    for rel in sorted(_diff_touched_files(diff)):
         p = (repo_root / rel).resolve()
         try:
             safe_relpath(p, repo_root)  # ensures within repo
@@ -43,36 +227,19 @@ def strip_to_unified_diff(text: str) -> str:
     return text.strip() + "\n"
 
 
-def estimate_diff_churn(diff: str) -> tuple[int, int, int]:
-    files = set()
-    added = 0
-    removed = 0
+def estimate_diff_churn(diff: str | ParsedDiff) -> tuple[int, int, int]:
+    parsed = _as_parsed(diff)
+    return len(parsed.touched_paths), len(parsed.added_lines), len(parsed.removed_lines)
 
-    for line in diff.splitlines():
-        if line.startswith("diff --git "):
-            m = re.match(r"diff --git a/(.+?) b/(.+)$", line)
-            if m:
-                files.add(m.group(2))
 
-        if line.startswith("+++ ") or line.startswith("--- "):
-            continue
-        if line.startswith("+") and not line.startswith("+++"):
-            added += 1
-        elif line.startswith("-") and not line.startswith("---"):
-            removed += 1
-
-    return len(files), added, removed
-
-
-def diff_paths_are_safe(diff: str) -> bool:
-    for line in diff.splitlines():
-        if line.startswith("diff --git "):
-            m = re.match(r"diff --git a/(.+?) b/(.+)$", line)
-            if not m:
+def diff_paths_are_safe(diff: str | ParsedDiff) -> bool:
+    parsed = _as_parsed(diff)
+    if parsed.bad_headers:
+        return False
+    for f in parsed.files:
+        for p in (f.old_path, f.new_path):
+            if p.startswith("/") or p.startswith("\\"):
+                return False
+            if ".." in Path(p).parts:
                 return False
-            for p in (m.group(1), m.group(2)):
-                if p.startswith("/") or p.startswith("\\"):
-                    return False
-                if ".." in Path(p).parts:
-                    return False
     return True
@@ -0,0 +1,171 @@
+"""
+hunk_apply.py
+
+pure-python hunk matcher: checks that a parsed diff applies to the files in the
+original repo before any worktree is created.
+
+hunks are located at their declared line first, then searched outward up to
+max_offset lines. with fuzz > 0 up to that many leading/trailing context lines
+may be dropped, like `patch --fuzz`. a failed match reports the exact context
+line that differs so it can be handed back to the model.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from .diff_utils import DiffFile, DiffHunk, ParsedDiff
+
+
+class HunkMismatch(Exception):
+    pass
+
+
+@dataclass
+class ApplyCheck:
+    ok: bool
+    error: str = ""
+    # smallest number of context lines that had to match on either side of a hunk;
+    # lets `git apply -C<n>` accept the same fuzz the in-process check did
+    min_context: int | None = None
+    # patched file contents by repo-relative path
+    contents: dict[str, list[str]] | None = None
+
+
+def _blocks(hunk: DiffHunk) -> tuple[list[str], list[str], int, int]:
+    old: list[str] = []
+    new: list[str] = []
+    for ln in hunk.lines:
+        tag, body = ln[:1], ln[1:]
+        if tag == " ":
+            old.append(body)
+            new.append(body)
+        elif tag == "-":
+            old.append(body)
+        elif tag == "+":
+            new.append(body)
+
+    lead = 0
+    for ln in hunk.lines:
+        if not ln.startswith(" "):
+            break
+        lead += 1
+    trail = 0
+    for ln in reversed(hunk.lines):
+        if ln.startswith("\\"):
+            continue
+        if not ln.startswith(" "):
+            break
+        trail += 1
+    return old, new, lead, trail
+
+
+def _matches_at(lines: list[str], block: list[str], pos: int) -> bool:
+    if pos < 0 or pos + len(block) > len(lines):
+        return False
+    return lines[pos:pos + len(block)] == block
+
+
+def _describe_mismatch(path: str, hunk: DiffHunk, lines: list[str], old: list[str], pos: int) -> str:
+    head = f"{path}: hunk {hunk.header()} does not apply"
+    if pos >= len(lines) and old:
+        return f"{head}: it starts at line {pos + 1} but the file has {len(lines)} lines"
+    for i, want in enumerate(old):
+        at = pos + i
+        if at >= len(lines):
+            return f"{head}: hunk line {i + 1} expects {want!r} past end of file (file has {len(lines)} lines)"
+        if lines[at] != want:
+            msg = f"{head}: hunk line {i + 1} expects {want!r} but file line {at + 1} is {lines[at]!r}"
+            # pointing at the real location helps a retry prompt more than the bare mismatch
+            hits = [n + 1 for n, ln in enumerate(lines) if ln == want][:3]
+            if hits:
+                msg += f" (expected text appears at line {', '.join(map(str, hits))})"
+            return msg
+    return head
+
+
+def _apply_file_hunks(path: str, lines: list[str], hunks: list[DiffHunk], fuzz: int, max_offset: int) -> tuple[list[str], int | None]:
+    out = list(lines)
+    delta = 0
+    min_context: int | None = None
+
+    for hunk in hunks:
+        old, new, lead, trail = _blocks(hunk)
+        expected = max(hunk.old_start - 1, 0) + delta
+        if hunk.old_count == 0:
+            # pure insertion: old_start names the line after which to insert
+            expected = hunk.old_start + delta
+
+        found: tuple[int, int, int] | None = None
+        for f in range(0, fuzz + 1):
+            cut_lead = min(f, lead)
+            cut_trail = min(f, trail)
+            block = old[cut_lead:len(old) - cut_trail]
+            base = expected + cut_lead
+            for off in range(0, max_offset + 1):
+                for pos in ((base,) if off == 0 else (base - off, base + off)):
+                    if _matches_at(out, block, pos):
+                        found = (pos - cut_lead, cut_lead, cut_trail)
+                        break
+                if found:
+                    break
+            if found:
+                break
+
+        if found is None:
+            raise HunkMismatch(_describe_mismatch(path, hunk, out, old, expected))
+
+        start, cut_lead, cut_trail = found
+        keep_new = new[cut_lead:len(new) - cut_trail]
+        span = len(old) - cut_lead - cut_trail
+        out[start + cut_lead:start + cut_lead + span] = keep_new
+        delta += len(new) - len(old) + (start - expected)
+
+        used = min(lead - cut_lead, trail - cut_trail)
+        if cut_lead or cut_trail:
+            min_context = used if min_context is None else min(min_context, used)
+
+    return out, min_context
+
+
+def _inside(repo_root: Path, rel: str) -> Path:
+    # resolved, so traversal, absolute paths and symlinks out of the repo are all caught;
+    # the error names only the diff path, never what is (or isn't) on disk outside the repo
+    root = repo_root.resolve()
+    p = (root / rel).resolve()
+    if not p.is_relative_to(root):
+        raise HunkMismatch(f"{rel}: path is outside the repo")
+    return p
+
+
+def _apply_file(repo_root: Path, f: DiffFile, fuzz: int, max_offset: int) -> tuple[list[str], int | None]:
+    p = _inside(repo_root, f.old_path)
+    _inside(repo_root, f.new_path)
+    if f.is_new:
+        if p.exists():
+            raise HunkMismatch(f"{f.new_path}: diff creates a file that already exists")
+        lines: list[str] = []
+    else:
+        try:
+            lines = p.read_text(encoding="utf-8", errors="surrogateescape").splitlines()
+        except OSError as e:
+            raise HunkMismatch(f"{f.old_path}: cannot read file: {e}") from e
+
+    return _apply_file_hunks(f.new_path, lines, f.hunks, fuzz, max_offset)
+
+
+def check_diff_applies(repo_root: Path, parsed: ParsedDiff, fuzz: int = 0, max_offset: int = 200) -> ApplyCheck:
+    contents: dict[str, list[str]] = {}
+    min_context: int | None = None
+    for f in parsed.files:
+        if not f.hunks:
+            continue
+        try:
+            out, used = _apply_file(repo_root, f, fuzz, max_offset)
+        except HunkMismatch as e:
+            return ApplyCheck(ok=False, error=str(e))
+        contents[f.new_path] = out
+        if used is not None:
+            min_context = used if min_context is None else min(min_context, used)
+    return ApplyCheck(ok=True, min_context=min_context, contents=contents)
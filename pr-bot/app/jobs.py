@@ -0,0 +1,234 @@
+"""
+jobs.py
+
+background job queue for the long-running routes (/candidate/patch, /validate).
+
+submitting returns a job id right away; a fixed pool of JOB_WORKERS threads runs
+queued jobs by priority (high before normal before low, fifo within a priority).
+jobs report progress per stage (scan, context, generate, apply, validate) as an
+event log that the status and sse endpoints read. cancelling a queued job drops
+it; cancelling a running job sets its cancel event, which the patch pipeline,
+ollama streaming and validation commands all watch. finished jobs are kept
+(bounded by JOB_MAX_FINISHED) so their result can be fetched later.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from fastapi import HTTPException
+
+from .llm_ollama import GenerationCancelled
+
+log = logging.getLogger(__name__)
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class JobCancelled(GenerationCancelled):
+    """raised inside a job function when its cancel event is set between stages."""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    priority: str
+    fn: Callable[[Job], Any]
+    status: str = "queued"
+    stage: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: Any = None
+    error: dict[str, Any] | None = None
+    events: list[dict[str, Any]] = field(default_factory=list)
+    cancel: threading.Event = field(default_factory=threading.Event)
+    done: threading.Event = field(default_factory=threading.Event)
+    _callbacks: list[Callable[[], None]] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def finished(self) -> bool:
+        return self.done.is_set()
+
+    def progress(self, stage: str, data: dict[str, Any] | None = None) -> None:
+        """
+        record that the job entered `stage`; raises JobCancelled if it was cancelled meanwhile.
+        """
+        if self.cancel.is_set():
+            raise JobCancelled()
+        with self._lock:
+            self.stage = stage
+            self.events.append({"seq": len(self.events), "ts": round(time.time(), 3), "stage": stage, **(data or {})})
+
+    def events_since(self, seq: int) -> list[dict[str, Any]]:
+        with self._lock:
+            return self.events[seq:]
+
+    def _finish(self, status: str, result: Any = None, error: dict[str, Any] | None = None) -> None:
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self.events.append({"seq": len(self.events), "ts": round(self.finished_at, 3), "stage": "done", "status": status})
+            callbacks, self._callbacks = self._callbacks, []
+        self.done.set()
+        for cb in callbacks:
+            cb()
+
+    def add_done_callback(self, cb: Callable[[], None]) -> None:
+        with self._lock:
+            if not self.done.is_set():
+                self._callbacks.append(cb)
+                return
+        cb()
+
+    async def wait_async(self) -> None:
+        """
+        wait for the job without holding a threadpool worker.
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def wake() -> None:
+            try:
+                loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(None))
+            except RuntimeError:
+                # the waiter gave up (client disconnected) and its loop is gone
+                pass
+
+        self.add_done_callback(wake)
+        await fut
+
+    def outcome(self) -> Any:
+        """
+        the job's result, or the HTTPException the synchronous route would have raised.
+        """
+        if not self.finished:
+            raise HTTPException(status_code=409, detail=f"job {self.id} is {self.status}")
+        if self.status == "cancelled":
+            raise HTTPException(status_code=409, detail=f"job {self.id} was cancelled")
+        if self.error is not None:
+            raise HTTPException(status_code=self.error["status_code"], detail=self.error["detail"])
+        return self.result
+
+    def info(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "priority": self.priority,
+                "status": self.status,
+                "stage": self.stage,
+                "created_at": round(self.created_at, 3),
+                "started_at": round(self.started_at, 3) if self.started_at else None,
+                "finished_at": round(self.finished_at, 3) if self.finished_at else None,
+                "queue_wait_s": round((self.started_at or time.time()) - self.created_at, 3),
+                "error": self.error,
+                "events": len(self.events),
+            }
+
+
+class JobQueue:
+    def __init__(self, workers: int, max_finished: int) -> None:
+        self.workers = workers
+        self.max_finished = max_finished
+        self._cond = threading.Condition()
+        self._heap: list[tuple[int, int, Job]] = []
+        self._seq = itertools.count()
+        self._jobs: dict[str, Job] = {}
+        self._finished: list[str] = []
+        self._threads: list[threading.Thread] = []
+        self._running = 0
+
+    def _ensure_workers(self) -> None:
+        # caller holds the lock; threads start on first use so importing the app stays cheap
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._worker, name=f"job-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def submit(self, kind: str, fn: Callable[[Job], Any], priority: str = "normal") -> Job:
+        if priority not in PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"unknown priority: {priority} (use {', '.join(PRIORITIES)})")
+        job = Job(id=uuid.uuid4().hex, kind=kind, priority=priority, fn=fn)
+        with self._cond:
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._seq), job))
+            self._ensure_workers()
+            self._cond.notify()
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._cond:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"unknown job: {job_id}")
+        return job
+
+    def cancel(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        job.cancel.set()
+        with self._cond:
+            queued = job.status == "queued"
+            if queued:
+                job.status = "cancelling"
+        if queued:
+            # still in the heap; the worker that pops it skips it
+            self._retire(job, "cancelled")
+        return job
+
+    def _retire(self, job: Job, status: str, result: Any = None, error: dict[str, Any] | None = None) -> None:
+        job._finish(status, result, error)
+        with self._cond:
+            self._finished.append(job.id)
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.pop(0), None)
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if job.finished or job.cancel.is_set():
+                    continue
+                job.status = "running"
+                job.started_at = time.time()
+                self._running += 1
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._running -= 1
+
+    def _run(self, job: Job) -> None:
+        try:
+            result = job.fn(job)
+        except GenerationCancelled:
+            self._retire(job, "cancelled")
+        except HTTPException as e:
+            status = "cancelled" if job.cancel.is_set() else "failed"
+            self._retire(job, status, error={"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            log.exception("job %s (%s) failed", job.id, job.kind)
+            self._retire(job, "failed", error={"status_code": 500, "detail": f"{type(e).__name__}: {e}"})
+        else:
+            self._retire(job, "cancelled" if job.cancel.is_set() else "succeeded", result=result)
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            by_status: dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {"workers": self.workers, "queued": len(self._heap), "running": self._running, "jobs": by_status}
@@ -7,47 +7,103 @@ keeps http and model-specific behavior out of routes.
 
 from __future__ import annotations
 
+import json
 import re
+import threading
 
 import httpx
 from fastapi import HTTPException
 
+from .metrics import OLLAMA_REQUESTS, record_ollama, timed
 from .settings import OLLAMA_BASE_URL, OLLAMA_MODEL
+from .diff_utils import ParsedDiff, parse_diff
 
 
-def ollama_generate(prompt: str) -> str:
+LUA_CALL_RE = re.compile(r"\b(dofile|require)\s*\(\s*(['\"])(.+?)\2\s*\)")
+
+
+class GenerationCancelled(Exception):
+    """raised when a streaming generation is abandoned via its cancel event."""
+
+
+@timed("ollama_generate")
+def ollama_generate(
+    prompt: str,
+    temperature: float = 0.2,
+    seed: int | None = None,
+    cancel: threading.Event | None = None,
+) -> str:
+    try:
+        resp = _generate(prompt, temperature, seed, cancel)
+    except GenerationCancelled:
+        OLLAMA_REQUESTS.inc(1, "cancelled")
+        raise
+    except Exception:
+        OLLAMA_REQUESTS.inc(1, "error")
+        raise
+    OLLAMA_REQUESTS.inc(1, "ok")
+    return resp
+
+
+def _generate(prompt: str, temperature: float, seed: int | None, cancel: threading.Event | None) -> str:
     url = f"{OLLAMA_BASE_URL}/api/generate"
+    options: dict[str, object] = {
+        "temperature": temperature,
+        "num_predict": 800,
+    }
+    if seed is not None:
+        options["seed"] = seed
+
     payload = {
         "model": OLLAMA_MODEL,
         "prompt": prompt,
-        "stream": False,
-        "options": {
-            "temperature": 0.2,
-            "num_predict": 800,
-        },
+        # cancellable generations stream so we can drop the connection mid-way,
+        # which makes ollama stop generating for this request
+        "stream": cancel is not None,
+        "options": options,
     }
 
     timeout = httpx.Timeout(600.0, connect=10.0)
     with httpx.Client(timeout=timeout) as client:
-        r = client.post(url, json=payload)
-        if r.status_code != 200:
-            raise HTTPException(status_code=502, detail=f"ollama error {r.status_code}: {r.text[:500]}")
-        data = r.json()
+        if cancel is None:
+            r = client.post(url, json=payload)
+            if r.status_code != 200:
+                raise HTTPException(status_code=502, detail=f"ollama error {r.status_code}: {r.text[:500]}")
+            data = r.json()
+            resp = data.get("response")
+            record_ollama(data)
+        else:
+            parts: list[str] = []
+            with client.stream("POST", url, json=payload) as r:
+                if r.status_code != 200:
+                    r.read()
+                    raise HTTPException(status_code=502, detail=f"ollama error {r.status_code}: {r.text[:500]}")
+                for line in r.iter_lines():
+                    if cancel.is_set():
+                        raise GenerationCancelled()
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise HTTPException(status_code=502, detail=f"ollama error: {str(chunk['error'])[:500]}")
+                    parts.append(chunk.get("response", ""))
+                    if chunk.get("done"):
+                        # the final chunk carries the token counts and durations
+                        record_ollama(chunk)
+                        break
+            resp = "".join(parts)
 
-    resp = data.get("response")
     if not isinstance(resp, str) or not resp.strip():
         raise HTTPException(status_code=502, detail="ollama returned empty response")
     return resp
 
 
-def lua_reference_paths_exist(repo_root, diff: str) -> tuple[bool, str]:
-    call_re = re.compile(r"\b(dofile|require)\s*\(\s*(['\"])(.+?)\2\s*\)")
+def lua_reference_paths_exist(repo_root, diff: str | ParsedDiff) -> tuple[bool, str]:
+    parsed = diff if isinstance(diff, ParsedDiff) else parse_diff(diff)
     refs: list[tuple[str, str]] = []
 
-    for line in diff.splitlines():
-        if not line.startswith("+") or line.startswith("+++"):
-            continue
-        m = call_re.search(line)
+    for line in parsed.added_lines:
+        m = LUA_CALL_RE.search(line)
         if not m:
             continue
         refs.append((m.group(1), m.group(3)))
@@ -6,33 +6,72 @@ establishes fastapi routes
 
 from __future__ import annotations
 
+import asyncio
+import fnmatch
 import json
-import textwrap
 
+from contextlib import asynccontextmanager
 from typing import Any
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from .models import CandidatesRequest
 from pydantic import Field, BaseModel
 
 from .models import (
-    RepoSelectRequest, Policy, CandidatesResponse,
+    RepoSelectRequest, Policy, Candidate, CandidatesResponse,
     PatchRequest, PatchResponse,
     ValidateRequest, ValidateResponse,
-    RepoInfo,
+    JobSubmitResponse, RepoInfo, SweepRequest,
+)
+from .settings import (
+    REPO_ROOT, CONFIG_PATH, PREFETCH_TOP_K, PREFETCH_MAX_ENTRIES,
+    WORK_GC_INTERVAL_S, WORK_GC_MAX_AGE_S, WORK_GC_MAX_BYTES,
+    JOB_WORKERS, JOB_MAX_FINISHED,
+    SWEEP_WORKERS, SWEEP_REPO_TIMEOUT_S, SWEEP_REPO_MAX_FILES, SWEEP_REPO_MAX_BYTES,
+    WATCH_REPOS, WATCH_BACKEND, WATCH_DEBOUNCE_S, WATCH_POLL_S, WATCH_MAX_DIRS,
 )
-from .settings import REPO_ROOT, CONFIG_PATH
 from .config_store import ConfigStore
-from .repo_fs import iter_files, extract_context
+from .jobs import Job, JobQueue
+from .metrics import REGISTRY, Gauge, collect
+from .repo_fs import iter_files, scan_fingerprint
 from .candidates import grep_candidates
-from .diff_utils import strip_to_unified_diff, estimate_diff_churn, diff_paths_are_safe, _diff_files_exist, _diff_touched_files
-from .llm_ollama import ollama_generate, lua_reference_paths_exist
-from .worktree import make_worktree, apply_patch
-from .validate import validate_worktree
+from .diff_utils import diff_paths_are_safe, parse_diff
+from .patching import build_patch_context, check_applies, release_patch, sample_patches
+from .prefetch import PatchOptions, Prefetcher, prefetch_key
+from .worktree import apply_patch, source_manifest
+from .worktree_pool import POOL
+from .validate import cached_result, validate_worktree
+from .validate_cache import CACHE
+from .sandbox import VALIDATION_SLOTS
+from .step_logs import resolve_ref
+from .sweep import Sweeper, SweepTarget
+from .watcher import WatchManager, WatchSnapshot
 
 STORE = ConfigStore(CONFIG_PATH)
+PREFETCHER = Prefetcher(top_k=PREFETCH_TOP_K, max_entries=PREFETCH_MAX_ENTRIES)
+JOBS = JobQueue(workers=JOB_WORKERS, max_finished=JOB_MAX_FINISHED)
+SWEEPER = Sweeper(workers=SWEEP_WORKERS)
+WATCHERS = WatchManager(
+    enabled=WATCH_REPOS, backend=WATCH_BACKEND, debounce_s=WATCH_DEBOUNCE_S,
+    poll_s=WATCH_POLL_S, max_dirs=WATCH_MAX_DIRS,
+)
+# how often an sse stream checks its job for new events
+SSE_POLL_S = 0.25
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    POOL.start_gc(WORK_GC_INTERVAL_S, WORK_GC_MAX_AGE_S, WORK_GC_MAX_BYTES)
+    if WATCHERS.enabled:
+        for name, repo in STORE.list_repos().items():
+            _watch(name, repo)
+    yield
+    WATCHERS.shutdown()
+    SWEEPER.shutdown()
+
 
-app = FastAPI(title="repo pr-bot", version="0.1.0")
+app = FastAPI(title="repo pr-bot", version="0.1.0", lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -49,11 +88,9 @@ app.add_middleware(
 )
 
 
-def get_repo_info(name: str) -> RepoInfo:
-    cfg = STORE.load()
-    repo = cfg.get("repos", {}).get(name)
-    if not repo:
-        raise HTTPException(status_code=404, detail=f"unknown repo: {name}")
+def get_repo_info(name: str, repo: dict[str, Any] | None = None) -> RepoInfo:
+    if repo is None:
+        repo = STORE.get_repo(name)
 
     repo_path = (REPO_ROOT / repo["path"]).resolve()
     if not repo_path.exists():
@@ -73,166 +110,290 @@ def get_repo_info(name: str) -> RepoInfo:
 
 
 
+def _scan(info: RepoInfo) -> tuple[list[Path], list[Candidate], WatchSnapshot | None]:
+    # a live watcher answers from memory; otherwise walk and grep the tree
+    snap = WATCHERS.snapshot(info) if WATCHERS.enabled else None
+    if snap is not None:
+        return snap.files, snap.candidates, snap
+    files = iter_files(info.repo_path, info.scope, info.exclude)
+    return files, grep_candidates(files, info.repo_path), None
+
+
+def _fingerprint(files: list[Path], snap: WatchSnapshot | None) -> str:
+    return snap.fingerprint if snap is not None else scan_fingerprint(files)
+
+
+def _watch(name: str, repo: dict[str, Any] | None = None) -> None:
+    if not WATCHERS.enabled:
+        return
+    try:
+        info = get_repo_info(name, repo)
+    except HTTPException:
+        # registered path is gone; /candidates reports that on use
+        WATCHERS.stop(name)
+        return
+    running = WATCHERS.get(name)
+    if running is None or not running.matches(info):
+        WATCHERS.start(info)
+
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
 
+REGISTRY.register(Gauge("prbot_worktree_disk_bytes", "bytes used under WORK_ROOT as of the last gc pass", lambda: {(): POOL.stats()["disk_bytes"]}))
+REGISTRY.register(Gauge(
+    "prbot_worktrees", "pooled worktrees by state",
+    lambda: {("idle",): POOL.stats()["idle"], ("in_use",): POOL.stats()["in_use"]}, ("state",),
+))
+REGISTRY.register(Gauge("prbot_jobs_queued", "jobs waiting for a worker", lambda: {(): JOBS.stats()["queued"]}))
+REGISTRY.register(Gauge("prbot_jobs_running", "jobs being executed", lambda: {(): JOBS.stats()["running"]}))
+REGISTRY.register(Gauge("prbot_watch_dirs", "inotify watches held by repo watchers", lambda: {(): WATCHERS.stats()["dirs_in_use"]}))
+REGISTRY.register(Gauge("prbot_validation_slots_in_use", "validation commands running", lambda: {(): VALIDATION_SLOTS.stats()["in_use"]}))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/worktrees/stats")
+def worktrees_stats() -> dict[str, Any]:
+    return {"pool": POOL.stats(), "prefetch": PREFETCHER.stats(), "validate_cache": CACHE.stats(), "validate_slots": VALIDATION_SLOTS.stats(), "sweep": SWEEPER.stats(), "watch": WATCHERS.stats()}
+
+
 @app.post("/repo/select")
 def repo_select(req: RepoSelectRequest):
-    cfg = STORE.load()
-    cfg.setdefault("repos", {})
-    cfg["repos"][req.name] = {
-        "path": req.path,
-        "branch": req.branch,
-        "scope": req.scope,
-        "policy": cfg["repos"].get(req.name, {}).get("policy", {}),
-    }
-    STORE.save(cfg)
+    def apply(cfg: dict[str, Any]) -> None:
+        repos = cfg.setdefault("repos", {})
+        repos[req.name] = {
+            "path": req.path,
+            "branch": req.branch,
+            "scope": req.scope,
+            "policy": repos.get(req.name, {}).get("policy", {}),
+        }
+
+    STORE.update(apply)
+    _watch(req.name)
     return {"ok": True, "repo": req.name}
 
 
 @app.post("/repo/policy")
 def repo_policy(repo: str, policy: Policy):
-    cfg = STORE.load()
-    if repo not in cfg.get("repos", {}):
-        raise HTTPException(status_code=404, detail="unknown repo")
-    cfg["repos"][repo]["policy"] = policy.model_dump()
-    STORE.save(cfg)
+    STORE.update_repo(repo, lambda r: r.update(policy=policy.model_dump()))
     return {"ok": True, "repo": repo}
 
 
 @app.post("/candidates", response_model=CandidatesResponse)
 def candidates(req: CandidatesRequest) -> CandidatesResponse:
     info = get_repo_info(req.repo)
-    files = iter_files(info.repo_path, info.scope, info.exclude)
-    cands = grep_candidates(files, info.repo_path)
+    files, cands, snap = _scan(info)
+    if PREFETCHER.enabled:
+        PREFETCHER.schedule(info, cands, _fingerprint(files, snap))
+    # a patch or validate request for this repo usually follows a scan
+    POOL.prewarm(info.repo_path, info.branch)
     return CandidatesResponse(repo=req.repo, candidates=cands)
 
 
-@app.post("/candidate/patch", response_model=PatchResponse)
-def candidate_patch(req: PatchRequest) -> PatchResponse:
+def _patch(req: PatchRequest, job: Job) -> PatchResponse:
+    with collect(req.timings) as timings:
+        resp = _patch_pipeline(req, job)
+    if timings is not None:
+        notes = json.loads(resp.notes)
+        notes["timings"] = timings.as_dict()
+        resp.notes = json.dumps(notes, indent=2)
+    return resp
+
+
+def _patch_pipeline(req: PatchRequest, job: Job) -> PatchResponse:
+    job.progress("scan")
     info = get_repo_info(req.repo)
 
-    files = iter_files(info.repo_path, info.scope, info.exclude)
-    cands = grep_candidates(files, info.repo_path)
+    files, cands, snap = _scan(info)
     cand = next((c for c in cands if c.id == req.candidate_id), None)
     if cand is None:
         raise HTTPException(status_code=404, detail=f"unknown candidate_id for current repo scan: {req.candidate_id}")
 
-    constraints = info.policy.constraints
-    max_files = int(constraints.get("max_files_touched", 8))
-    max_loc = int(constraints.get("max_loc_changed", 250))
-    no_new_deps = bool(constraints.get("no_new_dependencies", True))
-    preserve_api = bool(constraints.get("preserve_public_api", True))
-
-    evidence = cand.evidence
-    target_file: str | None = None
-    radius = 40
-    extra_rules = ""
-
-    if cand.id == "lua-todo-triage" and evidence:
-        target_file = str(evidence[0].get("path") or "")
-        evidence = [evidence[0]]
-        radius = 15
-        extra_rules = """
-additional rules for lua-todo-triage (ABSOLUTE, NON-NEGOTIABLE):
-- you may ONLY modify the TODO/FIXME/HACK COMMENT LINE ITSELF
-- the line containing the TODO marker is the ONLY line you may change
-- you MUST NOT modify any executable code
-- you MUST NOT modify dofile(), require(), function calls, assignments, or control flow
-- you MUST NOT rename files or reference new filenames
-- if clarification is not possible, output an EMPTY diff
-"""
-
-    context = extract_context(info.repo_path, evidence, radius=radius)
-    if not context.strip():
-        raise HTTPException(status_code=400, detail="no context could be extracted for candidate evidence")
-
-    prompt = textwrap.dedent(
-        f"""
-you are a repo co-maintainer. generate a SMALL pull-request patch.
-
-rules (HARD):
-- output ONLY a unified diff (git-style). no prose.
-- do NOT include any 'index ...' lines
-- include at most ONE hunk
-- copy surrounding context lines EXACTLY as shown
-- all paths must be relative to repo root; use: diff --git a/<path> b/<path>
-- do not include absolute paths and do not use .. in paths
-- touch at most {max_files} files
-- change at most {max_loc} total lines (added+removed, approximate)
-- {("do not add new dependencies" if no_new_deps else "new deps allowed")}
-- {("preserve public api unless absolutely required" if preserve_api else "api changes allowed")}
-- keep changes narrowly scoped to the candidate goal
-- if the safe fix is unclear, output an EMPTY diff (no changes) rather than guessing
-
-{extra_rules}
-
-candidate:
-- id: {cand.id}
-- title: {cand.title}
-- rationale: {cand.rationale}
-- risk: {cand.risk}
-
-repo evidence + surrounding context (copy/paste from here; do not paraphrase lines):
-{context}
-"""
+    options = PatchOptions(
+        full_validation=req.full_validation, test_impact=req.test_impact,
+        samples=req.samples, repair_attempts=req.repair_attempts,
     )
+    hit = PREFETCHER.lookup(prefetch_key(info, _fingerprint(files, snap), cand.id, options)) if PREFETCHER.enabled else None
+    if hit is not None:
+        pctx, sampled = hit.pctx, hit.sampled
+    else:
+        with PREFETCHER.interactive():
+            job.progress("context")
+            pctx = build_patch_context(info, cand, full_validation=req.full_validation, test_impact=req.test_impact)
+            sampled = sample_patches(
+                info, pctx, samples=req.samples, repair_attempts=req.repair_attempts,
+                cancel=job.cancel, progress=job.progress,
+            )
+    outcome = sampled.outcome
 
-    raw = ollama_generate(prompt)
-    diff = strip_to_unified_diff(raw)
+    notes = {
+        "files_touched": outcome.files_touched,
+        "added": outcome.added,
+        "removed": outcome.removed,
+        "validation_ok": sampled.validation_ok,
+        "validation_steps": sampled.validation_steps,
+        "target_file": pctx.target_file,
+        "attempts": outcome.attempts,
+        "time_to_first_valid_s": outcome.time_to_first_valid_s,
+    }
+    if sampled.samples:
+        notes["samples"] = sampled.samples
+    if hit is not None:
+        notes["prefetched"] = True
+    else:
+        release_patch(outcome)
 
-    if "diff --git " not in diff:
-        raise HTTPException(status_code=502, detail=f"model did not return a diff. raw output:\n{raw[:1200]}")
+    return PatchResponse(repo=req.repo, candidate_id=req.candidate_id, diff=outcome.diff, notes=json.dumps(notes, indent=2))
 
-    if "index " in diff:
-        raise HTTPException(status_code=400, detail="diff rejected: contains 'index' line (model must omit index lines)")
 
-    if not diff_paths_are_safe(diff):
-        raise HTTPException(status_code=400, detail="diff contains unsafe paths (absolute or traversal)")
+def _validate(req: ValidateRequest, job: Job) -> ValidateResponse:
+    info = get_repo_info(req.repo)
 
-    ok, msg = _diff_files_exist(info.repo_path, diff)
-    if not ok:
-        raise HTTPException(status_code=400, detail=msg)
+    min_context = None
+    touched: set[str] = set()
+    if req.diff:
+        parsed = parse_diff(req.diff)
+        if parsed.errors:
+            raise HTTPException(status_code=400, detail="malformed diff:\n" + "\n".join(parsed.errors[:10]))
+        if not diff_paths_are_safe(parsed):
+            raise HTTPException(status_code=400, detail="diff contains unsafe paths (absolute or traversal)")
+        min_context = check_applies(info, parsed).min_context
+        touched = parsed.touched_paths
+
+    # answered from the cache without a worktree; this covers the empty (baseline) diff per commit.
+    # the one stat walk serves both the cache key and the pooled worktree's sync
+    manifest = source_manifest(info.repo_path) if CACHE.enabled else None
+    key, hit = cached_result(
+        info.repo_path, req.diff or "", info.branch,
+        full=req.full_validation or None, test_impact=req.test_impact, manifest=manifest,
+    )
+    if hit is not None:
+        return ValidateResponse(repo=req.repo, ok=hit[0], steps=hit[1])
 
+    work = POOL.checkout(info.repo_path, branch=info.branch, manifest=manifest)
+    try:
+        if req.diff:
+            job.progress("apply")
+            apply_patch(work, req.diff, min_context=min_context)
+        job.progress("validate")
+        ok, steps = validate_worktree(
+            work,
+            touched=touched if req.diff else None,
+            full=req.full_validation or None,
+            test_impact=req.test_impact,
+            source=info.repo_path,
+            cancel=job.cancel,
+        )
+    finally:
+        POOL.checkin(work, touched)
+    if key is not None:
+        CACHE.put(key, ok, steps)
+    return ValidateResponse(repo=req.repo, ok=ok, steps=steps)
 
-    files_touched, added, removed = estimate_diff_churn(diff)
-    if files_touched > max_files:
-        raise HTTPException(status_code=400, detail=f"diff touches too many files: {files_touched} > {max_files}")
-    if (added + removed) > max_loc:
-        raise HTTPException(status_code=400, detail=f"diff too large: added+removed={added+removed} > {max_loc}")
 
-    ok_refs, why = lua_reference_paths_exist(info.repo_path, diff)
-    if not ok_refs:
-        raise HTTPException(status_code=400, detail=f"diff rejected: {why}")
+# how often a synchronous route checks whether its client is still connected
+DISCONNECT_POLL_S = 0.5
 
-    work = make_worktree(info.repo_path)
-    apply_patch(work, diff)
 
-    ok, steps = validate_worktree(work)
-    notes = {
-        "files_touched": files_touched,
-        "added": added,
-        "removed": removed,
-        "validation_ok": ok,
-        "validation_steps": steps,
-        "target_file": target_file,
-    }
+async def _wait(job: Job, request: Request) -> Any:
+    # the synchronous routes are jobs too; awaiting keeps the threadpool free for cheap routes
+    waiter = asyncio.ensure_future(job.wait_async())
+    try:
+        while True:
+            done, _ = await asyncio.wait({waiter}, timeout=DISCONNECT_POLL_S)
+            if done:
+                break
+            # uvicorn does not cancel the handler when the client goes away; ask
+            if await request.is_disconnected():
+                JOBS.cancel(job.id)
+                raise HTTPException(status_code=499, detail=f"client disconnected; job {job.id} cancelled")
+    except asyncio.CancelledError:
+        JOBS.cancel(job.id)
+        raise
+    finally:
+        waiter.cancel()
+    return job.outcome()
 
-    return PatchResponse(repo=req.repo, candidate_id=req.candidate_id, diff=diff, notes=json.dumps(notes, indent=2))
+
+@app.post("/candidate/patch", response_model=PatchResponse)
+async def candidate_patch(req: PatchRequest, request: Request) -> PatchResponse:
+    return await _wait(JOBS.submit("patch", lambda job: _patch(req, job), priority="high"), request)
 
 
 @app.post("/validate", response_model=ValidateResponse)
-def validate(req: ValidateRequest) -> ValidateResponse:
-    info = get_repo_info(req.repo)
-    work = make_worktree(info.repo_path)
+async def validate(req: ValidateRequest, request: Request) -> ValidateResponse:
+    return await _wait(JOBS.submit("validate", lambda job: _validate(req, job), priority="high"), request)
 
-    if req.diff:
-        apply_patch(work, req.diff)
 
-    ok, steps = validate_worktree(work)
-    return ValidateResponse(repo=req.repo, ok=ok, steps=steps)
+@app.post("/jobs/patch", response_model=JobSubmitResponse)
+def jobs_submit_patch(req: PatchRequest, priority: str = "normal") -> JobSubmitResponse:
+    job = JOBS.submit("patch", lambda job: _patch(req, job), priority=priority)
+    return JobSubmitResponse(job_id=job.id, status=job.status)
+
+
+@app.post("/jobs/validate", response_model=JobSubmitResponse)
+def jobs_submit_validate(req: ValidateRequest, priority: str = "normal") -> JobSubmitResponse:
+    job = JOBS.submit("validate", lambda job: _validate(req, job), priority=priority)
+    return JobSubmitResponse(job_id=job.id, status=job.status)
+
+
+@app.get("/jobs")
+def jobs_stats() -> dict[str, Any]:
+    return JOBS.stats()
+
+
+@app.get("/jobs/{job_id}")
+def jobs_status(job_id: str) -> dict[str, Any]:
+    return JOBS.get(job_id).info()
+
+
+@app.get("/jobs/{job_id}/result")
+def jobs_result(job_id: str) -> Any:
+    return JOBS.get(job_id).outcome()
+
+
+@app.post("/jobs/{job_id}/cancel")
+def jobs_cancel(job_id: str) -> dict[str, Any]:
+    return JOBS.cancel(job_id).info()
+
+
+@app.get("/jobs/{job_id}/events")
+async def jobs_events(job_id: str, last_event_id: str | None = Header(default=None)) -> StreamingResponse:
+    """
+    server-sent events: one `progress` event per stage, then a final `done` event.
+    reconnecting clients resume after Last-Event-ID.
+    """
+    job = JOBS.get(job_id)
+    seq = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+    async def stream():
+        nonlocal seq
+        while True:
+            events = job.events_since(seq)
+            for ev in events:
+                kind = "done" if ev["stage"] == "done" else "progress"
+                yield f"id: {ev['seq']}\nevent: {kind}\ndata: {json.dumps(ev)}\n\n"
+            seq += len(events)
+            if job.finished and not job.events_since(seq):
+                return
+            await asyncio.sleep(SSE_POLL_S)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/logs/{ref:path}")
+def validation_log(ref: str) -> FileResponse:
+    # full output of a validation step; responses only carry its head and tail
+    path = resolve_ref(ref)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"unknown log: {ref}")
+    return FileResponse(path, media_type="text/plain")
 
 
 @app.get("/repos")
@@ -248,6 +409,7 @@ def repos_get(name: str) -> dict[str, Any]:
 @app.delete("/repos/{name}")
 def repos_delete(name: str) -> dict[str, Any]:
     STORE.delete_repo(name)
+    WATCHERS.stop(name)
     return {"ok": True, "deleted": name}
 
 
@@ -263,18 +425,64 @@ def repos_register(req: RepoSelectRequest) -> dict[str, Any]:
     except Exception as e:
         raise HTTPException(status_code=400, detail="repo path escapes REPO_ROOT") from e
 
-    existing = STORE.load().get("repos", {}).get(req.name, {})
-    STORE.upsert_repo(req.name, {
-        "path": req.path,
-        "branch": req.branch,
-        "scope": req.scope,
-        "exclude": req.exclude,
-        # preserve existing policy unless overwritten elsewhere
-        "policy": existing.get("policy", {}),
-    })
+    def apply(cfg: dict[str, Any]) -> None:
+        repos = cfg.setdefault("repos", {})
+        repos[req.name] = {
+            "path": req.path,
+            "branch": req.branch,
+            "scope": req.scope,
+            "exclude": req.exclude,
+            # preserve existing policy unless overwritten elsewhere
+            "policy": repos.get(req.name, {}).get("policy", {}),
+        }
+
+    STORE.update(apply)
+    _watch(req.name)
     return {"ok": True, "repo": req.name}
 
 
+@app.post("/repos/sweep")
+async def repos_sweep(req: SweepRequest) -> StreamingResponse:
+    """
+    scans the selected repos concurrently and streams ndjson: one `repo` event per
+    repo as it completes (its candidates plus the running cross-repo top_k), then
+    a `done` event with the full ranking.
+    """
+    registered = STORE.list_repos()
+    for name in req.repos:
+        if name not in registered:
+            raise HTTPException(status_code=404, detail=f"unknown repo: {name}")
+    names = req.repos or sorted(registered)
+    if req.pattern:
+        names = [n for n in names if fnmatch.fnmatch(n, req.pattern)]
+
+    targets = [
+        SweepTarget(
+            name=n,
+            repo_path=(REPO_ROOT / registered[n]["path"]).resolve(),
+            scope=registered[n].get("scope", []),
+            exclude=registered[n].get("exclude", []),
+        )
+        for n in names
+    ]
+    events = SWEEPER.sweep(
+        targets,
+        timeout_s=req.timeout_s or SWEEP_REPO_TIMEOUT_S,
+        max_files=SWEEP_REPO_MAX_FILES if req.max_files is None else req.max_files,
+        max_bytes=SWEEP_REPO_MAX_BYTES if req.max_bytes is None else req.max_bytes,
+        top_k=req.top_k,
+    )
+
+    async def stream():
+        try:
+            async for ev in events:
+                yield json.dumps(ev) + "\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 class ScopeUpdateRequest(BaseModel):
     scope: list[str] = Field(default_factory=list)
     exclude: list[str] = Field(default_factory=list)
@@ -282,19 +490,19 @@ class ScopeUpdateRequest(BaseModel):
 
 @app.post("/repos/{name}/scope")
 def repos_update_scope(name: str, req: ScopeUpdateRequest) -> dict[str, Any]:
-    repo = STORE.get_repo(name)
-    repo["scope"] = req.scope
-    if req.exclude:
-        repo["exclude"] = req.exclude
-    STORE.upsert_repo(name, repo)
+    def apply(repo: dict[str, Any]) -> None:
+        repo["scope"] = req.scope
+        if req.exclude:
+            repo["exclude"] = req.exclude
+
+    repo = STORE.update_repo(name, apply)
+    _watch(name, repo)
     return {"ok": True, "repo": name, "scope": repo.get("scope", []), "exclude": repo.get("exclude", [])}
 
 
 @app.post("/repos/{name}/policy")
 def repos_update_policy(name: str, policy: Policy) -> dict[str, Any]:
-    repo = STORE.get_repo(name)
-    repo["policy"] = policy.model_dump()
-    STORE.upsert_repo(name, repo)
+    STORE.update_repo(name, lambda r: r.update(policy=policy.model_dump()))
     return {"ok": True, "repo": name}
 
 
@@ -308,8 +516,7 @@ def repos_validate(name: str) -> dict[str, Any]:
 
     if ok:
         # count files in scope after excludes
-        from .repo_fs import iter_files
-        info = get_repo_info(name)
+        info = get_repo_info(name, repo)
         files = iter_files(info.repo_path, info.scope, info.exclude)
         details["files_seen"] = len(files)
 
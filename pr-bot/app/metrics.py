@@ -0,0 +1,242 @@
+"""
+metrics.py
+
+in-process instrumentation: counters, gauges and histograms rendered in the
+prometheus text format on /metrics (no client library needed).
+
+`timed(stage)` records a stage duration into the stage histogram and, when a
+request opted in with `collect()`, into that request's Timings as well.
+threads spawned for a request (best-of-n samples) need `contextvars.copy_context()`
+to keep reporting into the same Timings.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+# seconds; covers a sub-millisecond stat walk up to a 10 minute generation
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+LabelKey = tuple[str, ...]
+
+
+def _fmt_labels(names: tuple[str, ...], values: LabelKey, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                out.append(f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_value(v)}")
+        return out
+
+
+class Gauge:
+    """
+    value read from a callback at scrape time; the callback returns {label values: value}.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], dict[LabelKey, float]], labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.fn = fn
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, v in sorted(self.fn().items()):
+            out.append(f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_value(v)}")
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> (per-bucket counts, sum, count)
+        self._values: dict[LabelKey, tuple[list[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts, total, n = self._values.get(labels) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[labels] = (counts, total + value, n + 1)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._values.items()):
+                for bound, c in zip(self.buckets, counts):
+                    le = _fmt_labels(self.labels, key, 'le="%s"' % bound)
+                    out.append(f"{self.name}_bucket{le} {c}")
+                le = _fmt_labels(self.labels, key, 'le="+Inf"')
+                out.append(f"{self.name}_bucket{le} {n}")
+                out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_value(total)}")
+                out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {n}")
+        return out
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Gauge | Histogram] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # re-registering a name (e.g. a reloaded module) replaces the old metric
+            self._metrics = [m for m in self._metrics if m.name != metric.name]
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: list[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram("prbot_stage_seconds", "time spent per pipeline stage", ("stage",)))
+VALIDATE_STEP_SECONDS = REGISTRY.register(Histogram("prbot_validate_step_seconds", "time spent per validation step", ("step",)))
+SCAN_FILES = REGISTRY.register(Counter("prbot_scan_files_total", "files returned by repo scans"))
+SCAN_BYTES = REGISTRY.register(Counter("prbot_scan_bytes_total", "bytes of the files returned by repo scans"))
+SCAN_SKIPPED = REGISTRY.register(Counter("prbot_scan_skipped_total", "paths skipped by repo scans", ("reason",)))
+OLLAMA_REQUESTS = REGISTRY.register(Counter("prbot_ollama_requests_total", "ollama generate calls", ("outcome",)))
+OLLAMA_TOKENS = REGISTRY.register(Counter("prbot_ollama_tokens_total", "tokens reported by ollama", ("kind",)))
+OLLAMA_SECONDS = REGISTRY.register(Histogram("prbot_ollama_seconds", "durations reported by ollama", ("phase",)))
+
+
+class Timings:
+    """
+    per-request collector behind the opt-in `timings` block.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.stages: dict[str, dict[str, float]] = {}
+        self.ollama: list[dict[str, Any]] = []
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            s = self.stages.setdefault(stage, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            s["count"] += 1
+            s["total_s"] = round(s["total_s"] + seconds, 4)
+            s["max_s"] = round(max(s["max_s"], seconds), 4)
+
+    def add_ollama(self, stats: dict[str, Any]) -> None:
+        with self._lock:
+            self.ollama.append(stats)
+
+    def as_dict(self) -> dict[str, Any]:
+        with self._lock:
+            return {"stages": dict(self.stages), "ollama": list(self.ollama)}
+
+
+_current: contextvars.ContextVar[Timings | None] = contextvars.ContextVar("prbot_timings", default=None)
+
+
+@contextmanager
+def collect(enabled: bool = True) -> Iterator[Timings | None]:
+    if not enabled:
+        yield None
+        return
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def record(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t0)
+
+
+def record_validate_step(step: str, seconds: float) -> None:
+    VALIDATE_STEP_SECONDS.observe(seconds, step)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(f"validate:{step}", seconds)
+
+
+def record_ollama(data: dict[str, Any]) -> dict[str, Any]:
+    """
+    pull the counters ollama reports with its final response (durations are in ns).
+    """
+    stats = {
+        "prompt_eval_count": data.get("prompt_eval_count"),
+        "eval_count": data.get("eval_count"),
+        "prompt_eval_duration_s": _ns(data.get("prompt_eval_duration")),
+        "eval_duration_s": _ns(data.get("eval_duration")),
+        "load_duration_s": _ns(data.get("load_duration")),
+        "total_duration_s": _ns(data.get("total_duration")),
+    }
+    if stats["eval_count"] and stats["eval_duration_s"]:
+        stats["tokens_per_s"] = round(stats["eval_count"] / stats["eval_duration_s"], 2)
+
+    for kind, key in (("prompt", "prompt_eval_count"), ("eval", "eval_count")):
+        if stats[key]:
+            OLLAMA_TOKENS.inc(stats[key], kind)
+    for phase in ("prompt_eval", "eval", "load", "total"):
+        v = stats[f"{phase}_duration_s"]
+        if v is not None:
+            OLLAMA_SECONDS.observe(v, phase)
+
+    timings = _current.get()
+    if timings is not None:
+        timings.add_ollama(stats)
+    return stats
+
+
+def _ns(v: Any) -> float | None:
+    return round(v / 1e9, 4) if isinstance(v, (int, float)) else None
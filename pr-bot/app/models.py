@@ -63,9 +63,31 @@ class CandidatesRequest(BaseModel):
     repo: str
 
 
+class SweepRequest(BaseModel):
+    # empty means every registered repo; `pattern` filters names with fnmatch
+    repos: list[str] = Field(default_factory=list)
+    pattern: str | None = None
+    # per-repo budgets; unset falls back to the SWEEP_REPO_* settings
+    timeout_s: float | None = Field(default=None, gt=0)
+    max_files: int | None = Field(default=None, ge=0)
+    max_bytes: int | None = Field(default=None, ge=0)
+    # size of the running cross-repo ranking sent with each repo event
+    top_k: int = Field(default=20, ge=1, le=500)
+
+
 class PatchRequest(BaseModel):
     repo: str
     candidate_id: str
+    # opt-in: feed apply errors / rule violations back to the model this many times
+    repair_attempts: int = Field(default=0, ge=0, le=5)
+    # opt-in: generate this many diffs concurrently; first one that validates wins
+    samples: int = Field(default=1, ge=1, le=8)
+    # compile/lint the whole worktree instead of only touched files
+    full_validation: bool = False
+    # run only tests that import the touched files; None uses VALIDATE_TEST_IMPACT
+    test_impact: bool | None = None
+    # opt-in: per-stage timings and ollama token stats in notes["timings"]
+    timings: bool = False
 
 
 class PatchResponse(BaseModel):
@@ -78,6 +100,9 @@ class PatchResponse(BaseModel):
 class ValidateRequest(BaseModel):
     repo: str
     diff: str | None = None
+    full_validation: bool = False
+    # run only tests that import the touched files; None uses VALIDATE_TEST_IMPACT
+    test_impact: bool | None = None
 
 
 class ValidateResponse(BaseModel):
@@ -86,6 +111,11 @@ class ValidateResponse(BaseModel):
     steps: list[dict[str, Any]]
 
 
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+
 @dataclass
 class RepoInfo:
     name: str
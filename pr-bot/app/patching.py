@@ -0,0 +1,455 @@
+"""
+patching.py
+
+prompt construction, diff guards and the generate -> check -> apply loop behind /candidate/patch.
+keeps the route thin and lets a rejected diff be repaired without rebuilding context.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from fastapi import HTTPException
+
+from .models import Candidate, Policy, RepoInfo
+from .repo_fs import extract_context
+from .diff_utils import ParsedDiff, parse_diff, strip_to_unified_diff, estimate_diff_churn, diff_paths_are_safe, _diff_files_exist
+from .llm_ollama import GenerationCancelled, ollama_generate, lua_reference_paths_exist
+from .hunk_apply import ApplyCheck, check_diff_applies
+from .metrics import timed
+from .settings import APPLY_FUZZ, APPLY_MAX_OFFSET
+from .worktree import apply_patch
+from .worktree_pool import POOL
+from .validate import validate_worktree
+from .utils_run import AnyEvent
+
+# progress(stage, data) callback used by the job runner; stages: generate, apply, validate
+Progress = Callable[[str, dict[str, Any]], None]
+
+
+def _noop_progress(stage: str, data: dict[str, Any]) -> None:
+    pass
+
+
+LUA_TODO_RULES = """
+additional rules for lua-todo-triage (ABSOLUTE, NON-NEGOTIABLE):
+- you may ONLY modify the TODO/FIXME/HACK COMMENT LINE ITSELF
+- the line containing the TODO marker is the ONLY line you may change
+- you MUST NOT modify any executable code
+- you MUST NOT modify dofile(), require(), function calls, assignments, or control flow
+- you MUST NOT rename files or reference new filenames
+- if clarification is not possible, output an EMPTY diff
+"""
+
+
+@dataclass(frozen=True)
+class PatchLimits:
+    max_files: int
+    max_loc: int
+    no_new_deps: bool
+    preserve_api: bool
+
+
+@dataclass
+class PatchContext:
+    cand: Candidate
+    prompt: str
+    target_file: str | None
+    limits: PatchLimits
+    full_validation: bool = False
+    test_impact: bool | None = None
+    repo_path: Path | None = None
+    branch: str | None = None
+
+
+@dataclass
+class PatchOutcome:
+    diff: str
+    work: Path
+    files_touched: int
+    added: int
+    removed: int
+    touched: set[str] = field(default_factory=set)
+    attempts: list[dict[str, Any]] = field(default_factory=list)
+    time_to_first_valid_s: float = 0.0
+
+
+@dataclass
+class SampledPatch:
+    outcome: PatchOutcome
+    validation_ok: bool
+    validation_steps: list[dict[str, Any]]
+    samples: list[dict[str, Any]] = field(default_factory=list)
+
+
+def policy_limits(policy: Policy) -> PatchLimits:
+    constraints = policy.constraints
+    return PatchLimits(
+        max_files=int(constraints.get("max_files_touched", 8)),
+        max_loc=int(constraints.get("max_loc_changed", 250)),
+        no_new_deps=bool(constraints.get("no_new_dependencies", True)),
+        preserve_api=bool(constraints.get("preserve_public_api", True)),
+    )
+
+
+def build_patch_context(
+    info: RepoInfo,
+    cand: Candidate,
+    full_validation: bool = False,
+    test_impact: bool | None = None,
+) -> PatchContext:
+    limits = policy_limits(info.policy)
+
+    evidence = cand.evidence
+    target_file: str | None = None
+    radius = 40
+    extra_rules = ""
+
+    if cand.id == "lua-todo-triage" and evidence:
+        target_file = str(evidence[0].get("path") or "")
+        evidence = [evidence[0]]
+        radius = 15
+        extra_rules = LUA_TODO_RULES
+
+    context = extract_context(info.repo_path, evidence, radius=radius)
+    if not context.strip():
+        raise HTTPException(status_code=400, detail="no context could be extracted for candidate evidence")
+
+    prompt = textwrap.dedent(
+        f"""
+you are a repo co-maintainer. generate a SMALL pull-request patch.
+
+rules (HARD):
+- output ONLY a unified diff (git-style). no prose.
+- do NOT include any 'index ...' lines
+- include at most ONE hunk
+- copy surrounding context lines EXACTLY as shown
+- all paths must be relative to repo root; use: diff --git a/<path> b/<path>
+- do not include absolute paths and do not use .. in paths
+- touch at most {limits.max_files} files
+- change at most {limits.max_loc} total lines (added+removed, approximate)
+- {("do not add new dependencies" if limits.no_new_deps else "new deps allowed")}
+- {("preserve public api unless absolutely required" if limits.preserve_api else "api changes allowed")}
+- keep changes narrowly scoped to the candidate goal
+- if the safe fix is unclear, output an EMPTY diff (no changes) rather than guessing
+
+{extra_rules}
+
+candidate:
+- id: {cand.id}
+- title: {cand.title}
+- rationale: {cand.rationale}
+- risk: {cand.risk}
+
+repo evidence + surrounding context (copy/paste from here; do not paraphrase lines):
+{context}
+"""
+    )
+
+    return PatchContext(
+        cand=cand,
+        prompt=prompt,
+        target_file=target_file,
+        limits=limits,
+        full_validation=full_validation,
+        test_impact=test_impact,
+        repo_path=info.repo_path,
+        branch=info.branch,
+    )
+
+
+def build_repair_prompt(prompt: str, diff: str, error: str) -> str:
+    # the original prompt stays a verbatim prefix so ollama can reuse its prompt cache
+    return prompt + textwrap.dedent(
+        f"""
+
+your previous diff was REJECTED and must be corrected.
+
+previous diff:
+{diff.strip() or "(no diff found in output)"}
+
+rejection reason:
+{error.strip()}
+
+output a corrected unified diff that follows every rule above.
+copy context lines EXACTLY from the repo evidence; do not reuse mismatched lines from the previous diff.
+"""
+    )
+
+
+@timed("check_diff")
+def check_diff(info: RepoInfo, raw: str, limits: PatchLimits) -> ParsedDiff:
+    diff = strip_to_unified_diff(raw)
+
+    if "diff --git " not in diff:
+        raise HTTPException(status_code=502, detail=f"model did not return a diff. raw output:\n{raw[:1200]}")
+
+    parsed = parse_diff(diff)
+    if parsed.errors:
+        raise HTTPException(status_code=400, detail="malformed diff:\n" + "\n".join(parsed.errors[:10]))
+
+    if parsed.has_index_line:
+        raise HTTPException(status_code=400, detail="diff rejected: contains 'index' line (model must omit index lines)")
+
+    if not diff_paths_are_safe(parsed):
+        raise HTTPException(status_code=400, detail="diff contains unsafe paths (absolute or traversal)")
+
+    ok, msg = _diff_files_exist(info.repo_path, parsed)
+    if not ok:
+        raise HTTPException(status_code=400, detail=msg)
+
+    files_touched, added, removed = estimate_diff_churn(parsed)
+    if files_touched > limits.max_files:
+        raise HTTPException(status_code=400, detail=f"diff touches too many files: {files_touched} > {limits.max_files}")
+    if (added + removed) > limits.max_loc:
+        raise HTTPException(status_code=400, detail=f"diff too large: added+removed={added+removed} > {limits.max_loc}")
+
+    ok_refs, why = lua_reference_paths_exist(info.repo_path, parsed)
+    if not ok_refs:
+        raise HTTPException(status_code=400, detail=f"diff rejected: {why}")
+
+    return parsed
+
+
+@timed("check_applies")
+def check_applies(info: RepoInfo, parsed: ParsedDiff) -> ApplyCheck:
+    # in-process dry run against the original repo; only diffs that pass get a worktree
+    res = check_diff_applies(info.repo_path, parsed, fuzz=APPLY_FUZZ, max_offset=APPLY_MAX_OFFSET)
+    if not res.ok:
+        raise HTTPException(status_code=400, detail=f"diff does not apply: {res.error}")
+    return res
+
+
+def generate_patch(
+    info: RepoInfo,
+    pctx: PatchContext,
+    repair_attempts: int = 0,
+    temperature: float = 0.2,
+    seed: int | None = None,
+    cancel: threading.Event | AnyEvent | None = None,
+    progress: Progress | None = None,
+) -> PatchOutcome:
+    """
+    generate a diff, run the guards and apply it to a pooled worktree.
+    a rejected diff is fed back to the model with the exact error up to repair_attempts times.
+    the caller owns the returned worktree and hands it back with release_patch().
+    """
+    t0 = time.monotonic()
+    attempts: list[dict[str, Any]] = []
+    prompt = pctx.prompt
+    work: Path | None = None
+    progress = progress or _noop_progress
+
+    try:
+        for n in range(1, repair_attempts + 2):
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled()
+            started = time.monotonic()
+            progress("generate", {"attempt": n})
+            raw = ollama_generate(prompt, temperature=temperature, seed=seed, cancel=cancel)
+            progress("apply", {"attempt": n})
+
+            stage = "check"
+            diff = strip_to_unified_diff(raw)
+            try:
+                parsed = check_diff(info, raw, pctx.limits)
+                diff = parsed.text
+                files_touched, added, removed = estimate_diff_churn(parsed)
+                stage = "match"
+                applies = check_applies(info, parsed)
+                stage = "apply"
+                if work is None:
+                    work = POOL.checkout(info.repo_path, branch=info.branch)
+                # git apply --check leaves the tree untouched, so a rejected attempt can reuse it
+                apply_patch(work, diff, min_context=applies.min_context)
+            except HTTPException as e:
+                attempts.append({
+                    "attempt": n,
+                    "ok": False,
+                    "stage": stage,
+                    "error": str(e.detail)[:2000],
+                    "elapsed_s": round(time.monotonic() - started, 3),
+                })
+                if n > repair_attempts:
+                    if repair_attempts:
+                        e.detail = f"{e.detail}\n(repair loop gave up after {n} attempts)"
+                    raise
+                prompt = build_repair_prompt(pctx.prompt, diff, str(e.detail))
+                continue
+
+            attempts.append({"attempt": n, "ok": True, "stage": "apply", "error": "", "elapsed_s": round(time.monotonic() - started, 3)})
+            return PatchOutcome(
+                diff=diff,
+                work=work,
+                files_touched=files_touched,
+                added=added,
+                removed=removed,
+                touched=parsed.touched_paths,
+                attempts=attempts,
+                time_to_first_valid_s=round(time.monotonic() - t0, 3),
+            )
+    except BaseException:
+        if work is not None:
+            POOL.checkin(work)
+        raise
+
+    raise AssertionError("unreachable")
+
+
+def release_patch(outcome: PatchOutcome) -> None:
+    POOL.checkin(outcome.work, outcome.touched)
+
+
+def validate_patch(
+    pctx: PatchContext,
+    outcome: PatchOutcome,
+    cancel: threading.Event | AnyEvent | None = None,
+) -> tuple[bool, list[dict[str, Any]]]:
+    return validate_worktree(
+        outcome.work,
+        touched=outcome.touched,
+        full=pctx.full_validation or None,
+        test_impact=pctx.test_impact,
+        source=pctx.repo_path,
+        diff=outcome.diff,
+        branch=pctx.branch,
+        cancel=cancel,
+    )
+
+
+def sample_settings(i: int, samples: int) -> tuple[float, int | None]:
+    # sample 0 keeps the exact single-shot options (no seed); the rest spread temperature and pin a seed
+    if samples == 1 or i == 0:
+        return 0.2, None
+    return round(min(0.2 + 0.15 * i, 1.0), 2), i + 1
+
+
+def sample_patches(
+    info: RepoInfo,
+    pctx: PatchContext,
+    samples: int = 1,
+    repair_attempts: int = 0,
+    cancel: threading.Event | None = None,
+    progress: Progress | None = None,
+) -> SampledPatch:
+    """
+    run `samples` independent generate -> apply -> validate pipelines concurrently.
+    the first sample whose worktree validates wins and the remaining generations are cancelled.
+    if none validate, the first applied sample is returned with its failing steps.
+    worktrees of the samples that are not returned go back to the pool.
+    setting `cancel` abandons every sample (GenerationCancelled).
+    """
+    progress = progress or _noop_progress
+    if samples <= 1:
+        outcome = generate_patch(info, pctx, repair_attempts=repair_attempts, cancel=cancel, progress=progress)
+        try:
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled()
+            progress("validate", {})
+            ok, steps = validate_patch(pctx, outcome, cancel=cancel)
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled()
+        except BaseException:
+            release_patch(outcome)
+            raise
+        return SampledPatch(outcome=outcome, validation_ok=ok, validation_steps=steps)
+
+    # set once a winner lands; `stop` also covers the caller's cancel
+    done = threading.Event()
+    stop = AnyEvent(done, cancel)
+    report: list[dict[str, Any]] = []
+
+    def run(i: int) -> tuple[PatchOutcome, bool, list[dict[str, Any]]]:
+        temperature, seed = sample_settings(i, samples)
+
+        def sample_progress(stage: str, data: dict[str, Any]) -> None:
+            progress(stage, {**data, "sample": i})
+
+        outcome = generate_patch(
+            info, pctx, repair_attempts=repair_attempts, temperature=temperature, seed=seed,
+            cancel=stop, progress=sample_progress,
+        )
+        try:
+            if stop.is_set():
+                raise GenerationCancelled()
+            sample_progress("validate", {})
+            ok, steps = validate_patch(pctx, outcome, cancel=stop)
+            if stop.is_set() and not ok:
+                raise GenerationCancelled()
+        except BaseException:
+            release_patch(outcome)
+            raise
+        return outcome, ok, steps
+
+    def release_late(fut) -> None:
+        # samples still running when the winner landed return their worktree when they finish
+        if not fut.cancelled() and fut.exception() is None:
+            release_patch(fut.result()[0])
+
+    pool = ThreadPoolExecutor(max_workers=samples, thread_name_prefix="patch-sample")
+    # each sample thread reports timings into the caller's request context
+    futures = {pool.submit(contextvars.copy_context().run, run, i): i for i in range(samples)}
+    seen: set[int] = set()
+    applied: list[SampledPatch] = []
+    winner: SampledPatch | None = None
+    first_error: HTTPException | None = None
+
+    try:
+        for fut in as_completed(futures):
+            i = futures[fut]
+            seen.add(i)
+            temperature, seed = sample_settings(i, samples)
+            entry: dict[str, Any] = {"sample": i, "temperature": temperature, "seed": seed}
+            report.append(entry)
+            try:
+                outcome, ok, steps = fut.result()
+            except GenerationCancelled:
+                entry["status"] = "cancelled"
+                continue
+            except HTTPException as e:
+                entry["status"] = "rejected"
+                entry["error"] = str(e.detail)[:500]
+                first_error = first_error or e
+                continue
+
+            entry["status"] = "validated" if ok else "validation_failed"
+            entry["elapsed_s"] = round(sum(a["elapsed_s"] for a in outcome.attempts), 3)
+            applied.append(SampledPatch(outcome=outcome, validation_ok=ok, validation_steps=steps))
+            if ok:
+                winner = applied[-1]
+                done.set()
+                break
+    finally:
+        done.set()
+        for fut, i in futures.items():
+            if i not in seen:
+                fut.add_done_callback(release_late)
+        # losers notice the cancel event between stages; nobody waits for them
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    for i in range(samples):
+        if i not in seen:
+            temperature, seed = sample_settings(i, samples)
+            report.append({"sample": i, "temperature": temperature, "seed": seed, "status": "cancelled"})
+
+    result = winner or (applied[0] if applied else None)
+    for other in applied:
+        if other is not result:
+            release_patch(other.outcome)
+
+    if result is None:
+        if cancel is not None and cancel.is_set():
+            raise GenerationCancelled()
+        if first_error is not None:
+            raise first_error
+        raise HTTPException(status_code=502, detail="all patch samples were cancelled")
+
+    result.samples = sorted(report, key=lambda e: e["sample"])
+    return result
@@ -0,0 +1,184 @@
+"""
+prefetch.py
+
+speculative background patch generation for the top candidates of a fresh scan.
+runs one job at a time while no interactive patch request is in flight; an
+interactive request preempts the running job, which is requeued for later.
+
+a prefetched patch is generated with PREFETCH_OPTIONS (one sample, no repairs,
+incremental validation); it is keyed by those options, so a request asking for
+anything else runs live instead of getting the speculative result.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+from fastapi import HTTPException
+
+from .models import Candidate, RepoInfo
+from .llm_ollama import GenerationCancelled
+from .settings import VALIDATE_TEST_IMPACT
+from .patching import SampledPatch, PatchContext, build_patch_context, generate_patch, release_patch, validate_patch
+
+log = logging.getLogger(__name__)
+
+MAX_REQUEUES = 3
+
+
+@dataclass(frozen=True)
+class PatchOptions:
+    # the request fields that change what a patch request returns
+    full_validation: bool = False
+    test_impact: bool | None = None
+    samples: int = 1
+    repair_attempts: int = 0
+
+
+# what _generate runs with
+PREFETCH_OPTIONS = PatchOptions()
+
+
+@dataclass
+class PrefetchedPatch:
+    sampled: SampledPatch
+    pctx: PatchContext
+    created_at: float
+
+
+@dataclass
+class _Job:
+    key: str
+    info: RepoInfo
+    cand: Candidate
+    requeues: int = 0
+
+
+def prefetch_key(info: RepoInfo, fingerprint: str, candidate_id: str, options: PatchOptions = PREFETCH_OPTIONS) -> str:
+    # the policy shapes the prompt and the diff limits, so it is part of the snapshot
+    policy = json.dumps(info.policy.model_dump(), sort_keys=True)
+    test_impact = VALIDATE_TEST_IMPACT if options.test_impact is None else options.test_impact
+    opts = f"{options.full_validation}/{test_impact}/{options.samples}/{options.repair_attempts}"
+    raw = "\0".join([info.name, str(info.repo_path), fingerprint, candidate_id, policy, opts])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class Prefetcher:
+    def __init__(self, top_k: int, max_entries: int) -> None:
+        self.top_k = top_k
+        self.max_entries = max_entries
+        self._cond = threading.Condition()
+        self._queue: deque[_Job] = deque()
+        self._queued: set[str] = set()
+        self._results: OrderedDict[str, PrefetchedPatch] = OrderedDict()
+        self._interactive = 0
+        self._cancel: threading.Event | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_k > 0
+
+    def schedule(self, info: RepoInfo, cands: list[Candidate], fingerprint: str) -> None:
+        if not self.enabled:
+            return
+        with self._cond:
+            for cand in cands[: self.top_k]:
+                key = prefetch_key(info, fingerprint, cand.id)
+                if key in self._results or key in self._queued:
+                    continue
+                self._queue.append(_Job(key=key, info=info, cand=cand))
+                self._queued.add(key)
+            self._ensure_worker()
+            self._cond.notify_all()
+
+    def lookup(self, key: str) -> PrefetchedPatch | None:
+        with self._cond:
+            hit = self._results.get(key)
+            if hit is not None:
+                self._results.move_to_end(key)
+            return hit
+
+    @contextmanager
+    def interactive(self) -> Iterator[None]:
+        """
+        marks an interactive request in flight; background work pauses and the
+        running generation is cancelled so ollama capacity goes to the caller.
+        """
+        with self._cond:
+            self._interactive += 1
+            if self._cancel is not None:
+                self._cancel.set()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._interactive -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {"queued": len(self._queue), "stored": len(self._results), "interactive": self._interactive}
+
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="patch-prefetch", daemon=True)
+            self._thread.start()
+
+    def _next_job(self) -> tuple[_Job, threading.Event]:
+        with self._cond:
+            while not self._queue or self._interactive > 0:
+                self._cond.wait()
+            job = self._queue.popleft()
+            self._cancel = threading.Event()
+            return job, self._cancel
+
+    def _run(self) -> None:
+        while True:
+            job, cancel = self._next_job()
+            try:
+                sampled, pctx = self._generate(job, cancel)
+            except GenerationCancelled:
+                with self._cond:
+                    self._cancel = None
+                    if job.requeues < MAX_REQUEUES:
+                        job.requeues += 1
+                        self._queue.append(job)
+                    else:
+                        self._queued.discard(job.key)
+                continue
+            except HTTPException as e:
+                log.info("prefetch for %s/%s rejected: %s", job.info.name, job.cand.id, str(e.detail)[:200])
+                sampled = None
+            except Exception:
+                log.exception("prefetch for %s/%s failed", job.info.name, job.cand.id)
+                sampled = None
+
+            with self._cond:
+                self._cancel = None
+                self._queued.discard(job.key)
+                # only patches that validated are worth serving instead of a live run
+                if sampled is not None and sampled.validation_ok:
+                    self._results[job.key] = PrefetchedPatch(sampled=sampled, pctx=pctx, created_at=time.time())
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+
+    def _generate(self, job: _Job, cancel: threading.Event) -> tuple[SampledPatch, PatchContext]:
+        pctx = build_patch_context(job.info, job.cand)
+        outcome = generate_patch(job.info, pctx, cancel=cancel)
+        try:
+            if cancel.is_set():
+                raise GenerationCancelled()
+            ok, steps = validate_patch(pctx, outcome)
+        finally:
+            # the stored result only needs the diff and the step log
+            release_patch(outcome)
+        return SampledPatch(outcome=outcome, validation_ok=ok, validation_steps=steps), pctx
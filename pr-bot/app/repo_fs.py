@@ -7,8 +7,12 @@ ensures repo access stays inside repo_root and provides consistent snippets to t
 
 from __future__ import annotations
 
+import hashlib
+import stat
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
+from .metrics import SCAN_BYTES, SCAN_FILES, SCAN_SKIPPED, timed
 from .path_utils import safe_relpath
 
 from fastapi import HTTPException
@@ -16,36 +20,99 @@ from fastapi import HTTPException
 import fnmatch
 
 
-def iter_files(repo_path: Path, scope: list[str], exclude: list[str]) -> list[Path]:
+def is_excluded(rel: str, exclude: list[str]) -> bool:
+    # exclude patterns match unix-style paths
+    for pat in exclude:
+        if fnmatch.fnmatch(rel, pat):
+            return True
+    return False
+
+
+@dataclass
+class ScanBudget:
+    """
+    caps on what one scan may return; 0 leaves a cap unset.
+    iter_files stops at the first file that would not fit and sets `exhausted`.
+    """
+    max_files: int = 0
+    max_bytes: int = 0
+    exhausted: bool = False
+
+    def admits(self, files: int, size: int) -> bool:
+        return not ((self.max_files and files > self.max_files) or (self.max_bytes and size > self.max_bytes))
+
+
+@timed("iter_files")
+def iter_files(repo_path: Path, scope: list[str], exclude: list[str], budget: ScanBudget | None = None) -> list[Path]:
     roots = [repo_path / s for s in scope] if scope else [repo_path]
     out: list[Path] = []
-
-    def excluded(rel: str) -> bool:
-        # exclude patterns match unix-style paths
-        for pat in exclude:
-            if fnmatch.fnmatch(rel, pat):
-                return True
-        return False
+    size = 0
+    skipped = {"git": 0, "exclude": 0}
 
     for r in roots:
         if not r.exists():
             continue
 
         for p in r.rglob("*"):
-            if not p.is_file():
+            # one stat answers is_file() and feeds the byte counter
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            if not stat.S_ISREG(st.st_mode):
                 continue
             if ".git" in p.parts:
+                skipped["git"] += 1
                 continue
 
             rel = safe_relpath(p, repo_path)
-            if excluded(rel):
+            if is_excluded(rel, exclude):
+                skipped["exclude"] += 1
                 continue
 
+            if budget is not None and not budget.admits(len(out) + 1, size + st.st_size):
+                budget.exhausted = True
+                break
+
             out.append(p)
+            size += st.st_size
 
+        if budget is not None and budget.exhausted:
+            break
+
+    SCAN_FILES.inc(len(out))
+    SCAN_BYTES.inc(size)
+    for reason, n in skipped.items():
+        SCAN_SKIPPED.inc(n, reason)
     return out
 
 
+def scan_fingerprint(files: list[Path]) -> str:
+    """
+    cheap snapshot id for a scanned file set: paths, sizes and mtimes.
+    any edit, add or delete inside scope changes it.
+    """
+    entries = []
+    for p in files:
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((p, st.st_size, st.st_mtime_ns))
+    return fingerprint_entries(entries)
+
+
+def fingerprint_entries(entries: Iterable[tuple[Path, int, int]]) -> str:
+    """
+    scan_fingerprint over (path, size, mtime_ns) entries that were already stat'ed.
+    """
+    h = hashlib.sha1()
+    for p, size, mtime_ns in entries:
+        h.update(f"{p}\0{size}\0{mtime_ns}\n".encode("utf-8", "surrogateescape"))
+    return h.hexdigest()
+
+
+@timed("extract_context")
 def extract_context(repo_path: Path, evidence: list[dict], radius: int = 60) -> str:
     blocks: list[str] = []
 
@@ -0,0 +1,208 @@
+"""
+sandbox.py
+
+resource limits for validation subprocesses and a global slot semaphore.
+
+every validation command runs under setrlimit limits (address space, cpu time,
+open files, processes). they are set by a small python exec wrapper in the
+child rather than a preexec_fn, which is not safe in a process with threads. the number of commands
+running at once across all requests is capped by VALIDATION_SLOTS, sized from
+the cpus and memory the container actually has (cgroup limits included) unless
+VALIDATE_SLOTS pins it. no extra services or binaries are needed.
+
+note: RLIMIT_NPROC counts every process of the user, and root ignores it.
+"""
+
+from __future__ import annotations
+
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from .settings import (
+    VALIDATE_SLOTS,
+    VALIDATE_RLIMIT_AS_BYTES,
+    VALIDATE_RLIMIT_CPU_S,
+    VALIDATE_RLIMIT_NOFILE,
+    VALIDATE_RLIMIT_NPROC,
+)
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    # 0 leaves a limit untouched
+    address_space_bytes: int = 0
+    cpu_s: int = 0
+    open_files: int = 0
+    processes: int = 0
+
+    def rlimits(self) -> list[tuple[int, int, int]]:
+        """
+        (resource, soft, hard) for every limit that is set, clamped to this process's hard limits.
+        """
+        out = []
+        for which, value, grace in (
+            (resource.RLIMIT_AS, self.address_space_bytes, 0),
+            # soft limit sends SIGXCPU, the hard limit a few seconds later SIGKILL
+            (resource.RLIMIT_CPU, self.cpu_s, 5),
+            (resource.RLIMIT_NOFILE, self.open_files, 0),
+            (resource.RLIMIT_NPROC, self.processes, 0),
+        ):
+            if value <= 0:
+                continue
+            _, hard = resource.getrlimit(which)
+            soft_new = value if hard == resource.RLIM_INFINITY else min(value, hard)
+            hard_new = soft_new + grace if hard == resource.RLIM_INFINITY else min(soft_new + grace, hard)
+            out.append((which, soft_new, hard_new))
+        return out
+
+    def wrap(self, cmd: list[str]) -> list[str]:
+        """
+        argv that sets the limits and then execs cmd in place (same pid, so
+        process-group kills still apply). 127 if cmd cannot be started.
+        """
+        limits = self.rlimits()
+        if not limits:
+            return cmd
+        args = [str(v) for lim in limits for v in lim]
+        return [sys.executable, "-I", "-S", "-c", EXEC_WRAPPER, str(len(limits)), *args, *cmd]
+
+
+EXEC_WRAPPER = """\
+import os, resource, sys
+n = int(sys.argv[1])
+v = [int(x) for x in sys.argv[2:2 + 3 * n]]
+for i in range(n):
+    resource.setrlimit(v[3 * i], (v[3 * i + 1], v[3 * i + 2]))
+cmd = sys.argv[2 + 3 * n:]
+try:
+    os.execvp(cmd[0], cmd)
+except OSError as e:
+    sys.stderr.write(f"failed to run {cmd[0]}: {e}\\n")
+    sys.exit(127)
+"""
+
+
+VALIDATION_LIMITS = ResourceLimits(
+    address_space_bytes=VALIDATE_RLIMIT_AS_BYTES,
+    cpu_s=VALIDATE_RLIMIT_CPU_S,
+    open_files=VALIDATE_RLIMIT_NOFILE,
+    processes=VALIDATE_RLIMIT_NPROC,
+)
+
+
+def _read(path: Path) -> str | None:
+    try:
+        return path.read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+
+def available_cpus() -> float:
+    try:
+        cpus: float = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+    # cgroup v2 "quota period", v1 cfs files
+    quota = _read(CGROUP_ROOT / "cpu.max")
+    if quota and not quota.startswith("max"):
+        q, period = quota.split()[:2]
+        cpus = min(cpus, int(q) / int(period))
+    else:
+        q1 = _read(CGROUP_ROOT / "cpu" / "cpu.cfs_quota_us")
+        p1 = _read(CGROUP_ROOT / "cpu" / "cpu.cfs_period_us")
+        if q1 and p1 and int(q1) > 0:
+            cpus = min(cpus, int(q1) / int(p1))
+    return max(cpus, 1.0)
+
+
+def available_memory() -> int:
+    total = 0
+    meminfo = _read(Path("/proc/meminfo")) or ""
+    for line in meminfo.splitlines():
+        if line.startswith("MemTotal:"):
+            total = int(line.split()[1]) * 1024
+            break
+    for limit in (_read(CGROUP_ROOT / "memory.max"), _read(CGROUP_ROOT / "memory" / "memory.limit_in_bytes")):
+        if limit and limit.isdigit():
+            total = min(total, int(limit)) if total else int(limit)
+    return total
+
+
+def default_slots() -> int:
+    slots = int(available_cpus())
+    mem = available_memory()
+    if VALIDATE_RLIMIT_AS_BYTES > 0 and mem > 0:
+        slots = min(slots, mem // VALIDATE_RLIMIT_AS_BYTES)
+    return max(1, slots)
+
+
+class ValidationSlots:
+    """
+    counting semaphore with wait-time accounting; acquisition gives up when cancel is set.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._waiting = 0
+        self.acquired = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    @contextmanager
+    def slot(self, cancel: threading.Event | None = None) -> Iterator[float | None]:
+        """
+        yields the seconds spent queued, or None if cancel fired while waiting.
+        """
+        t0 = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._in_use >= self.capacity:
+                    if cancel is not None and cancel.is_set():
+                        break
+                    self._cond.wait(timeout=0.2)
+                got = self._in_use < self.capacity and not (cancel is not None and cancel.is_set())
+                if got:
+                    self._in_use += 1
+            finally:
+                self._waiting -= 1
+            waited = time.monotonic() - t0
+            if got:
+                self.acquired += 1
+                self.total_wait_s += waited
+                self.max_wait_s = max(self.max_wait_s, waited)
+
+        if not got:
+            yield None
+            return
+        try:
+            yield round(waited, 3)
+        finally:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+
+    def stats(self) -> dict[str, object]:
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "acquired": self.acquired,
+                "avg_wait_s": round(self.total_wait_s / self.acquired, 4) if self.acquired else 0.0,
+                "max_wait_s": round(self.max_wait_s, 4),
+            }
+
+
+VALIDATION_SLOTS = ValidationSlots(VALIDATE_SLOTS or default_slots())
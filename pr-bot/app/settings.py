@@ -8,5 +8,70 @@ REPO_ROOT = Path(os.environ.get("REPO_ROOT", "/repos"))
 WORK_ROOT = Path(os.environ.get("WORK_ROOT", "/work"))
 CONFIG_PATH = Path(os.environ.get("CONFIG_PATH", "/config/repos.json"))
 
+# auto | copytree | reflink | hardlink | git-worktree (see worktree.py); auto never picks hardlink
+WORKTREE_STRATEGY = os.environ.get("WORKTREE_STRATEGY", "auto")
+# idle worktrees kept per repo (0 disables pooling)
+WORKTREE_POOL_SIZE = int(os.environ.get("WORKTREE_POOL_SIZE", "2"))
+# WORK_ROOT garbage collection; WORK_GC_MAX_BYTES=0 means no disk quota
+WORK_GC_INTERVAL_S = float(os.environ.get("WORK_GC_INTERVAL_S", "300"))
+WORK_GC_MAX_AGE_S = float(os.environ.get("WORK_GC_MAX_AGE_S", "3600"))
+WORK_GC_MAX_BYTES = int(os.environ.get("WORK_GC_MAX_BYTES", str(20 * 1024**3)))
+
+# background job workers for patch/validate requests, and how many finished jobs stay queryable
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_FINISHED = int(os.environ.get("JOB_MAX_FINISHED", "256"))
+
 OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://ollama:11434").rstrip("/")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "qwen2.5-coder:7b")
+
+# speculative patch generation for the top-k candidates of a fresh scan (0 disables)
+PREFETCH_TOP_K = int(os.environ.get("PREFETCH_TOP_K", "0"))
+PREFETCH_MAX_ENTRIES = int(os.environ.get("PREFETCH_MAX_ENTRIES", "64"))
+
+# in-process hunk matching before a worktree is created
+APPLY_FUZZ = int(os.environ.get("APPLY_FUZZ", "0"))
+APPLY_MAX_OFFSET = int(os.environ.get("APPLY_MAX_OFFSET", "200"))
+
+# validate the whole worktree instead of only the files a diff touched
+VALIDATE_FULL = os.environ.get("VALIDATE_FULL", "0") == "1"
+
+# run only the tests that import the touched files (falls back to the full suite when unsure)
+VALIDATE_TEST_IMPACT = os.environ.get("VALIDATE_TEST_IMPACT", "0") == "1"
+
+# command output kept in memory and returned in responses (head + tail); full logs are spooled to disk
+RUN_LOG_HEAD_BYTES = int(os.environ.get("RUN_LOG_HEAD_BYTES", str(16 * 1024)))
+RUN_LOG_TAIL_BYTES = int(os.environ.get("RUN_LOG_TAIL_BYTES", str(32 * 1024)))
+# retention of the spooled logs under WORK_ROOT/logs, independent of worktree lifetime
+LOG_KEEP_FILES = int(os.environ.get("LOG_KEEP_FILES", "1000"))
+LOG_MAX_AGE_S = float(os.environ.get("LOG_MAX_AGE_S", str(24 * 3600)))
+
+# concurrent validation steps; fail-fast cancels the remaining steps after the first failure
+VALIDATE_PARALLELISM = int(os.environ.get("VALIDATE_PARALLELISM", str(min(4, os.cpu_count() or 1))))
+VALIDATE_FAIL_FAST = os.environ.get("VALIDATE_FAIL_FAST", "0") == "1"
+# validation commands running at once across all requests (0 = sized from cpus and memory)
+VALIDATE_SLOTS = int(os.environ.get("VALIDATE_SLOTS", "0"))
+# per-command setrlimit limits for validation; 0 leaves a limit unset
+VALIDATE_RLIMIT_AS_BYTES = int(os.environ.get("VALIDATE_RLIMIT_AS_BYTES", str(4 * 1024**3)))
+VALIDATE_RLIMIT_CPU_S = int(os.environ.get("VALIDATE_RLIMIT_CPU_S", "600"))
+VALIDATE_RLIMIT_NOFILE = int(os.environ.get("VALIDATE_RLIMIT_NOFILE", "1024"))
+VALIDATE_RLIMIT_NPROC = int(os.environ.get("VALIDATE_RLIMIT_NPROC", "512"))
+# pytest-xdist workers ("auto" or a number) when the plugin is installed; 0 disables
+PYTEST_WORKERS = os.environ.get("PYTEST_WORKERS", "0")
+
+# on-disk validation result cache under WORK_ROOT; 0 disables it
+VALIDATE_CACHE_MAX_BYTES = int(os.environ.get("VALIDATE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# /repos/sweep: scan processes, and per-repo budgets so one huge repo can't hold up the rest (0 = unlimited)
+SWEEP_WORKERS = int(os.environ.get("SWEEP_WORKERS", str(min(4, os.cpu_count() or 1))))
+SWEEP_REPO_TIMEOUT_S = float(os.environ.get("SWEEP_REPO_TIMEOUT_S", "120"))
+SWEEP_REPO_MAX_FILES = int(os.environ.get("SWEEP_REPO_MAX_FILES", "200000"))
+SWEEP_REPO_MAX_BYTES = int(os.environ.get("SWEEP_REPO_MAX_BYTES", str(2 * 1024**3)))
+
+# live watchers for registered repos keep scan results in memory for /candidates
+WATCH_REPOS = os.environ.get("WATCH_REPOS", "0") == "1"
+# auto | inotify | poll
+WATCH_BACKEND = os.environ.get("WATCH_BACKEND", "auto")
+WATCH_DEBOUNCE_S = float(os.environ.get("WATCH_DEBOUNCE_S", "0.5"))
+WATCH_POLL_S = float(os.environ.get("WATCH_POLL_S", "10"))
+# inotify watches (one per directory) across all repos; repos past the cap fall back to polling
+WATCH_MAX_DIRS = int(os.environ.get("WATCH_MAX_DIRS", "8192"))
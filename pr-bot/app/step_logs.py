@@ -0,0 +1,80 @@
+"""
+step_logs.py
+
+spooled full output of validation steps under WORK_ROOT/logs.
+
+logs live apart from the worktrees that produced them, so a log_ref stays
+readable after its worktree is reset, discarded or garbage collected. they
+have their own retention (LOG_KEEP_FILES newest, none older than
+LOG_MAX_AGE_S), applied by the worktree gc pass.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from .settings import LOG_KEEP_FILES, LOG_MAX_AGE_S, WORK_ROOT
+
+LOG_DIRNAME = "logs"
+
+
+def log_dir() -> Path:
+    return WORK_ROOT / LOG_DIRNAME
+
+
+def step_log_path(name: str) -> Path:
+    # pid + thread keep names unique across uvicorn workers and parallel steps
+    return log_dir() / f"{time.time_ns() // 1000}-{os.getpid()}-{threading.get_ident()}-{name}.log"
+
+
+def log_ref(log_path: Path) -> dict[str, Any]:
+    """
+    the reference a response carries for a spooled log; see GET /logs/{ref}.
+    """
+    try:
+        ref = log_path.resolve().relative_to(WORK_ROOT.resolve()).as_posix()
+    except ValueError:
+        ref = str(log_path)
+    try:
+        size = log_path.stat().st_size
+    except OSError:
+        size = 0
+    return {"log_ref": ref, "log_bytes": size}
+
+
+def resolve_ref(ref: str) -> Path | None:
+    """
+    the log file a log_ref names, if it is a spooled log that still exists.
+    """
+    root = log_dir().resolve()
+    path = (WORK_ROOT.resolve() / ref).resolve()
+    if path.parent != root or not path.is_file():
+        return None
+    return path
+
+
+def prune_logs(keep: int = LOG_KEEP_FILES, max_age_s: float = LOG_MAX_AGE_S) -> int:
+    """
+    drops logs beyond the newest `keep` and any older than max_age_s; returns how many.
+    """
+    d = log_dir()
+    if not d.is_dir():
+        return 0
+    entries: list[tuple[float, Path]] = []
+    for p in d.iterdir():
+        try:
+            entries.append((p.stat().st_mtime, p))
+        except OSError:
+            continue
+    entries.sort(reverse=True)
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for i, (mtime, p) in enumerate(entries):
+        if i >= keep or mtime < cutoff:
+            p.unlink(missing_ok=True)
+            removed += 1
+    return removed
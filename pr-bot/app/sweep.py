@@ -0,0 +1,179 @@
+"""
+sweep.py
+
+concurrent candidate scans across registered repos for /repos/sweep.
+
+each repo is scanned in a worker process (the scan is cpu-bound python, so
+threads would serialize on the gil), under its own time budget and file/byte
+budget. results are yielded as each repo completes, together with the ranked
+candidates aggregated so far, so a sweep takes about as long as its largest
+repo rather than the sum of all of them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from .candidates import grep_candidates
+from .metrics import record
+from .repo_fs import ScanBudget, iter_files
+
+RISK_ORDER = {"low": 0, "medium": 1, "high": 2}
+
+
+@dataclass(frozen=True)
+class SweepTarget:
+    name: str
+    repo_path: Path
+    scope: list[str]
+    exclude: list[str]
+
+
+def rank_key(cand: dict[str, Any]) -> tuple:
+    # lowest risk first, then the candidates with the most evidence behind them
+    return (RISK_ORDER.get(cand.get("risk", ""), len(RISK_ORDER)), -len(cand.get("evidence", [])), cand["repo"], cand["id"])
+
+
+class _Deadline(Exception):
+    pass
+
+
+def _expire(signum, frame) -> None:
+    raise _Deadline()
+
+
+def scan_repo(target: SweepTarget, timeout_s: float, max_files: int, max_bytes: int) -> dict[str, Any]:
+    """
+    runs in a pool process. the time budget is a SIGALRM timer, which interrupts
+    the walk or the grep wherever it is and leaves the process reusable.
+    """
+    t0 = time.perf_counter()
+    budget = ScanBudget(max_files=max_files, max_bytes=max_bytes)
+    result: dict[str, Any] = {"repo": target.name, "status": "ok", "files": 0, "candidates": []}
+    try:
+        # armed inside the try: a tiny budget can expire before the next statement
+        if timeout_s > 0:
+            signal.signal(signal.SIGALRM, _expire)
+            signal.setitimer(signal.ITIMER_REAL, timeout_s)
+        if not target.repo_path.is_dir():
+            raise FileNotFoundError("repo path not found on disk")
+        files = iter_files(target.repo_path, target.scope, target.exclude, budget=budget)
+        result["files"] = len(files)
+        cands = grep_candidates(files, target.repo_path)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        result["candidates"] = [{"repo": target.name, **c.model_dump()} for c in cands]
+        if budget.exhausted:
+            result["status"] = "truncated"
+    except _Deadline:
+        result["status"] = "timeout"
+    except Exception as e:
+        result.update(status="error", error=str(getattr(e, "detail", "") or e))
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    result["elapsed_s"] = round(time.perf_counter() - t0, 4)
+    return result
+
+
+class Sweeper:
+    def __init__(self, workers: int) -> None:
+        self.workers = max(1, workers)
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._running = 0
+        self._finished = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # forkserver: the app process has threads, which fork() would copy mid-flight
+                ctx = multiprocessing.get_context("forkserver")
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor) -> None:
+        # a worker died (oom kill etc.); the next sweep gets a fresh pool
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def sweep(
+        self,
+        targets: list[SweepTarget],
+        timeout_s: float,
+        max_files: int,
+        max_bytes: int,
+        top_k: int,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        yields one `repo` event per target in completion order, then a `done` event
+        with the full ranking. closing the generator cancels scans not yet started.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        t0 = time.perf_counter()
+        pending = {
+            loop.run_in_executor(pool, scan_repo, t, timeout_s, max_files, max_bytes): t.name
+            for t in targets
+        }
+        ranked: list[dict[str, Any]] = []
+        statuses: dict[str, str] = {}
+
+        with self._lock:
+            self._running += 1
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    name = pending.pop(fut)
+                    try:
+                        res = fut.result()
+                    except BrokenProcessPool as e:
+                        self._discard(pool)
+                        res = {"repo": name, "status": "error", "error": f"scan process died: {e}", "files": 0, "candidates": [], "elapsed_s": None}
+                    if res["elapsed_s"] is not None:
+                        record("sweep_repo", res["elapsed_s"])
+
+                    cands = sorted(res["candidates"], key=rank_key)
+                    ranked = sorted(ranked + cands, key=rank_key)
+                    statuses[name] = res["status"]
+                    yield {
+                        "event": "repo",
+                        **res,
+                        "candidates": cands,
+                        "completed": len(statuses),
+                        "total": len(targets),
+                        "top": ranked[:top_k],
+                    }
+        finally:
+            for fut in pending:
+                fut.cancel()
+            with self._lock:
+                self._running -= 1
+                self._finished += 1
+
+        yield {
+            "event": "done",
+            "elapsed_s": round(time.perf_counter() - t0, 4),
+            "repos": statuses,
+            "candidates": ranked,
+        }
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"workers": self.workers, "running": self._running, "finished": self._finished, "started": self._pool is not None}
@@ -0,0 +1,193 @@
+"""
+test_impact.py
+
+test impact selection for the pytest validation step.
+
+keeps a per-repo import graph (python file -> imported module names) cached in
+memory and under WORK_ROOT. each refresh re-parses only files whose size/mtime
+changed. tests are selected when they transitively import a touched file.
+anything the graph cannot reason about (config/conftest changes, non-python
+files, files the graph has never seen) falls back to the full suite.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+from .settings import WORK_ROOT
+from .validate_plan import imported_modules, module_names
+
+log = logging.getLogger(__name__)
+
+SKIP_DIRS = {".git", "__pycache__", "node_modules", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache", ".ruff_cache"}
+# touching any of these can change how every test runs
+CONFIG_FILES = {"conftest.py", "pytest.ini", "pyproject.toml", "setup.cfg", "tox.ini", "setup.py"}
+# files python tests cannot import
+IGNORED_SUFFIXES = {".lua", ".md", ".rst"}
+GRAPH_VERSION = 1
+
+
+@dataclass
+class ImpactSelection:
+    # None means run the full suite
+    tests: list[str] | None
+    reason: str
+
+
+def is_test_file(rel: str) -> bool:
+    name = Path(rel).name
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+class ImportGraph:
+    def __init__(self, repo_path: Path, cache_path: Path | None = None) -> None:
+        self.repo_path = repo_path
+        self.cache_path = cache_path
+        # rel -> {"stamp": [size, mtime_ns], "imports": [...]}
+        self.files: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            if data.get("version") == GRAPH_VERSION:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+
+    def _save(self) -> None:
+        if self.cache_path is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # per process and thread, so concurrent saves never share a temp file
+        tmp = self.cache_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"version": GRAPH_VERSION, "files": self.files}), encoding="utf-8")
+        os.replace(tmp, self.cache_path)
+
+    def refresh(self) -> int:
+        """
+        stat every python file; re-parse the ones that changed. returns how many were parsed.
+        """
+        with self._lock:
+            seen: set[str] = set()
+            parsed = 0
+            for dirpath, dirnames, filenames in os.walk(self.repo_path):
+                dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+                base = Path(dirpath)
+                for name in filenames:
+                    if not name.endswith(".py"):
+                        continue
+                    p = base / name
+                    rel = p.relative_to(self.repo_path).as_posix()
+                    try:
+                        st = p.stat()
+                    except OSError:
+                        continue
+                    seen.add(rel)
+                    stamp = [st.st_size, st.st_mtime_ns]
+                    entry = self.files.get(rel)
+                    if entry is not None and entry["stamp"] == stamp:
+                        continue
+                    try:
+                        text = p.read_text(encoding="utf-8", errors="ignore")
+                    except OSError:
+                        continue
+                    self.files[rel] = {"stamp": stamp, "imports": sorted(imported_modules(rel, text))}
+                    parsed += 1
+
+            removed = set(self.files) - seen
+            for rel in removed:
+                del self.files[rel]
+            if parsed or removed:
+                self._save()
+            return parsed
+
+    def importers_of(self) -> dict[str, set[str]]:
+        # reverse edges: file -> files that import it
+        index: dict[str, set[str]] = {}
+        for rel in self.files:
+            for name in module_names(rel):
+                index.setdefault(name, set()).add(rel)
+
+        rev: dict[str, set[str]] = {}
+        for rel, entry in self.files.items():
+            for mod in entry["imports"]:
+                for target in index.get(mod, ()):
+                    if target != rel:
+                        rev.setdefault(target, set()).add(rel)
+        return rev
+
+    def importers(self, rels: set[str]) -> set[str]:
+        # direct importers only; select() follows the edges transitively
+        with self._lock:
+            rev = self.importers_of()
+        out: set[str] = set()
+        for rel in rels:
+            out |= rev.get(rel, set())
+        return out - rels
+
+    def select(self, touched: set[str]) -> ImpactSelection:
+        for rel in touched:
+            if Path(rel).name in CONFIG_FILES:
+                return ImpactSelection(None, f"config file touched: {rel}")
+
+        py = set()
+        for rel in touched:
+            suffix = Path(rel).suffix.lower()
+            if suffix == ".py":
+                py.add(rel)
+            elif suffix not in IGNORED_SUFFIXES:
+                return ImpactSelection(None, f"non-python file touched: {rel}")
+
+        with self._lock:
+            for rel in py:
+                if rel not in self.files and (self.repo_path / rel).exists():
+                    return ImpactSelection(None, f"import graph is stale for {rel}")
+            rev = self.importers_of()
+
+        seen = set(py)
+        queue = deque(py)
+        while queue:
+            cur = queue.popleft()
+            for nxt in rev.get(cur, ()):
+                if nxt not in seen:
+                    seen.add(nxt)
+                    queue.append(nxt)
+
+        tests = sorted(r for r in seen if is_test_file(r))
+        return ImpactSelection(tests, f"{len(tests)} test files import the touched files")
+
+
+_graphs: dict[Path, ImportGraph] = {}
+_graphs_lock = threading.Lock()
+
+
+def graph_for(repo_path: Path) -> ImportGraph:
+    repo_path = repo_path.resolve()
+    with _graphs_lock:
+        g = _graphs.get(repo_path)
+        if g is None:
+            key = hashlib.sha1(str(repo_path).encode("utf-8")).hexdigest()[:16]
+            g = ImportGraph(repo_path, WORK_ROOT / "test-impact" / f"{key}.json")
+            _graphs[repo_path] = g
+    return g
+
+
+def select_tests(repo_path: Path, touched: set[str]) -> ImpactSelection:
+    try:
+        g = graph_for(repo_path)
+        g.refresh()
+    except Exception as e:
+        log.exception("import graph refresh failed for %s", repo_path)
+        return ImpactSelection(None, f"import graph unavailable: {e}")
+    return g.select(touched)
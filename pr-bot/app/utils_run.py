@@ -1,25 +1,159 @@
 """
 utils_run.py
 
-a tiny wrapper around subprocess.run with timeout and combined stdout/stderr.
+a tiny wrapper around subprocess with timeout, cancellation and combined stdout/stderr.
+
+output is streamed: only the first and last RUN_LOG_HEAD_BYTES / RUN_LOG_TAIL_BYTES
+are kept in memory, and the full log can be spooled to a file. commands run in
+their own process group so a timeout or cancel also kills anything they spawned,
+optionally under setrlimit limits set by an exec wrapper (see sandbox.py).
 """
 
 from __future__ import annotations
 
+import os
+import signal
 import subprocess
+import threading
+import time
 from pathlib import Path
 
+from .sandbox import ResourceLimits
+from .settings import RUN_LOG_HEAD_BYTES, RUN_LOG_TAIL_BYTES
+
+# how often a running command checks its cancel event and deadline
+POLL_S = 0.2
+CHUNK = 64 * 1024
+
+
+class OutputBuffer:
+    """
+    bounded head + tail of a byte stream; the middle is counted but dropped.
+    """
+
+    def __init__(self, head_bytes: int = RUN_LOG_HEAD_BYTES, tail_bytes: int = RUN_LOG_TAIL_BYTES) -> None:
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data and self.tail_bytes > 0:
+            self.tail += data
+            if len(self.tail) > self.tail_bytes:
+                del self.tail[: len(self.tail) - self.tail_bytes]
+
+    @property
+    def truncated(self) -> int:
+        return self.total - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if self.truncated > 0:
+            return f"{head}\n... [{self.truncated} bytes truncated] ...\n{tail}"
+        return head + tail
+
+
+class AnyEvent:
+    """
+    read-only view that is set when any of the wrapped events is; lets a
+    caller-owned cancel (e.g. a job) and an internal one (fail-fast, best-of-n) combine.
+    """
+
+    def __init__(self, *events: threading.Event | AnyEvent | None) -> None:
+        self.events = [e for e in events if e is not None]
 
-def run_cmd(cmd: list[str], cwd: Path | None = None, timeout_s: int = 120) -> tuple[int, str]:
+    def is_set(self) -> bool:
+        return any(e.is_set() for e in self.events)
+
+
+def _kill_group(p: subprocess.Popen) -> None:
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        p.kill()
+
+
+def run_cmd(
+    cmd: list[str],
+    cwd: Path | None = None,
+    timeout_s: int = 120,
+    cancel: threading.Event | AnyEvent | None = None,
+    log_path: Path | None = None,
+    limits: ResourceLimits | None = None,
+) -> tuple[int, str]:
+    """
+    returns (exit code, bounded output). 124 = timeout, 130 = cancelled, 127 = could not start.
+    partial output is kept on timeout/cancel; log_path receives the complete output.
+    """
+    argv = limits.wrap(cmd) if limits is not None else cmd
     try:
-        p = subprocess.run(
-            cmd,
+        p = subprocess.Popen(
+            argv,
             cwd=str(cwd) if cwd else None,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            text=True,
-            timeout=timeout_s,
+            start_new_session=True,
         )
-        return p.returncode, p.stdout
-    except subprocess.TimeoutExpired:
-        return 124, f"timeout running: {' '.join(cmd)}"
+    except OSError as e:
+        return 127, f"failed to run {cmd[0]}: {e}"
+
+    buf = OutputBuffer()
+    spool = None
+    if log_path is not None:
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        spool = open(log_path, "wb")
+
+    def pump() -> None:
+        assert p.stdout is not None
+        while True:
+            data = p.stdout.read1(CHUNK)
+            if not data:
+                return
+            buf.write(data)
+            if spool is not None:
+                spool.write(data)
+
+    reader = threading.Thread(target=pump, name="run-cmd-output", daemon=True)
+    reader.start()
+
+    status = None
+    deadline = time.monotonic() + timeout_s
+    try:
+        while True:
+            try:
+                p.wait(timeout=max(0.0, min(deadline - time.monotonic(), POLL_S)))
+                break
+            except subprocess.TimeoutExpired:
+                if cancel is not None and cancel.is_set():
+                    status = "cancelled"
+                elif time.monotonic() >= deadline:
+                    status = "timeout"
+                if status is not None:
+                    _kill_group(p)
+                    p.wait()
+                    break
+        # grandchildren that kept the pipe open still hold the reader; don't wait on them forever
+        reader.join(timeout=5)
+        if reader.is_alive():
+            _kill_group(p)
+            reader.join(timeout=5)
+    finally:
+        if spool is not None:
+            spool.close()
+        if p.stdout is not None and not reader.is_alive():
+            p.stdout.close()
+
+    out = buf.text()
+    if status == "cancelled":
+        return 130, out + f"\ncancelled: {' '.join(cmd)}"
+    if status == "timeout":
+        return 124, f"timeout running: {' '.join(cmd)}\n{out}"
+    return p.returncode, out
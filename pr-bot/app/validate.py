@@ -2,47 +2,257 @@
 validate.py
 
 runs lightweight validations on the patched worktree.
+
+by default only the files a diff touched are compiled/linted (see validate_plan.py);
+full=True or VALIDATE_FULL=1 validates the whole worktree.
+
+the steps are independent, so up to VALIDATE_PARALLELISM of them run at once.
+each step reports started_at/ended_at (epoch seconds) and duration_s. the "log"
+field is the head+tail of the output; the full log is referenced by log_ref
+(spooled under WORK_ROOT/logs, see step_logs.py).
+commands run under the sandbox limits and wait for a global validation slot;
+queue_wait_s is the time a step spent waiting for one.
+
+when the source repo and the applied diff are known, results go through the
+validation cache (validate_cache.py).
 """
 
 from __future__ import annotations
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
-from .utils_run import run_cmd
+from .settings import VALIDATE_FULL, VALIDATE_TEST_IMPACT, VALIDATE_PARALLELISM, VALIDATE_FAIL_FAST, PYTEST_WORKERS
+from .metrics import record_validate_step, timed
+from .sandbox import VALIDATION_LIMITS, VALIDATION_SLOTS
+from .step_logs import log_ref, step_log_path
+from .test_impact import select_tests
+from .validate_cache import CACHE
+from .utils_run import AnyEvent, run_cmd
+from .validate_plan import plan_validation
+from .worktree_pool import POOL
+
 
+@dataclass
+class ValidationStep:
+    name: str
+    cmd: list[str]
+    timeout_s: int
+    # extra fields copied into the step report (scope, selection, ...)
+    info: dict[str, Any] = field(default_factory=dict)
+    # optional availability probe; a non-zero exit turns the step into a skip
+    probe: list[str] | None = None
+    skip_log: str = ""
 
-def repo_has_suffix(work: Path, suffix: str) -> bool:
-    try:
-        return any(p.suffix.lower() == suffix for p in work.rglob(f"*{suffix}"))
-    except Exception:
-        return False
 
+@lru_cache(maxsize=1)
+def pytest_xdist_available() -> bool:
+    rc, _ = run_cmd(["python", "-c", "import xdist"], timeout_s=20)
+    return rc == 0
 
-def validate_worktree(work: Path) -> tuple[bool, list[dict[str, Any]]]:
-    steps: list[dict[str, Any]] = []
 
-    if repo_has_suffix(work, ".py"):
-        rc, out = run_cmd(["python", "-m", "compileall", "-q", "."], cwd=work, timeout_s=180)
-        steps.append({"step": "python-compileall", "ok": rc == 0, "log": out})
+def pytest_worker_args() -> list[str]:
+    if not PYTEST_WORKERS or PYTEST_WORKERS == "0" or not pytest_xdist_available():
+        return []
+    return ["-n", PYTEST_WORKERS]
+
+
+def _run_step(step: ValidationStep, work: Path, cancel: AnyEvent) -> dict[str, Any]:
+    started = time.time()
+    entry: dict[str, Any] = {"step": step.name}
+    if cancel.is_set():
+        entry.update({"ok": False, "cancelled": True, "log": "cancelled"})
     else:
-        steps.append({"step": "python-compileall", "ok": True, "log": "skipped (no .py files found)"})
+        rc = 0
+        if step.probe is not None:
+            rc, found = run_cmd(step.probe, cwd=work, timeout_s=20)
+            rc = rc if found.strip() else 1
+        if rc != 0:
+            entry.update({"ok": True, "log": step.skip_log})
+        else:
+            with VALIDATION_SLOTS.slot(cancel) as waited:
+                if waited is None:
+                    entry.update({"ok": False, "cancelled": True, "log": "cancelled"})
+                else:
+                    log_path = step_log_path(step.name)
+                    rc, out = run_cmd(
+                        step.cmd, cwd=work, timeout_s=step.timeout_s, cancel=cancel,
+                        log_path=log_path, limits=VALIDATION_LIMITS,
+                    )
+                    entry.update({"ok": rc == 0, "log": out, **step.info, **log_ref(log_path), "queue_wait_s": waited})
+                    if rc == 130 and cancel.is_set():
+                        entry["cancelled"] = True
+    ended = time.time()
+    entry.update({"started_at": round(started, 3), "ended_at": round(ended, 3), "duration_s": round(ended - started, 3)})
+    return entry
+
+
+def run_steps(
+    work: Path,
+    steps: list[ValidationStep],
+    parallelism: int,
+    fail_fast: bool,
+    cancel: threading.Event | AnyEvent | None = None,
+) -> list[dict[str, Any]]:
+    """
+    run independent validation steps concurrently (at most `parallelism` at once).
+    with fail_fast the first failing step cancels the rest, killing running commands.
+    an external cancel (job cancellation) stops every step the same way.
+    results come back in planned order.
+    """
+    failed = threading.Event()
+    stop = AnyEvent(failed, cancel)
+    results: list[dict[str, Any] | None] = [None] * len(steps)
+    if not steps:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(steps))), thread_name_prefix="validate") as pool:
+        futures = {pool.submit(_run_step, step, work, stop): i for i, step in enumerate(steps)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            results[i] = fut.result()
+            record_validate_step(results[i]["step"], results[i]["duration_s"])
+            if fail_fast and not results[i]["ok"]:
+                failed.set()
+
+    return [r for r in results if r is not None]
+
+
+def validation_config(
+    full: bool | None = None,
+    test_impact: bool | None = None,
+    fail_fast: bool | None = None,
+) -> dict[str, Any]:
+    """
+    the effective step config; part of the validation cache key.
+    """
+    return {
+        "full": VALIDATE_FULL if full is None else full,
+        "test_impact": VALIDATE_TEST_IMPACT if test_impact is None else test_impact,
+        "fail_fast": VALIDATE_FAIL_FAST if fail_fast is None else fail_fast,
+        "pytest_workers": PYTEST_WORKERS,
+    }
+
+
+def cached_result(
+    source: Path,
+    diff: str,
+    branch: str | None = None,
+    full: bool | None = None,
+    test_impact: bool | None = None,
+    fail_fast: bool | None = None,
+    manifest: dict[str, tuple[int, int]] | None = None,
+) -> tuple[str | None, tuple[bool, list[dict[str, Any]]] | None]:
+    """
+    (cache key, stored result) for a diff against the source repo; the key is None when caching is off.
+    """
+    if not CACHE.enabled:
+        return None, None
+    key = CACHE.key(source, diff, validation_config(full, test_impact, fail_fast), branch=branch, manifest=manifest)
+    return key, CACHE.get(key)
+
+
+@timed("validate")
+def validate_worktree(
+    work: Path,
+    touched: set[str] | None = None,
+    full: bool | None = None,
+    test_impact: bool | None = None,
+    source: Path | None = None,
+    fail_fast: bool | None = None,
+    diff: str | None = None,
+    branch: str | None = None,
+    cancel: threading.Event | AnyEvent | None = None,
+) -> tuple[bool, list[dict[str, Any]]]:
+    key = None
+    if source is not None and diff is not None:
+        # the plan only depends on the tree and the options in the key (not on the scan
+        # scope), so /validate and /candidate/patch can share entries.
+        # the manifest the pooled worktree was synced to describes exactly the tree being validated
+        key, hit = cached_result(source, diff, branch, full, test_impact, fail_fast, manifest=POOL.manifest_for(work))
+        if hit is not None:
+            return hit
+
+    ok, report = _run_validation(work, touched, full, test_impact, source, fail_fast, cancel)
+    if key is not None:
+        CACHE.put(key, ok, report)
+    return ok, report
+
+
+def _run_validation(
+    work: Path,
+    touched: set[str] | None,
+    full: bool | None,
+    test_impact: bool | None,
+    source: Path | None,
+    fail_fast: bool | None,
+    cancel: threading.Event | AnyEvent | None = None,
+) -> tuple[bool, list[dict[str, Any]]]:
+    plan = plan_validation(work, touched, full=VALIDATE_FULL if full is None else full, source=source)
+    scope = "full" if plan.full else "incremental"
+    # steps that are decided without running anything, keyed by their slot in the report
+    static: list[tuple[int, dict[str, Any]]] = []
+    steps: list[ValidationStep] = []
+    order: list[str] = []
+
+    if plan.has_python and (plan.full or plan.compile_files):
+        targets = ["."] if plan.full else plan.compile_files
+        steps.append(ValidationStep(
+            "python-compileall", ["python", "-m", "compileall", "-q", *targets], 180,
+            info={"scope": scope, "files": len(targets) if not plan.full else None},
+        ))
+    elif not plan.has_python:
+        static.append((len(order), {"step": "python-compileall", "ok": True, "log": "skipped (no .py files found)"}))
+    else:
+        static.append((len(order), {"step": "python-compileall", "ok": True, "log": "skipped (diff touches no .py files)", "scope": scope}))
+    order.append("python-compileall")
 
     if (work / "pyproject.toml").exists() or (work / "ruff.toml").exists():
-        rc, out = run_cmd(["ruff", "check", "."], cwd=work, timeout_s=180)
-        steps.append({"step": "ruff-check", "ok": rc == 0, "log": out})
-
-    if (work / "tests").exists() or any(p.name.startswith("test_") for p in work.rglob("test_*.py")):
-        rc, out = run_cmd(["pytest", "-q"], cwd=work, timeout_s=300)
-        steps.append({"step": "pytest", "ok": rc == 0, "log": out})
-
-    if (work / ".luacheckrc").exists():
-        rc, which = run_cmd(["sh", "-lc", "command -v luacheck"], cwd=work, timeout_s=20)
-        if rc == 0 and which.strip():
-            rc, out = run_cmd(["luacheck", "."], cwd=work, timeout_s=180)
-            steps.append({"step": "luacheck", "ok": rc == 0, "log": out})
+        if plan.full or plan.lint_files:
+            targets = ["."] if plan.full else plan.lint_files
+            # --force-exclude keeps the repo's exclude config in effect for explicit paths
+            steps.append(ValidationStep(
+                "ruff-check", ["ruff", "check", "--force-exclude", *targets], 180,
+                info={"scope": scope, "files": len(targets) if not plan.full else None},
+            ))
+            order.append("ruff-check")
+
+    if plan.has_tests:
+        # None runs the full suite
+        tests: list[str] | None = None
+        selection = "full suite"
+        if (VALIDATE_TEST_IMPACT if test_impact is None else test_impact) and not plan.full:
+            # the graph is built from the unpatched source repo; the worktree only differs in touched files
+            sel = select_tests(source or work, set(plan.touched))
+            tests, selection = sel.tests, sel.reason
+        if tests == []:
+            static.append((len(order), {"step": "pytest", "ok": True, "log": "skipped (no tests import the touched files)", "selection": selection}))
         else:
-            steps.append({"step": "luacheck", "ok": True, "log": "skipped (luacheck not installed in container)"})
+            steps.append(ValidationStep(
+                "pytest", ["pytest", "-q", *pytest_worker_args(), *(tests or [])], 300,
+                info={"selection": selection},
+            ))
+        order.append("pytest")
+
+    if (work / ".luacheckrc").exists() and (plan.full or plan.lua_files):
+        targets = ["."] if plan.full else plan.lua_files
+        steps.append(ValidationStep(
+            "luacheck", ["luacheck", *targets], 180,
+            info={"scope": scope},
+            probe=["sh", "-lc", "command -v luacheck"],
+            skip_log="skipped (luacheck not installed in container)",
+        ))
+        order.append("luacheck")
+
+    ran = run_steps(work, steps, VALIDATE_PARALLELISM, VALIDATE_FAIL_FAST if fail_fast is None else fail_fast, cancel=cancel)
+    by_name = {r["step"]: r for r in ran}
+    static_at = dict(static)
+    report = [static_at[i] if i in static_at else by_name[name] for i, name in enumerate(order)]
 
-    ok = all(s["ok"] for s in steps)
-    return ok, steps
+    ok = all(s["ok"] for s in report)
+    return ok, report
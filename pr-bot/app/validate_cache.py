@@ -0,0 +1,229 @@
+"""
+validate_cache.py
+
+on-disk cache of validation results under WORK_ROOT.
+
+a result is keyed by the source repo contents (stat manifest + git head), the
+normalized diff, the validator tool versions and the effective step config, so
+re-validating the same diff against an unchanged repo (e.g. /validate right after
+/candidate/patch, or the empty baseline diff) returns the stored steps with
+`cached: true`. the store is bounded by VALIDATE_CACHE_MAX_BYTES; least recently
+used entries are evicted first.
+
+the stat manifest is the one the worktree pool syncs against, so a lookup does
+not walk the repo a second time, and the git head is only re-resolved when a
+ref file changed. spooled logs are pruned independently of the cache; a hit
+whose log is gone carries `log_expired: true` instead of a dangling log_ref.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from .diff_utils import parse_diff
+from .settings import VALIDATE_CACHE_MAX_BYTES, WORK_ROOT
+from .utils_run import run_cmd
+from .worktree import source_manifest
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+TOOLS = ("python", "ruff", "pytest", "luacheck")
+
+
+@lru_cache(maxsize=1)
+def tool_versions() -> dict[str, str]:
+    out: dict[str, str] = {}
+    for tool in TOOLS:
+        rc, text = run_cmd([tool, "--version"], timeout_s=30)
+        out[tool] = text.strip().splitlines()[0] if rc == 0 and text.strip() else "missing"
+    return out
+
+
+# (repo, branch) -> (stamp of the ref files, resolved head)
+_heads: dict[tuple[Path, str | None], tuple[tuple, str]] = {}
+_heads_lock = threading.Lock()
+
+
+def _ref_stamp(git_dir: Path, branch: str | None) -> tuple | None:
+    """
+    inode/mtime of every file that can move the head; ref updates are lockfile renames.
+    None when the refs cannot be read directly (linked worktree, unusual ref name).
+    """
+    if not git_dir.is_dir():
+        return None
+    try:
+        head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    names = ["HEAD", "packed-refs"]
+    if head.startswith("ref: "):
+        names.append(head[5:])
+    if branch:
+        if ".." in branch or branch.startswith("/"):
+            return None
+        names += [branch, f"refs/heads/{branch}", f"refs/remotes/{branch}", f"refs/tags/{branch}"]
+    stamp = []
+    for name in names:
+        try:
+            st = os.stat(git_dir / name)
+            stamp.append((name, st.st_ino, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append((name, None))
+    return tuple(stamp)
+
+
+def git_head(repo_path: Path, branch: str | None = None) -> str:
+    key = (repo_path.resolve(), branch)
+    stamp = _ref_stamp(repo_path / ".git", branch)
+    if stamp is not None:
+        with _heads_lock:
+            known = _heads.get(key)
+        if known is not None and known[0] == stamp:
+            return known[1]
+    rc, out = run_cmd(["git", "-C", str(repo_path), "rev-parse", branch or "HEAD"], timeout_s=30)
+    head = out.strip() if rc == 0 else "no-head"
+    if stamp is not None:
+        with _heads_lock:
+            _heads[key] = (stamp, head)
+    return head
+
+
+def repo_fingerprint(
+    repo_path: Path,
+    branch: str | None = None,
+    manifest: dict[str, tuple[int, int]] | None = None,
+) -> str:
+    """
+    manifest is a source_manifest() the caller already has (see WorktreePool.manifest_for).
+    """
+    if manifest is None:
+        manifest = source_manifest(repo_path)
+    h = hashlib.sha1()
+    for rel, (size, mtime_ns) in sorted(manifest.items()):
+        h.update(f"{rel}\0{size}\0{mtime_ns}\n".encode("utf-8", "surrogateescape"))
+    if (repo_path / ".git").exists():
+        # git-worktree validations follow the branch, not the working tree
+        h.update(git_head(repo_path, branch).encode("utf-8"))
+    return h.hexdigest()
+
+
+def diff_hash(diff: str) -> str:
+    # formatting-only differences (index lines, hunk header counts) hash the same
+    parsed = parse_diff(diff) if diff.strip() else None
+    text = parsed.compact() if parsed is not None and not parsed.errors else diff
+    return hashlib.sha1(text.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def cacheable(steps: list[dict[str, Any]]) -> bool:
+    # cancelled and timed-out runs say nothing stable about the diff
+    for s in steps:
+        if s.get("cancelled") or str(s.get("log", "")).startswith("timeout running"):
+            return False
+    return True
+
+
+def _mark_cached(step: dict[str, Any]) -> dict[str, Any]:
+    step = {**step, "cached": True}
+    ref = step.get("log_ref")
+    # spooled logs have their own retention (step_logs.prune_logs)
+    if ref is not None and not (WORK_ROOT / ref).is_file():
+        del step["log_ref"]
+        step.pop("log_bytes", None)
+        step["log_expired"] = True
+    return step
+
+
+class ValidationCache:
+    def __init__(self, max_bytes: int, root: Path | None = None) -> None:
+        self.max_bytes = max_bytes
+        self._root = root
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def root(self) -> Path:
+        return self._root if self._root is not None else WORK_ROOT / "validate-cache"
+
+    def key(
+        self,
+        repo_path: Path,
+        diff: str,
+        config: dict[str, Any],
+        branch: str | None = None,
+        manifest: dict[str, tuple[int, int]] | None = None,
+    ) -> str:
+        material = {
+            "version": CACHE_VERSION,
+            "repo": repo_fingerprint(repo_path, branch, manifest),
+            "diff": diff_hash(diff),
+            "tools": tool_versions(),
+            "config": config,
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> tuple[bool, list[dict[str, Any]]] | None:
+        path = self.root / f"{key}.json"
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            # mtime doubles as the lru clock
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data["ok"], [_mark_cached(s) for s in data["steps"]]
+
+    def put(self, key: str, ok: bool, steps: list[dict[str, Any]]) -> None:
+        if not cacheable(steps):
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{key}.json"
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"ok": ok, "steps": steps, "stored_at": time.time()}), encoding="utf-8")
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        entries: list[tuple[float, Path, int]] = []
+        total = 0
+        for p in self.root.glob("*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, p, st.st_size))
+            total += st.st_size
+        evicted = 0
+        for _, p, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        if evicted:
+            with self._lock:
+                self.evicted += evicted
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"enabled": self.enabled, "hits": self.hits, "misses": self.misses, "evicted": self.evicted}
+
+
+CACHE = ValidationCache(max_bytes=VALIDATE_CACHE_MAX_BYTES)
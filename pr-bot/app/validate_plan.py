@@ -0,0 +1,120 @@
+"""
+validate_plan.py
+
+decides what validate_worktree runs for a patch.
+
+incremental plans compile the python files the diff touched, lint those plus
+their direct importers (from the cached import graph in test_impact.py), and
+luacheck only touched lua files. "does this repo have python/tests" is answered
+from the same graph, which covers the whole source tree whatever the repo's
+scan scope, so a scoped scan never hides tests from validation. full plans keep
+the old whole-repo behavior.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .test_impact import ImportGraph
+
+IMPORT_RE = re.compile(r"^\s*(?:from\s+(\.*[\w.]*)\s+import\s+([\w., ()*]+)|import\s+([\w., ]+))", re.MULTILINE)
+
+
+@dataclass
+class ValidationPlan:
+    full: bool
+    has_python: bool
+    has_tests: bool
+    # repo-relative files; empty in full mode
+    compile_files: list[str] = field(default_factory=list)
+    lint_files: list[str] = field(default_factory=list)
+    lua_files: list[str] = field(default_factory=list)
+    touched: list[str] = field(default_factory=list)
+
+
+def module_names(rel: str) -> set[str]:
+    """
+    dotted names a python file can be imported as: from the repo root and, for
+    src/ style layouts, from each parent directory below it.
+    """
+    parts = Path(rel).with_suffix("").parts
+    if parts and parts[-1] == "__init__":
+        parts = parts[:-1]
+    return {".".join(parts[i:]) for i in range(len(parts)) if parts[i:]}
+
+
+def imported_modules(rel: str, text: str) -> set[str]:
+    """
+    absolute dotted names a module imports, with relative imports resolved
+    against its package. `from a import b` yields both a and a.b.
+    """
+    pkg = list(Path(rel).parent.parts)
+    out: set[str] = set()
+    for m in IMPORT_RE.finditer(text):
+        if m.group(3):
+            for name in m.group(3).split(","):
+                name = name.strip().split(" as ")[0].strip()
+                if name:
+                    out.add(name)
+            continue
+        base = m.group(1)
+        names = [n.strip().split(" as ")[0].strip() for n in m.group(2).strip("() ").split(",")]
+        if base.startswith("."):
+            dots = len(base) - len(base.lstrip("."))
+            anchor = pkg[: len(pkg) - (dots - 1)] if dots - 1 <= len(pkg) else []
+            rest = base.lstrip(".")
+            base = ".".join(anchor + ([rest] if rest else []))
+        if base:
+            out.add(base)
+        for n in names:
+            if n and n != "*":
+                out.add(f"{base}.{n}" if base else n)
+    return out
+
+
+def direct_importers(graph: ImportGraph, touched_py: list[str]) -> list[str]:
+    # the graph only re-parses files whose size/mtime changed
+    return sorted(graph.importers(set(touched_py)))
+
+
+def plan_validation(
+    work: Path,
+    touched: set[str] | None,
+    full: bool = False,
+    source: Path | None = None,
+) -> ValidationPlan:
+    """
+    source is the unpatched repo the worktree was built from; the import graph
+    is built there, since untouched files are identical.
+    """
+    # test_impact builds its graph with the parsers above
+    from .test_impact import graph_for, is_test_file
+
+    graph = graph_for(source or work)
+    graph.refresh()
+    has_python = bool(graph.files)
+    has_tests = (work / "tests").exists() or any(is_test_file(r) for r in graph.files)
+
+    # no diff information means nothing to narrow down to
+    if full or touched is None:
+        return ValidationPlan(full=True, has_python=has_python, has_tests=has_tests)
+
+    present = sorted(r for r in touched if (work / r).is_file())
+    touched_py = [r for r in present if r.endswith(".py")]
+    lua_files = [r for r in present if r.endswith(".lua")]
+    lint = sorted(set(touched_py) | set(direct_importers(graph, touched_py))) if touched_py else []
+
+    # a file the diff creates is not in the source graph
+    return ValidationPlan(
+        full=False,
+        has_python=has_python or bool(touched_py),
+        has_tests=has_tests,
+        compile_files=touched_py,
+        lint_files=lint,
+        lua_files=lua_files,
+        touched=sorted(touched),
+    )
@@ -0,0 +1,535 @@
+"""
+watcher.py
+
+live per-repo scan state, so /candidates can answer from memory.
+
+a watcher scans its repo once, then keeps per-file findings current: inotify
+events (or, without inotify, a periodic stat walk) mark files dirty, bursts
+such as a branch switch are debounced, and only the dirty files are rescanned.
+snapshots are rebuilt from memory without touching the file system; in poll
+mode a snapshot re-stats the tree first when the last walk is older than
+POLL_MAX_AGE_S, so it is never a whole poll interval behind. an inotify queue
+overflow re-adds watches for the whole tree before the stat walk, since
+directories created while events were dropped would otherwise stay unwatched.
+a scope root (or the repo root) that is removed, or missing at start, has no
+watch above it to report its return, so the inotify loop polls for it.
+
+files are kept in path order, which can pick a different evidence sample than
+a cold scan in walk order; the candidate ids are the same.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import logging
+import os
+import select
+import stat
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from .candidates import Findings, build_candidates, scan_file
+from .models import Candidate, RepoInfo
+from .repo_fs import fingerprint_entries, is_excluded, iter_files
+
+log = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+_EVENT = struct.Struct("iIII")
+
+# a steady stream of events still flushes every this many debounce intervals
+MAX_DEBOUNCE_FACTOR = 10
+# how often an idle inotify loop checks for stop
+IDLE_WAIT_S = 0.5
+# poll-mode snapshots older than this resync first
+POLL_MAX_AGE_S = 1.0
+
+
+@lru_cache(maxsize=1)
+def _libc() -> ctypes.CDLL | None:
+    try:
+        lib = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return lib if hasattr(lib, "inotify_init1") else None
+
+
+def inotify_available() -> bool:
+    return _libc() is not None
+
+
+class Inotify:
+    """
+    minimal ctypes binding: non-recursive directory watches on one fd.
+    """
+
+    def __init__(self) -> None:
+        lib = _libc()
+        if lib is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._lib = lib
+        self.fd = lib.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def add(self, path: Path) -> int:
+        wd = self._lib.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), str(path))
+        return wd
+
+    def read(self, timeout: float) -> list[tuple[int, int, str]]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events = []
+        off = 0
+        while off + _EVENT.size <= len(buf):
+            wd, mask, _cookie, n = _EVENT.unpack_from(buf, off)
+            name = buf[off + _EVENT.size: off + _EVENT.size + n].split(b"\0", 1)[0]
+            events.append((wd, mask, os.fsdecode(name)))
+            off += _EVENT.size + n
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _DirBudget:
+    """
+    the cap on inotify watches shared by every repo watcher.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.in_use >= self.capacity:
+                return False
+            self.in_use += 1
+            return True
+
+    def give(self, n: int = 1) -> None:
+        with self._lock:
+            self.in_use -= n
+
+
+@dataclass(frozen=True)
+class WatchSnapshot:
+    files: list[Path]
+    candidates: list[Candidate]
+    fingerprint: str
+    version: int
+
+
+class RepoWatcher:
+    def __init__(self, info: RepoInfo, backend: str, debounce_s: float, poll_s: float, dirs: _DirBudget) -> None:
+        self.info = info
+        self.backend = backend
+        self.mode = "starting"
+        self.debounce_s = debounce_s
+        self.poll_s = poll_s
+        self._dir_budget = dirs
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.ready = threading.Event()
+        # rel path -> (size, mtime_ns) for every file in scope
+        self._stats: dict[str, tuple[int, int]] = {}
+        # rel path -> findings, only for files that have some
+        self._findings: dict[str, Findings] = {}
+        self._dirty: set[str] = set()
+        self._wds: dict[int, Path] = {}
+        self._version = 0
+        self._snap: WatchSnapshot | None = None
+        self.events = 0
+        self.rescans = 0
+        self.resyncs = 0
+        self._synced_at = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"watch-{info.name}", daemon=True)
+
+    def matches(self, info: RepoInfo) -> bool:
+        return (info.repo_path, info.scope, info.exclude) == (self.info.repo_path, self.info.scope, self.info.exclude)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        self._stop.set()
+        if wait:
+            self._thread.join()
+
+    def snapshot(self) -> WatchSnapshot | None:
+        if not self.ready.is_set() or self._stop.is_set() or not self._thread.is_alive():
+            return None
+        if self.mode != "inotify" and time.monotonic() - self._synced_at > POLL_MAX_AGE_S:
+            # nothing pushes changes to a polling watcher; don't serve a stale tree
+            self._resync()
+        with self._lock:
+            # events already delivered are applied now rather than after the debounce
+            self._flush()
+            if self._snap is None:
+                rels = sorted(self._stats)
+                files = [self.info.repo_path / r for r in rels]
+                self._snap = WatchSnapshot(
+                    files=files,
+                    candidates=build_candidates(self._findings[r] for r in rels if r in self._findings),
+                    fingerprint=fingerprint_entries((p, *self._stats[r]) for p, r in zip(files, rels)),
+                    version=self._version,
+                )
+            return self._snap
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.mode,
+                "ready": self.ready.is_set(),
+                "files": len(self._stats),
+                "dirs": len(self._wds),
+                "dirty": len(self._dirty),
+                "events": self.events,
+                "rescans": self.rescans,
+                "resyncs": self.resyncs,
+                "version": self._version,
+            }
+
+    # scope rules, mirroring iter_files
+
+    def _included(self, rel: str) -> bool:
+        if ".git" in rel.split("/"):
+            return False
+        scope = self.info.scope
+        if scope and not any(rel == s.strip("/") or rel.startswith(s.strip("/") + "/") for s in scope):
+            return False
+        return not is_excluded(rel, self.info.exclude)
+
+    def _prunable(self, rel_dir: str) -> bool:
+        # a directory is skipped only when everything below it is excluded
+        if rel_dir.split("/")[-1] == ".git":
+            return True
+        return any(pat.endswith("*") and fnmatch.fnmatch(rel_dir + "/", pat) for pat in self.info.exclude)
+
+    def _rel(self, p: Path) -> str:
+        return p.relative_to(self.info.repo_path).as_posix()
+
+    # state updates; callers hold the lock
+
+    def _refresh(self, rel: str) -> bool:
+        st = None
+        if self._included(rel):
+            try:
+                st = (self.info.repo_path / rel).stat()
+            except OSError:
+                pass
+        if st is None or not stat.S_ISREG(st.st_mode):
+            self._findings.pop(rel, None)
+            return self._stats.pop(rel, None) is not None
+
+        key = (st.st_size, st.st_mtime_ns)
+        if self._stats.get(rel) == key:
+            return False
+        self._stats[rel] = key
+        try:
+            found = scan_file(self.info.repo_path / rel, self.info.repo_path)
+        except Exception:
+            found = {}
+        if found:
+            self._findings[rel] = found
+        else:
+            self._findings.pop(rel, None)
+        self.rescans += 1
+        return True
+
+    def _flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        changed = False
+        for rel in dirty:
+            changed |= self._refresh(rel)
+        if changed:
+            self._version += 1
+            self._snap = None
+
+    # background thread
+
+    def _resync(self) -> None:
+        """
+        full stat walk; only files whose size or mtime moved are rescanned.
+        """
+        started = time.monotonic()
+        current: dict[str, tuple[int, int]] = {}
+        for p in iter_files(self.info.repo_path, self.info.scope, self.info.exclude):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            current[self._rel(p)] = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            self._dirty.update(rel for rel, key in current.items() if self._stats.get(rel) != key)
+            self._dirty.update(self._stats.keys() - current.keys())
+            self._flush()
+            self.resyncs += 1
+            self._synced_at = max(self._synced_at, started)
+
+    def _roots(self) -> list[Path]:
+        return [self.info.repo_path / s for s in self.info.scope] if self.info.scope else [self.info.repo_path]
+
+    def _roots_reappeared(self) -> bool:
+        # a root that was removed (or never existed) and is a directory again;
+        # no watch reports that, so the inotify loop checks every IDLE_WAIT_S
+        watched = set(self._wds.values())
+        return any(r not in watched and r.is_dir() for r in self._roots())
+
+    def _rewatch(self, ino: Inotify) -> bool:
+        """
+        after a queue overflow: watch every directory again (adding is idempotent
+        per inode) and forget watches whose directory is gone. false at the cap.
+        """
+        seen: set[int] = set()
+        if not all(self._watch_tree(ino, r, seen=seen) for r in self._roots() if r.is_dir()):
+            return False
+        # their IN_IGNORED events may have been dropped with the rest
+        for wd in set(self._wds) - seen:
+            del self._wds[wd]
+            self._dir_budget.give()
+        return True
+
+    def _watch_tree(self, ino: Inotify, top: Path, found: set[str] | None = None, seen: set[int] | None = None) -> bool:
+        """
+        adds a watch for every directory under top. false once the watch cap is hit.
+        files seen on the way go into `found`, watch descriptors into `seen`.
+        """
+        for dirpath, dirnames, filenames in os.walk(top):
+            d = Path(dirpath)
+            rel_dir = "" if d == self.info.repo_path else self._rel(d)
+            if rel_dir and self._prunable(rel_dir):
+                dirnames[:] = []
+                continue
+            if not self._dir_budget.take():
+                return False
+            try:
+                wd = ino.add(d)
+            except OSError as e:
+                self._dir_budget.give()
+                if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                    dirnames[:] = []
+                    continue
+                # ENOSPC: the kernel's max_user_watches
+                return False
+            if wd in self._wds:
+                self._dir_budget.give()
+            self._wds[wd] = d
+            if seen is not None:
+                seen.add(wd)
+            dirnames[:] = [n for n in dirnames if n != ".git"]
+            if found is not None:
+                found.update(f"{rel_dir}/{n}" if rel_dir else n for n in filenames)
+        return True
+
+    def _handle(self, ino: Inotify, events: list[tuple[int, int, str]]) -> str:
+        """
+        turns events into dirty paths. returns "ok", "resync" (queue overflow)
+        or "poll" (a new directory could not be watched).
+        """
+        outcome = "ok"
+        dirty: set[str] = set()
+        for wd, mask, name in events:
+            self.events += 1
+            if mask & IN_Q_OVERFLOW:
+                outcome = "resync"
+                continue
+            if mask & IN_IGNORED:
+                gone = self._wds.pop(wd, None)
+                if gone is not None:
+                    self._dir_budget.give()
+                    if gone in self._roots():
+                        # nothing above a root is watched; drop its tree now, look for it again later
+                        outcome = "resync" if outcome == "ok" else outcome
+                continue
+            base = self._wds.get(wd)
+            if base is None or not name:
+                continue
+            path = base / name
+            rel = self._rel(path)
+            if not mask & IN_ISDIR:
+                dirty.add(rel)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                found: set[str] = set()
+                if not self._watch_tree(ino, path, found):
+                    outcome = "poll"
+                dirty |= found
+            else:
+                with self._lock:
+                    dirty |= {r for r in self._stats if r.startswith(rel + "/")}
+        with self._lock:
+            self._dirty |= dirty
+        return outcome
+
+    def _inotify_loop(self, ino: Inotify) -> bool:
+        """
+        returns false when the watch cap forces a switch to polling.
+        """
+        first = last = 0.0
+        next_root_check = time.monotonic() + IDLE_WAIT_S
+        while not self._stop.is_set():
+            if first:
+                timeout = max(0.0, min(last + self.debounce_s, first + MAX_DEBOUNCE_FACTOR * self.debounce_s) - time.monotonic())
+            else:
+                timeout = IDLE_WAIT_S
+            events = ino.read(timeout)
+            now = time.monotonic()
+            if events:
+                outcome = self._handle(ino, events)
+                if outcome == "poll":
+                    return False
+                if outcome == "resync":
+                    # watches first: files created after this are reported as events
+                    if not self._rewatch(ino):
+                        return False
+                    self._resync()
+                    first = 0.0
+                    continue
+                first = first or now
+                last = now
+            if now >= next_root_check:
+                next_root_check = now + IDLE_WAIT_S
+                if self._roots_reappeared():
+                    if not self._rewatch(ino):
+                        return False
+                    self._resync()
+                    first = 0.0
+                    continue
+            if first and (now - last >= self.debounce_s or now - first >= MAX_DEBOUNCE_FACTOR * self.debounce_s):
+                with self._lock:
+                    self._flush()
+                first = 0.0
+        return True
+
+    def _release(self, ino: Inotify) -> None:
+        ino.close()
+        self._dir_budget.give(len(self._wds))
+        self._wds.clear()
+
+    def _run(self) -> None:
+        ino = None
+        try:
+            if self.backend in ("auto", "inotify"):
+                try:
+                    ino = Inotify()
+                except OSError as e:
+                    log.warning("inotify unavailable for %s (%s); polling", self.info.name, e)
+            if ino is not None:
+                # watches go in before the first scan so edits made during it are not lost
+                if not all(self._watch_tree(ino, r) for r in self._roots() if r.is_dir()):
+                    log.warning("watch cap reached for %s; polling", self.info.name)
+                    self._release(ino)
+                    ino = None
+
+            self.mode = "inotify" if ino is not None else "poll"
+            self._resync()
+            self.ready.set()
+
+            if ino is not None:
+                if self._inotify_loop(ino):
+                    return
+                log.warning("watch cap reached for %s; polling", self.info.name)
+                self._release(ino)
+                ino = None
+                self.mode = "poll"
+                self._resync()
+            while not self._stop.wait(self.poll_s):
+                self._resync()
+        except Exception:
+            log.exception("watcher for %s stopped", self.info.name)
+        finally:
+            if ino is not None:
+                self._release(ino)
+
+
+class WatchManager:
+    def __init__(self, enabled: bool, backend: str, debounce_s: float, poll_s: float, max_dirs: int) -> None:
+        self.enabled = enabled
+        self.backend = backend
+        self.debounce_s = debounce_s
+        self.poll_s = poll_s
+        self._dirs = _DirBudget(max_dirs)
+        self._watchers: dict[str, RepoWatcher] = {}
+        self._lock = threading.Lock()
+
+    def start(self, info: RepoInfo) -> RepoWatcher:
+        """
+        (re)starts the watcher for a repo; a running one for the same name is replaced.
+        """
+        w = RepoWatcher(info, self.backend, self.debounce_s, self.poll_s, self._dirs)
+        with self._lock:
+            old = self._watchers.get(info.name)
+            self._watchers[info.name] = w
+        if old is not None:
+            old.stop()
+        w.start()
+        return w
+
+    def stop(self, name: str, wait: bool = False) -> bool:
+        with self._lock:
+            w = self._watchers.pop(name, None)
+        if w is None:
+            return False
+        w.stop(wait=wait)
+        return True
+
+    def get(self, name: str) -> RepoWatcher | None:
+        with self._lock:
+            return self._watchers.get(name)
+
+    def snapshot(self, info: RepoInfo) -> WatchSnapshot | None:
+        w = self.get(info.name)
+        if w is None:
+            return None
+        if not w.matches(info):
+            # scope or path changed behind our back (another worker process); rebuild
+            self.start(info)
+            return None
+        return w.snapshot()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            watchers, self._watchers = list(self._watchers.values()), {}
+        for w in watchers:
+            w.stop()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            watchers = dict(self._watchers)
+        return {
+            "enabled": self.enabled,
+            "dirs_in_use": self._dirs.in_use,
+            "max_dirs": self._dirs.capacity,
+            "repos": {name: w.stats() for name, w in sorted(watchers.items())},
+        }
@@ -2,35 +2,316 @@
 worktree.py
 
 creates an isolated worktree and applies diffs safely via git apply.
+
+worktrees are built by one of several strategies:
+- copytree: full shutil.copytree (always works, slowest)
+- reflink: per-file FICLONE copy-on-write clones (btrfs, xfs, ...)
+- hardlink: a hardlink farm; files are broken out into real copies before a patch writes them
+- git-worktree: `git worktree add` of the configured branch (committed state only)
+
+WORKTREE_STRATEGY=auto probes reflink and falls back to copytree.
+hardlink is never auto-selected: validation runs the repo's own tools in the
+worktree, and anything they rewrite in place (caches, snapshots, formatters)
+would write through to the source repo. it is an explicit opt-in for read-only use.
+git-worktree is never auto-selected since it ignores uncommitted changes in the repo.
 """
 
 from __future__ import annotations
 
+import fcntl
+import os
 import shutil
 import tempfile
+import threading
 from pathlib import Path
+from typing import Callable
 
 from fastapi import HTTPException
 
-from .settings import WORK_ROOT
+from .diff_utils import _diff_touched_files
+from .metrics import timed
+from .settings import WORK_ROOT, WORKTREE_STRATEGY
 from .utils_run import run_cmd
 
+# linux ioctl number for FICLONE (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+LEASE_NAME = ".lease"
+
+_detected: dict[Path, str] = {}
+# dir under WORK_ROOT -> fd holding its flock lease for as long as this process uses it
+_leases: dict[Path, int] = {}
+_leases_lock = threading.Lock()
+
+
+def _walk(src: Path):
+    for dirpath, dirnames, filenames in os.walk(src):
+        dirnames[:] = [d for d in dirnames if d != ".git"]
+        rel = Path(dirpath).relative_to(src)
+        yield rel, filenames
+
+
+def _reflink_file(src: str, dst: str) -> None:
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    shutil.copystat(src, dst)
+
+
+def _copy_copytree(repo_path: Path, dst: Path, branch: str | None) -> None:
+    shutil.copytree(repo_path, dst, dirs_exist_ok=True, ignore=shutil.ignore_patterns(".git"))
+
+
+def _copy_file(src: str, dst: str) -> None:
+    shutil.copy2(src, dst)
+
+
+FILE_COPIERS: dict[str, Callable[[str, str], None]] = {
+    "copytree": _copy_file,
+    "reflink": _reflink_file,
+    "hardlink": os.link,
+}
+
+
+def _copy_per_file(repo_path: Path, dst: Path, copy_file: Callable[[str, str], None]) -> None:
+    for rel, filenames in _walk(repo_path):
+        (dst / rel).mkdir(parents=True, exist_ok=True)
+        for name in filenames:
+            s = str(repo_path / rel / name)
+            d = str(dst / rel / name)
+            if os.path.islink(s):
+                # copytree semantics: symlinks are followed and copied as content
+                if os.path.exists(s):
+                    shutil.copy2(s, d)
+                continue
+            copy_file(s, d)
+
+
+def _copy_hardlink(repo_path: Path, dst: Path, branch: str | None) -> None:
+    _copy_per_file(repo_path, dst, os.link)
+
+
+def _copy_reflink(repo_path: Path, dst: Path, branch: str | None) -> None:
+    _copy_per_file(repo_path, dst, _reflink_file)
+
+
+def _copy_git_worktree(repo_path: Path, dst: Path, branch: str | None) -> None:
+    if not (repo_path / ".git").exists():
+        raise HTTPException(status_code=500, detail="git-worktree strategy needs a git repository")
+    rc, out = run_cmd(["git", "-C", str(repo_path), "worktree", "add", "--detach", str(dst), branch or "HEAD"], timeout_s=300)
+    if rc != 0:
+        raise HTTPException(status_code=500, detail=f"git worktree add failed:\n{out[:2000]}")
+
+
+STRATEGIES: dict[str, Callable[[Path, Path, str | None], None]] = {
+    "copytree": _copy_copytree,
+    "reflink": _copy_reflink,
+    "hardlink": _copy_hardlink,
+    "git-worktree": _copy_git_worktree,
+}
+
 
-def make_worktree(repo_path: Path) -> Path:
+def _first_file(repo_path: Path) -> Path | None:
+    for rel, filenames in _walk(repo_path):
+        for name in filenames:
+            p = repo_path / rel / name
+            if p.is_file() and not p.is_symlink():
+                return p
+    return None
+
+
+def new_workdir(prefix: str) -> Path:
+    """
+    mkdtemp under WORK_ROOT with a lease taken before anything is copied into it.
+    the lease is an flock on <dir>/.lease, so gc in any worker process can tell
+    live dirs (building, pooled or in use) from those whose owner is gone.
+    """
     WORK_ROOT.mkdir(parents=True, exist_ok=True)
-    tmpdir = Path(tempfile.mkdtemp(dir=str(WORK_ROOT), prefix="worktree-"))
-    shutil.copytree(repo_path, tmpdir / "repo", dirs_exist_ok=True, ignore=shutil.ignore_patterns(".git"))
+    d = Path(tempfile.mkdtemp(dir=str(WORK_ROOT), prefix=prefix))
+    fd = os.open(d / LEASE_NAME, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    with _leases_lock:
+        _leases[d] = fd
+    return d
+
+
+def release_workdir(d: Path) -> None:
+    with _leases_lock:
+        fd = _leases.pop(d, None)
+    if fd is not None:
+        os.close(fd)
+
+
+def lease_state(d: Path) -> str:
+    """
+    "held" while some process owns the dir, "free" once it is gone, "missing"
+    for a dir whose lease file does not exist (yet).
+    """
+    try:
+        fd = os.open(d / LEASE_NAME, os.O_RDWR | os.O_CLOEXEC)
+    except FileNotFoundError:
+        return "missing"
+    except OSError:
+        return "held"
+    try:
+        # a separate open file description, so this conflicts with our own leases too
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return "held"
+    finally:
+        os.close(fd)
+    return "free"
+
+
+def detect_strategy(repo_path: Path) -> str:
+    """
+    probe once per repo whether the repo + WORK_ROOT filesystems support reflink clones.
+    """
+    repo_path = repo_path.resolve()
+    if repo_path in _detected:
+        return _detected[repo_path]
+
+    strategy = "copytree"
+    sample = _first_file(repo_path)
+    if sample is not None:
+        probe_dir = new_workdir("probe-")
+        try:
+            try:
+                _reflink_file(str(sample), str(probe_dir / "reflink"))
+                strategy = "reflink"
+            except OSError:
+                pass
+        finally:
+            shutil.rmtree(probe_dir, ignore_errors=True)
+            release_workdir(probe_dir)
+
+    _detected[repo_path] = strategy
+    return strategy
+
+
+def resolve_strategy(repo_path: Path, strategy: str | None = None) -> str:
+    name = strategy or WORKTREE_STRATEGY
+    if name == "auto":
+        return detect_strategy(repo_path)
+    if name not in STRATEGIES:
+        raise HTTPException(status_code=500, detail=f"unknown worktree strategy: {name}")
+    return name
+
+
+@timed("make_worktree")
+def make_worktree(repo_path: Path, branch: str | None = None, strategy: str | None = None) -> Path:
+    name = resolve_strategy(repo_path, strategy)
+    tmpdir = new_workdir("worktree-")
+    try:
+        STRATEGIES[name](repo_path, tmpdir / "repo", branch)
+    except Exception:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        release_workdir(tmpdir)
+        raise
     return tmpdir / "repo"
 
 
-def apply_patch(work: Path, diff: str) -> None:
+def source_manifest(repo_path: Path) -> dict[str, tuple[int, int]]:
+    """
+    rel path -> (size, mtime_ns) for every file a worktree would contain.
+    """
+    out: dict[str, tuple[int, int]] = {}
+    for rel, filenames in _walk(repo_path):
+        for name in filenames:
+            try:
+                st = os.stat(repo_path / rel / name)
+            except OSError:
+                continue
+            out[(rel / name).as_posix()] = (st.st_size, st.st_mtime_ns)
+    return out
+
+
+def refresh_files(work: Path, repo_path: Path, rels: set[str], strategy: str) -> None:
+    """
+    make the given files in a worktree match the source repo again (restore, re-link or delete).
+    """
+    copy_file = FILE_COPIERS.get(strategy, _copy_file)
+    for rel in rels:
+        dst = work / rel
+        src = repo_path / rel
+        if dst.is_dir() and not dst.is_symlink():
+            shutil.rmtree(dst, ignore_errors=True)
+        else:
+            dst.unlink(missing_ok=True)
+        if src.is_file():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            copy_file(str(src), str(dst))
+
+
+def drifted_files(work: Path, repo_path: Path, manifest: dict[str, tuple[int, int]]) -> set[str]:
+    """
+    one walk of a worktree: files whose (size, mtime_ns) no longer match the source
+    manifest it was synced to (copies keep the source mtime, so anything written
+    since shows up), plus manifest files that are gone. directories the source
+    does not have (caches etc.) are removed on the way.
+    """
+    out = set(manifest)
+    for dirpath, dirnames, filenames in os.walk(work):
+        rel = Path(dirpath).relative_to(work)
+        for name in list(dirnames):
+            if name == ".git" or (repo_path / rel / name).is_dir():
+                continue
+            shutil.rmtree(Path(dirpath) / name, ignore_errors=True)
+            dirnames.remove(name)
+        for name in filenames:
+            key = (rel / name).as_posix()
+            try:
+                st = os.stat(Path(dirpath) / name)
+            except OSError:
+                continue
+            if manifest.get(key) == (st.st_size, st.st_mtime_ns):
+                out.discard(key)
+            else:
+                out.add(key)
+    return out
+
+
+def discard_worktree(work: Path) -> None:
+    # never delete anything that was not created under WORK_ROOT
+    if work.parent.resolve().parent != WORK_ROOT.resolve():
+        return
+    if (work / ".git").is_file():
+        # linked git worktree: let git drop its bookkeeping too
+        run_cmd(["git", "-C", str(work), "worktree", "remove", "--force", str(work)], timeout_s=120)
+    shutil.rmtree(work.parent, ignore_errors=True)
+    release_workdir(work.parent)
+
+
+def break_links(work: Path, rels: set[str]) -> None:
+    """
+    replace hardlinked files with private copies so writes never reach the source repo.
+    """
+    for rel in rels:
+        p = work / rel
+        try:
+            st = p.lstat()
+        except FileNotFoundError:
+            continue
+        if st.st_nlink <= 1 or not p.is_file():
+            continue
+        tmp = p.with_name(p.name + ".prbot-copy")
+        shutil.copy2(p, tmp)
+        os.replace(tmp, p)
+
+
+@timed("apply_patch")
+def apply_patch(work: Path, diff: str, min_context: int | None = None) -> None:
+    break_links(work, _diff_touched_files(diff))
+
     patch_file = work / "_patch.diff"
     patch_file.write_text(diff, encoding="utf-8")
 
-    rc, out = run_cmd(["git", "apply", "--check", str(patch_file)], cwd=work, timeout_s=60)
+    # min_context mirrors fuzz accepted by the in-process hunk matcher
+    opts = [f"-C{min_context}"] if min_context is not None else []
+
+    rc, out = run_cmd(["git", "apply", *opts, "--check", str(patch_file)], cwd=work, timeout_s=60)
     if rc != 0:
         raise HTTPException(status_code=400, detail=f"diff failed git apply --check:\n{out[:2000]}")
 
-    rc, out = run_cmd(["git", "apply", str(patch_file)], cwd=work, timeout_s=60)
+    rc, out = run_cmd(["git", "apply", *opts, str(patch_file)], cwd=work, timeout_s=60)
     if rc != 0:
         raise HTTPException(status_code=400, detail=f"diff failed git apply:\n{out[:2000]}")
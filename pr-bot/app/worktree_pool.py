@@ -0,0 +1,326 @@
+"""
+worktree_pool.py
+
+per-repo pool of pre-built worktrees plus garbage collection of WORK_ROOT.
+
+a checked-out worktree is first synced against the source repo (stat walk, only
+changed files are re-copied). copies keep the source mtime, so the source manifest
+doubles as the worktree's own: on checkin one walk of the worktree finds every
+file that differs from it (patched, rewritten or created by the validation run),
+those and the touched ones are restored or deleted, stray dirs are dropped, and
+the worktree goes back to the pool.
+every dir under WORK_ROOT carries a lease (see worktree.new_workdir) held by the
+process that built it. the gc only removes dirs whose lease is free, i.e. whose
+owner has exited: once older than the age limit, or oldest first while total
+disk use exceeds the quota.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from . import worktree as wt
+from .step_logs import prune_logs
+from .metrics import timed
+from .settings import WORK_ROOT, WORKTREE_POOL_SIZE
+
+log = logging.getLogger(__name__)
+
+GC_PREFIXES = ("worktree-", "probe-")
+
+
+@dataclass
+class _Entry:
+    work: Path
+    repo_path: Path
+    branch: str | None
+    strategy: str
+    # source stats the worktree was last synced to; also its own (copies keep mtime)
+    manifest: dict[str, tuple[int, int]]
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    uses: int = 0
+
+
+def tree_bytes(root: Path) -> int:
+    """
+    on-disk bytes under root; hardlinked inodes are only counted once.
+    """
+    seen: set[tuple[int, int]] = set()
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames + dirnames:
+            try:
+                st = os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            key = (st.st_dev, st.st_ino)
+            if key in seen:
+                continue
+            seen.add(key)
+            total += st.st_blocks * 512
+    return total
+
+
+class WorktreePool:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: dict[tuple[Path, str | None, str], list[_Entry]] = {}
+        self._in_use: dict[Path, _Entry] = {}
+        self._warming: set[tuple[Path, str | None, str]] = set()
+        self.hits = 0
+        self.misses = 0
+        self.gc_removed = 0
+        self.gc_freed_bytes = 0
+        self.disk_bytes = 0
+        self._gc_thread: threading.Thread | None = None
+
+    def _key(self, repo_path: Path, branch: str | None) -> tuple[Path, str | None, str]:
+        strategy = wt.resolve_strategy(repo_path)
+        return repo_path.resolve(), branch, strategy
+
+    def _poolable(self, strategy: str) -> bool:
+        # git worktrees track a commit, not the working tree we sync against
+        return self.size > 0 and strategy != "git-worktree"
+
+    def _build(self, key: tuple[Path, str | None, str], manifest: dict[str, tuple[int, int]] | None = None) -> _Entry:
+        repo_path, branch, strategy = key
+        if not self._poolable(strategy):
+            manifest = {}
+        elif manifest is None:
+            manifest = wt.source_manifest(repo_path)
+        work = wt.make_worktree(repo_path, branch=branch, strategy=strategy)
+        return _Entry(work=work, repo_path=repo_path, branch=branch, strategy=strategy, manifest=manifest)
+
+    def _sync(self, entry: _Entry, current: dict[str, tuple[int, int]] | None = None) -> None:
+        if current is None:
+            current = wt.source_manifest(entry.repo_path)
+        changed = {rel for rel, st in current.items() if entry.manifest.get(rel) != st}
+        changed |= set(entry.manifest) - set(current)
+        if changed:
+            wt.refresh_files(entry.work, entry.repo_path, changed, entry.strategy)
+        entry.manifest = current
+
+    @timed("worktree_checkout")
+    def checkout(
+        self,
+        repo_path: Path,
+        branch: str | None = None,
+        manifest: dict[str, tuple[int, int]] | None = None,
+    ) -> Path:
+        """
+        manifest is a source_manifest() of repo_path the caller just took; it
+        saves the sync walk.
+        """
+        key = self._key(repo_path, branch)
+        entry: _Entry | None = None
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                entry = idle.pop()
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is not None:
+            try:
+                self._sync(entry, manifest)
+            except Exception:
+                log.exception("pooled worktree %s failed to sync; rebuilding", entry.work)
+                wt.discard_worktree(entry.work)
+                entry = None
+
+        if entry is None:
+            entry = self._build(key, manifest)
+
+        entry.last_used = time.time()
+        entry.uses += 1
+        with self._lock:
+            self._in_use[entry.work] = entry
+        self.prewarm(repo_path, branch)
+        return entry.work
+
+    def checkin(self, work: Path, touched: set[str] | None = None) -> None:
+        """
+        return a worktree; every file that drifted from the manifest it was synced to
+        (plus the touched ones) is restored from the source first, and directories the
+        source does not have are removed. unknown or unpoolable worktrees are discarded.
+        """
+        with self._lock:
+            entry = self._in_use.pop(work, None)
+        if entry is None or not self._poolable(entry.strategy):
+            wt.discard_worktree(work)
+            return
+
+        key = (entry.repo_path, entry.branch, entry.strategy)
+        try:
+            rels = wt.drifted_files(work, entry.repo_path, entry.manifest)
+            rels |= set(touched or ())
+            wt.refresh_files(work, entry.repo_path, rels, entry.strategy)
+        except Exception:
+            log.exception("failed to reset worktree %s; discarding", work)
+            wt.discard_worktree(work)
+            return
+
+        entry.last_used = time.time()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append(entry)
+                return
+        wt.discard_worktree(work)
+
+    def manifest_for(self, work: Path) -> dict[str, tuple[int, int]] | None:
+        """
+        the source manifest a checked-out worktree was synced to, if the pool knows it.
+        """
+        with self._lock:
+            entry = self._in_use.get(work)
+        if entry is None or not self._poolable(entry.strategy):
+            return None
+        return entry.manifest
+
+    def _held(self, key: tuple[Path, str | None, str]) -> int:
+        # idle + checked-out worktrees for a repo; caller holds the lock
+        in_use = sum(1 for e in self._in_use.values() if (e.repo_path, e.branch, e.strategy) == key)
+        return len(self._idle.get(key, [])) + in_use
+
+    def prewarm(self, repo_path: Path, branch: str | None = None) -> None:
+        """
+        build worktrees in a background thread until the repo holds `size` of them.
+        """
+        key = self._key(repo_path, branch)
+        if not self._poolable(key[2]):
+            return
+        with self._lock:
+            if key in self._warming or self._held(key) >= self.size:
+                return
+            self._warming.add(key)
+
+        def run() -> None:
+            try:
+                while True:
+                    with self._lock:
+                        if self._held(key) >= self.size:
+                            return
+                    entry = self._build(key)
+                    with self._lock:
+                        self._idle.setdefault(key, []).append(entry)
+            except Exception:
+                log.exception("prewarming worktrees for %s failed", repo_path)
+            finally:
+                with self._lock:
+                    self._warming.discard(key)
+
+        threading.Thread(target=run, name="worktree-prewarm", daemon=True).start()
+
+    def _evict_idle(self) -> int:
+        # oldest idle worktree, if any; used when gc alone cannot get under quota
+        with self._lock:
+            entries = [(e.last_used, k, e) for k, idle in self._idle.items() for e in idle]
+            if not entries:
+                return 0
+            _, key, entry = min(entries, key=lambda t: t[0])
+            self._idle[key].remove(entry)
+        size = tree_bytes(entry.work.parent)
+        wt.discard_worktree(entry.work)
+        return size
+
+    def gc(self, max_age_s: float, max_bytes: int) -> dict[str, int]:
+        """
+        remove orphaned worktree dirs under WORK_ROOT (older than max_age_s), then
+        the oldest orphans and idle pooled ones while usage exceeds max_bytes (0 = no quota).
+        dirs leased by any live process (building, pooled, in use) are never touched.
+        spooled step logs get their own retention pass here too.
+        """
+        removed = freed = 0
+        if not WORK_ROOT.exists():
+            return {"removed": 0, "freed_bytes": 0, "disk_bytes": 0}
+        prune_logs()
+
+        now = time.time()
+        orphans: list[tuple[float, Path, int]] = []
+        total = 0
+        for d in WORK_ROOT.iterdir():
+            if not d.is_dir() or not d.name.startswith(GC_PREFIXES):
+                continue
+            size = tree_bytes(d)
+            total += size
+            state = wt.lease_state(d)
+            if state == "held":
+                continue
+            try:
+                mtime = d.stat().st_mtime
+            except OSError:
+                continue
+            if now - mtime > max_age_s:
+                shutil.rmtree(d, ignore_errors=True)
+                removed += 1
+                freed += size
+                total -= size
+            elif state == "free":
+                orphans.append((mtime, d, size))
+            # "missing": mkdtemp done, lease not taken yet; only the age limit applies
+
+        if max_bytes > 0:
+            for mtime, d, size in sorted(orphans):
+                if total <= max_bytes:
+                    break
+                shutil.rmtree(d, ignore_errors=True)
+                removed += 1
+                freed += size
+                total -= size
+            while total > max_bytes:
+                size = self._evict_idle()
+                if not size:
+                    break
+                removed += 1
+                freed += size
+                total -= size
+
+        with self._lock:
+            self.gc_removed += removed
+            self.gc_freed_bytes += freed
+            self.disk_bytes = total
+        return {"removed": removed, "freed_bytes": freed, "disk_bytes": total}
+
+    def start_gc(self, interval_s: float, max_age_s: float, max_bytes: int) -> None:
+        if self._gc_thread is not None and self._gc_thread.is_alive():
+            return
+
+        def loop() -> None:
+            while True:
+                try:
+                    self.gc(max_age_s, max_bytes)
+                except Exception:
+                    log.exception("worktree gc failed")
+                time.sleep(interval_s)
+
+        self._gc_thread = threading.Thread(target=loop, name="worktree-gc", daemon=True)
+        self._gc_thread.start()
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self.size,
+                "idle": sum(len(v) for v in self._idle.values()),
+                "in_use": len(self._in_use),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "gc_removed": self.gc_removed,
+                "gc_freed_bytes": self.gc_freed_bytes,
+                # as of the last gc pass
+                "disk_bytes": self.disk_bytes,
+            }
+
+
+POOL = WorktreePool(size=WORKTREE_POOL_SIZE)
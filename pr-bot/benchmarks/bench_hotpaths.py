@@ -0,0 +1,210 @@
+"""
+bench_hotpaths.py
+
+micro-benchmarks for the scan / diff / worktree hot paths on a synthetic repo
+(see synth_repo.py). results are written as json; pass --compare with the json
+of another commit to print per-benchmark speedups.
+
+usage:
+    python -m benchmarks.bench_hotpaths --files 20000 --out bench_hotpaths.json
+    python -m benchmarks.bench_hotpaths --files 20000 --compare before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable
+
+from app import worktree
+from app.candidates import grep_candidates
+from app.diff_utils import (
+    _diff_files_exist,
+    _diff_touched_files,
+    diff_paths_are_safe,
+    estimate_diff_churn,
+    parse_diff,
+    strip_to_unified_diff,
+)
+from app.llm_ollama import lua_reference_paths_exist
+from app.repo_fs import extract_context, iter_files
+from app.utils_run import run_cmd
+
+from .synth_repo import EXCLUDE_PATTERNS, SynthSpec, generate
+
+BENCHMARKS = (
+    "iter_files", "grep_candidates", "extract_context",
+    "parse_diff", "strip_to_unified_diff", "estimate_diff_churn", "diff_paths_are_safe",
+    "diff_files_exist", "diff_touched_files", "compact",
+    "lua_reference_paths_exist", "make_worktree",
+)
+
+
+def timeit(fn: Callable[[], Any], repeat: int, warmup: int = 1) -> dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    times: list[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {
+        "repeat": repeat,
+        "min_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+        "max_s": round(max(times), 6),
+    }
+
+
+def synth_diff(repo: Path, files: list[Path], n_files: int, hunks_per_file: int) -> str:
+    """
+    a valid multi-file diff against real repo content, with the chatter models wrap around it.
+    """
+    out = ["here is the patch:", "```diff"]
+    sources = [p for p in files if p.suffix in (".py", ".lua")][:n_files]
+    for p in sources:
+        rel = p.relative_to(repo).as_posix()
+        lines = p.read_text(encoding="utf-8").splitlines()
+        out += [f"diff --git a/{rel} b/{rel}", f"--- a/{rel}", f"+++ b/{rel}"]
+        step = max(len(lines) // max(hunks_per_file, 1), 4)
+        for start in range(0, len(lines) - 3, step)[:hunks_per_file]:
+            ctx = lines[start:start + 3]
+            out.append(f"@@ -{start + 1},3 +{start + 1},4 @@")
+            out += [f" {line}" for line in ctx]
+            comment = "--" if p.suffix == ".lua" else "#"
+            out.append(f"+{comment} bench {start}")
+    out.append("```")
+    return "\n".join(out) + "\n"
+
+
+def lua_ref_diff(repo: Path, files: list[Path], refs: int) -> str:
+    lua = [p.relative_to(repo).as_posix() for p in files if p.suffix == ".lua"]
+    if not lua:
+        return ""
+    target = lua[0]
+    added = [f'+dofile("{lua[i % len(lua)]}")' for i in range(refs)]
+    # a few references that only resolve through the basename fallback
+    added += [f'+dofile("elsewhere/{Path(lua[i % len(lua)]).name}")' for i in range(max(refs // 10, 1))]
+    return "\n".join([f"diff --git a/{target} b/{target}", f"--- a/{target}", f"+++ b/{target}",
+                      f"@@ -1,0 +1,{len(added)} @@", *added]) + "\n"
+
+
+def git_commit() -> str | None:
+    rc, out = run_cmd(["git", "rev-parse", "HEAD"], cwd=Path(__file__).resolve().parent, timeout_s=30)
+    return out.strip() if rc == 0 else None
+
+
+def run(repo: Path, repeat: int, only: set[str], diff_files: int, hunks: int, work_root: Path) -> list[dict[str, Any]]:
+    results: list[dict[str, Any]] = []
+
+    def record(name: str, fn: Callable[[], Any], n: int = repeat, **extra: Any) -> None:
+        if name in only:
+            results.append({"name": name, **timeit(fn, n), **extra})
+
+    files = iter_files(repo, [], EXCLUDE_PATTERNS)
+    record("iter_files", lambda: iter_files(repo, [], EXCLUDE_PATTERNS), files=len(files))
+
+    cands = grep_candidates(files, repo)
+    record("grep_candidates", lambda: grep_candidates(files, repo), candidates=len(cands))
+
+    evidence = [ev for c in cands for ev in c.evidence]
+    record("extract_context", lambda: extract_context(repo, evidence, radius=40), evidence=len(evidence))
+
+    raw = synth_diff(repo, files, diff_files, hunks)
+    diff = strip_to_unified_diff(raw)
+    parsed = parse_diff(diff)
+    size = {"diff_bytes": len(diff), "diff_files": len(parsed.files)}
+    record("strip_to_unified_diff", lambda: strip_to_unified_diff(raw), **size)
+    record("parse_diff", lambda: parse_diff(diff), **size)
+    # the str forms include the parse, the ParsedDiff forms show the per-call cost after it
+    record("estimate_diff_churn", lambda: (estimate_diff_churn(diff), estimate_diff_churn(parsed)), **size)
+    record("diff_paths_are_safe", lambda: (diff_paths_are_safe(diff), diff_paths_are_safe(parsed)), **size)
+    record("diff_files_exist", lambda: _diff_files_exist(repo, parsed), **size)
+    record("diff_touched_files", lambda: _diff_touched_files(parsed), **size)
+    record("compact", lambda: parsed.compact(), **size)
+
+    lua_diff = lua_ref_diff(repo, files, refs=50)
+    if lua_diff:
+        record("lua_reference_paths_exist", lambda: lua_reference_paths_exist(repo, lua_diff), refs=50)
+
+    if "make_worktree" in only:
+        worktree.WORK_ROOT = work_root
+        strategy = worktree.detect_strategy(repo)
+
+        def make_and_discard() -> None:
+            worktree.discard_worktree(worktree.make_worktree(repo, strategy=strategy))
+
+        record("make_worktree", make_and_discard, n=max(1, min(repeat, 3)), strategy=strategy)
+
+    return results
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> list[str]:
+    before = {r["name"]: r for r in baseline.get("results", [])}
+    lines = []
+    for r in current["results"]:
+        b = before.get(r["name"])
+        if b is None or not r["median_s"]:
+            continue
+        lines.append(f"{r['name']:<28} {b['median_s']:>10.4f}s -> {r['median_s']:>10.4f}s  x{b['median_s'] / r['median_s']:.2f}")
+    return lines
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=5000)
+    ap.add_argument("--py-ratio", type=float, default=0.6)
+    ap.add_argument("--median-lines", type=int, default=60)
+    ap.add_argument("--todo-density", type=float, default=0.01)
+    ap.add_argument("--global-density", type=float, default=0.05)
+    ap.add_argument("--excluded-trees", type=int, default=2)
+    ap.add_argument("--excluded-files", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--diff-files", type=int, default=8)
+    ap.add_argument("--hunks", type=int, default=4)
+    ap.add_argument("--only", default=",".join(BENCHMARKS))
+    ap.add_argument("--repo", type=Path, default=None, help="reuse a tree generated by synth_repo instead of building one")
+    ap.add_argument("--out", type=Path, default=None)
+    ap.add_argument("--compare", type=Path, default=None, help="json from an earlier run to compare against")
+    args = ap.parse_args()
+
+    spec = SynthSpec(
+        files=args.files, py_ratio=args.py_ratio, median_lines=args.median_lines,
+        todo_density=args.todo_density, global_density=args.global_density,
+        excluded_trees=args.excluded_trees, excluded_files=args.excluded_files, seed=args.seed,
+    )
+    root = Path(tempfile.mkdtemp(prefix="prbot-bench-"))
+    try:
+        t0 = time.perf_counter()
+        repo = args.repo or generate(root, spec)
+        generated_s = round(time.perf_counter() - t0, 3)
+        results = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "spec": asdict(spec) if args.repo is None else {"repo": str(args.repo)},
+            "generate_s": generated_s,
+            "results": run(repo, args.repeat, set(args.only.split(",")), args.diff_files, args.hunks, root / "work"),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    print(text)
+    if args.compare:
+        print("\n".join(compare(results, json.loads(args.compare.read_text(encoding="utf-8")))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+bench_worktree.py
+
+times every worktree strategy that works on this machine against a synthetic repo,
+plus a pooled checkout + checkin cycle (sync walk, patch, reset) per strategy.
+
+usage:
+    python -m benchmarks.bench_worktree --files 20000 --work-root /work --out bench_worktree.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app import worktree
+from app.worktree_pool import WorktreePool
+from app.utils_run import run_cmd
+
+
+def build_repo(root: Path, files: int, seed: int = 0) -> Path:
+    rng = random.Random(seed)
+    repo = root / "bench-repo"
+    for i in range(files):
+        d = repo / f"pkg{i % 50}" / f"sub{i % 7}"
+        d.mkdir(parents=True, exist_ok=True)
+        body = "".join(f"x{j} = {rng.randint(0, 1 << 30)}\n" for j in range(rng.randint(5, 80)))
+        (d / f"mod{i}.py").write_text(body, encoding="utf-8")
+    for cmd in (["git", "init", "-q", "-b", "main"], ["git", "add", "."],
+                ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-qm", "bench"]):
+        run_cmd(cmd, cwd=repo, timeout_s=600)
+    return repo
+
+
+def bench(repo: Path, strategy: str, repeat: int) -> dict:
+    times: list[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        try:
+            work = worktree.make_worktree(repo, branch="main", strategy=strategy)
+        except Exception as e:
+            return {"strategy": strategy, "ok": False, "error": str(getattr(e, "detail", e))[:300]}
+        times.append(time.perf_counter() - t0)
+        worktree.discard_worktree(work)
+    return {
+        "strategy": strategy,
+        "ok": True,
+        "repeat": repeat,
+        "min_s": round(min(times), 4),
+        "median_s": round(statistics.median(times), 4),
+        "max_s": round(max(times), 4),
+    }
+
+
+def bench_pool(repo: Path, strategy: str, repeat: int) -> dict:
+    pool = WorktreePool(size=1)
+    worktree.WORKTREE_STRATEGY = strategy
+    target = next(repo.rglob("mod*.py")).relative_to(repo).as_posix()
+    times: list[float] = []
+    # the first checkout builds the worktree; only warm cycles are timed
+    pool.checkin(pool.checkout(repo), set())
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        work = pool.checkout(repo)
+        (work / target).write_text("x = 0\n", encoding="utf-8")
+        pool.checkin(work, {target})
+        times.append(time.perf_counter() - t0)
+    for idle in pool._idle.values():
+        for entry in idle:
+            worktree.discard_worktree(entry.work)
+    return {
+        "strategy": strategy,
+        "repeat": repeat,
+        "min_s": round(min(times), 4),
+        "median_s": round(statistics.median(times), 4),
+        "max_s": round(max(times), 4),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--work-root", type=Path, default=None, help="defaults to a temp dir next to the synthetic repo")
+    ap.add_argument("--strategies", default=",".join(worktree.STRATEGIES))
+    ap.add_argument("--out", type=Path, default=None)
+    args = ap.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="prbot-bench-"))
+    try:
+        repo = build_repo(root, args.files)
+        worktree.WORK_ROOT = args.work_root or (root / "work")
+        results = {
+            "files": args.files,
+            "work_root": str(worktree.WORK_ROOT),
+            "detected": worktree.detect_strategy(repo),
+            "cpu_count": os.cpu_count(),
+            "results": [bench(repo, s, args.repeat) for s in args.strategies.split(",")],
+        }
+        results["pool"] = [
+            bench_pool(repo, r["strategy"], args.repeat)
+            for r in results["results"]
+            if r["ok"] and r["strategy"] != "git-worktree"
+        ]
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
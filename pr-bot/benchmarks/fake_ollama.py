@@ -0,0 +1,192 @@
+"""
+fake_ollama.py
+
+a stand-in for the ollama http api so pr-bot can be load tested without a gpu.
+
+implements /api/generate (streaming ndjson and non-streaming) and /api/tags.
+latency before the first token, tokens per second and an error rate are
+configurable. responses are either canned diffs (--diffs, a directory of .diff
+files served round-robin) or, by default, a diff synthesized from the evidence
+in the prompt: the first evidence line gets a harmless comment, so generated
+patches apply and validate against any repo.
+
+usage:
+    python -m benchmarks.fake_ollama --port 11434 --latency-ms 300 --tokens-per-s 40 --error-rate 0.02
+    OLLAMA_BASE_URL=http://localhost:11434 uvicorn app.main:app
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EVIDENCE_RE = re.compile(r"^file: (?P<path>.+)\nevidence: lines (?P<start>\d+)-\d+", re.MULTILINE)
+SNIPPET_RE = re.compile(r"^\s*(\d+): (.*)$")
+
+
+@dataclass
+class FakeConfig:
+    model: str = "qwen2.5-coder:7b"
+    latency_ms: float = 200.0
+    # modelled model load, paid by the first request only
+    load_ms: float = 0.0
+    tokens_per_s: float = 50.0
+    error_rate: float = 0.0
+    # canned responses; empty means synthesize from the prompt
+    diffs: list[str] = field(default_factory=list)
+    seed: int = 0
+
+
+def comment_prefix(path: str) -> str:
+    return "--" if path.endswith(".lua") else "#"
+
+
+def diff_from_prompt(prompt: str) -> str:
+    """
+    a one-line diff on the first evidence line of the prompt's repo context.
+    comment lines get a suffix; code lines get a comment line inserted above them.
+    """
+    m = EVIDENCE_RE.search(prompt)
+    if not m:
+        return ""
+    path, target = m.group("path"), int(m.group("start"))
+    snippet: dict[int, str] = {}
+    for line in prompt[m.end():].splitlines()[1:]:
+        sm = SNIPPET_RE.match(line)
+        if not sm:
+            if snippet:
+                break
+            continue
+        snippet[int(sm.group(1))] = sm.group(2)
+    if target not in snippet:
+        return ""
+
+    line = snippet[target]
+    prefix = comment_prefix(path)
+    before = [snippet[i] for i in range(max(target - 3, min(snippet)), target)]
+    after = [snippet[i] for i in range(target + 1, min(target + 4, max(snippet) + 1))]
+    start = target - len(before)
+
+    if prefix in line:
+        body = [f" {c}" for c in before] + [f"-{line}", f"+{line} (triaged)"] + [f" {c}" for c in after]
+        counts = (len(before) + 1 + len(after), len(before) + 1 + len(after))
+    else:
+        indent = line[: len(line) - len(line.lstrip())]
+        body = [f" {c}" for c in before] + [f"+{indent}{prefix} reviewed", f" {line}"] + [f" {c}" for c in after]
+        counts = (len(before) + 1 + len(after), len(before) + 2 + len(after))
+
+    return "\n".join([
+        f"diff --git a/{path} b/{path}",
+        f"--- a/{path}",
+        f"+++ b/{path}",
+        f"@@ -{start},{counts[0]} +{start},{counts[1]} @@",
+        *body,
+    ]) + "\n"
+
+
+def tokenize(text: str) -> list[str]:
+    # roughly 4 characters per token, like the real tokenizer on code
+    return [text[i:i + 4] for i in range(0, len(text), 4)] or [""]
+
+
+def create_app(cfg: FakeConfig) -> FastAPI:
+    app = FastAPI(title="fake ollama")
+    rng = random.Random(cfg.seed)
+    canned = itertools.cycle(cfg.diffs) if cfg.diffs else None
+    state = {"loaded": False}
+
+    def respond(prompt: str) -> str:
+        if canned is not None:
+            return next(canned)
+        return diff_from_prompt(prompt)
+
+    @app.get("/api/tags")
+    def tags() -> dict[str, Any]:
+        return {"models": [{"name": cfg.model, "model": cfg.model, "size": 0, "details": {"family": "fake"}}]}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        payload = await request.json()
+        if rng.random() < cfg.error_rate:
+            return JSONResponse({"error": "fake ollama: injected failure"}, status_code=500)
+
+        t0 = time.perf_counter_ns()
+        load_ns = 0
+        if not state["loaded"]:
+            state["loaded"] = True
+            load_ns = int(cfg.load_ms * 1e6)
+            await asyncio.sleep(cfg.load_ms / 1000)
+
+        prompt = str(payload.get("prompt", ""))
+        text = respond(prompt)
+        tokens = tokenize(text)
+        prompt_tokens = max(1, len(prompt) // 4)
+        per_token = 1.0 / cfg.tokens_per_s if cfg.tokens_per_s > 0 else 0.0
+
+        def stats(eval_ns: int) -> dict[str, Any]:
+            return {
+                "model": cfg.model,
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": time.perf_counter_ns() - t0,
+                "load_duration": load_ns,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(cfg.latency_ms * 1e6),
+                "eval_count": len(tokens),
+                "eval_duration": eval_ns,
+            }
+
+        # ollama streams unless told otherwise
+        if not payload.get("stream", True):
+            await asyncio.sleep(cfg.latency_ms / 1000 + per_token * len(tokens))
+            return {**stats(int(per_token * len(tokens) * 1e9)), "response": text}
+
+        async def stream() -> AsyncIterator[bytes]:
+            await asyncio.sleep(cfg.latency_ms / 1000)
+            e0 = time.perf_counter_ns()
+            for tok in tokens:
+                yield (json.dumps({"model": cfg.model, "response": tok, "done": False}) + "\n").encode()
+                await asyncio.sleep(per_token)
+            yield (json.dumps({**stats(time.perf_counter_ns() - e0), "response": ""}) + "\n").encode()
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--model", default=FakeConfig.model)
+    ap.add_argument("--latency-ms", type=float, default=FakeConfig.latency_ms)
+    ap.add_argument("--load-ms", type=float, default=FakeConfig.load_ms)
+    ap.add_argument("--tokens-per-s", type=float, default=FakeConfig.tokens_per_s)
+    ap.add_argument("--error-rate", type=float, default=FakeConfig.error_rate)
+    ap.add_argument("--diffs", type=Path, default=None, help="directory of .diff files to serve round-robin")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    diffs = [p.read_text(encoding="utf-8") for p in sorted(args.diffs.glob("*.diff"))] if args.diffs else []
+    cfg = FakeConfig(
+        model=args.model, latency_ms=args.latency_ms, load_ms=args.load_ms, tokens_per_s=args.tokens_per_s,
+        error_rate=args.error_rate, diffs=diffs, seed=args.seed,
+    )
+
+    import uvicorn
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+loadgen.py
+
+drives a running pr-bot at a fixed concurrency and reports throughput, latency
+percentiles per endpoint and an error breakdown. pair it with fake_ollama.py to
+size a deployment without a gpu.
+
+each worker loops until the duration (or request budget) is used up, picking
+an endpoint from --mix. /candidate/patch uses the first candidate of a fresh
+/candidates scan unless --candidate-id is given; /validate replays the most
+recent generated diff, or the empty baseline diff before one exists.
+
+usage:
+    python -m benchmarks.fake_ollama --port 11434 &
+    OLLAMA_BASE_URL=http://127.0.0.1:11434 uvicorn app.main:app --port 8000 &
+    python -m benchmarks.loadgen --repo demo --concurrency 16 --duration 60 --mix patch:3,validate:1
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+ENDPOINTS = {"patch": "/candidate/patch", "validate": "/validate", "candidates": "/candidates"}
+
+
+@dataclass
+class Stats:
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    errors: dict[str, dict[str, int]] = field(default_factory=dict)
+
+    def ok(self, endpoint: str, seconds: float) -> None:
+        self.latencies.setdefault(endpoint, []).append(seconds)
+
+    def error(self, endpoint: str, seconds: float, kind: str) -> None:
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        by_kind = self.errors.setdefault(endpoint, {})
+        by_kind[kind] = by_kind.get(kind, 0) + 1
+
+
+def percentile(values: list[float], q: float) -> float:
+    # nearest-rank on the sorted sample
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = max(0, min(len(s) - 1, math.ceil(q / 100 * len(s)) - 1))
+    return s[k]
+
+
+def parse_mix(mix: str) -> list[tuple[str, float]]:
+    out = []
+    for part in mix.split(","):
+        name, _, weight = part.partition(":")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint in --mix: {name} (use {', '.join(ENDPOINTS)})")
+        out.append((name, float(weight or 1)))
+    return out
+
+
+def error_kind(resp: httpx.Response) -> str:
+    try:
+        detail = str(resp.json().get("detail", ""))
+    except ValueError:
+        detail = resp.text
+    # first line is enough to group "diff does not apply: hunk line 3 ..." style errors
+    return f"{resp.status_code} {detail.splitlines()[0][:80] if detail else ''}".strip()
+
+
+async def run_load(args: argparse.Namespace) -> dict[str, Any]:
+    mix = parse_mix(args.mix)
+    names, weights = [m[0] for m in mix], [m[1] for m in mix]
+    stats = Stats()
+    rng = random.Random(args.seed)
+    state: dict[str, Any] = {"diff": "", "sent": 0}
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+        candidate_id = args.candidate_id
+        if candidate_id is None and "patch" in names:
+            r = await client.post("/candidates", json={"repo": args.repo})
+            if r.status_code != 200:
+                raise SystemExit(f"/candidates failed for {args.repo}: {error_kind(r)}")
+            cands = r.json()["candidates"]
+            if not cands:
+                raise SystemExit(f"repo {args.repo} has no candidates to patch")
+            candidate_id = cands[0]["id"]
+
+        deadline = time.monotonic() + args.duration
+
+        def body(name: str) -> dict[str, Any]:
+            if name == "patch":
+                return {"repo": args.repo, "candidate_id": candidate_id, "samples": args.samples}
+            if name == "validate":
+                return {"repo": args.repo, "diff": state["diff"]}
+            return {"repo": args.repo}
+
+        async def worker() -> None:
+            while time.monotonic() < deadline:
+                if args.requests and state["sent"] >= args.requests:
+                    return
+                state["sent"] += 1
+                name = rng.choices(names, weights)[0]
+                endpoint = ENDPOINTS[name]
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.post(endpoint, json=body(name))
+                except httpx.HTTPError as e:
+                    stats.error(endpoint, time.perf_counter() - t0, type(e).__name__)
+                    continue
+                elapsed = time.perf_counter() - t0
+                if resp.status_code != 200:
+                    stats.error(endpoint, elapsed, error_kind(resp))
+                    continue
+                stats.ok(endpoint, elapsed)
+                if name == "patch":
+                    state["diff"] = resp.json().get("diff", state["diff"])
+
+        t0 = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.monotonic() - t0
+
+    per_endpoint = {}
+    for endpoint, lat in sorted(stats.latencies.items()):
+        errors = sum(stats.errors.get(endpoint, {}).values())
+        per_endpoint[endpoint] = {
+            "requests": len(lat),
+            "errors": errors,
+            "throughput_rps": round(len(lat) / wall, 3) if wall else 0.0,
+            "p50_s": round(percentile(lat, 50), 4),
+            "p95_s": round(percentile(lat, 95), 4),
+            "p99_s": round(percentile(lat, 99), 4),
+            "max_s": round(max(lat), 4),
+            "error_breakdown": stats.errors.get(endpoint, {}),
+        }
+    total = sum(len(v) for v in stats.latencies.values())
+    return {
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "mix": args.mix,
+        "wall_s": round(wall, 3),
+        "requests": total,
+        "throughput_rps": round(total / wall, 3) if wall else 0.0,
+        "endpoints": per_endpoint,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--repo", required=True)
+    ap.add_argument("--candidate-id", default=None)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = duration only)")
+    ap.add_argument("--mix", default="patch:1,validate:1")
+    ap.add_argument("--samples", type=int, default=1)
+    ap.add_argument("--timeout", type=float, default=900.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=Path, default=None)
+    args = ap.parse_args()
+
+    report = asyncio.run(run_load(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+synth_repo.py
+
+deterministic synthetic repo generator for the benchmarks.
+
+the same spec + seed always produces byte-identical trees, so timings from
+different commits are comparable. knobs cover file count (1k..500k), the
+python/lua mix, a log-normal file size distribution, TODO and lua global
+density, and node_modules-style trees that scans are expected to exclude.
+
+usage:
+    python -m benchmarks.synth_repo --files 100000 --out /tmp/synth
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app.utils_run import run_cmd
+
+EXCLUDE_PATTERNS = ["node_modules/*", "*/node_modules/*"]
+
+
+@dataclass(frozen=True)
+class SynthSpec:
+    files: int = 5000
+    # share of source files that are python; the rest are lua
+    py_ratio: float = 0.6
+    # log-normal line counts: median lines per file and spread
+    median_lines: int = 60
+    sigma: float = 0.9
+    max_lines: int = 4000
+    # chance per line of a TODO/FIXME/HACK marker
+    todo_density: float = 0.01
+    # chance per lua line of an implicit global assignment
+    global_density: float = 0.05
+    # chance that a lua file dofile()s a sibling module
+    dofile_density: float = 0.2
+    # node_modules-style trees and files per tree (not counted in `files`)
+    excluded_trees: int = 2
+    excluded_files: int = 2000
+    dirs_per_level: int = 20
+    seed: int = 0
+    git: bool = False
+
+
+MARKERS = ("TODO", "FIXME", "HACK")
+
+
+def _lines(rng: random.Random, spec: SynthSpec) -> int:
+    n = int(rng.lognormvariate(math.log(spec.median_lines), spec.sigma))
+    return max(1, min(n, spec.max_lines))
+
+
+def _py_file(rng: random.Random, spec: SynthSpec, idx: int) -> str:
+    out = [f'"""synthetic module {idx}"""', "", "import os", ""]
+    for j in range(_lines(rng, spec)):
+        r = rng.random()
+        if r < spec.todo_density:
+            out.append(f"# {rng.choice(MARKERS)}: clean up value {j}")
+        elif r < 0.1:
+            out.append(f"def fn_{j}(a, b={j}):\n    return a + b")
+        elif r < 0.11:
+            out.append("try:\n    pass\nexcept:\n    pass")
+        else:
+            out.append(f"value_{j} = {rng.randint(0, 1 << 20)}")
+    return "\n".join(out) + "\n"
+
+
+def _lua_file(rng: random.Random, spec: SynthSpec, idx: int, siblings: list[str]) -> str:
+    out = [f"-- synthetic module {idx}", "local M = {}"]
+    if siblings and rng.random() < spec.dofile_density:
+        out.append(f'dofile("{rng.choice(siblings)}")')
+    for j in range(_lines(rng, spec)):
+        r = rng.random()
+        if r < spec.todo_density:
+            out.append(f"-- {rng.choice(MARKERS)}: tidy field {j}")
+        elif r < spec.todo_density + spec.global_density:
+            out.append(f"global_{j} = {rng.randint(0, 1000)}")
+        else:
+            out.append(f"local v{j} = {rng.randint(0, 1 << 20)}")
+    out.append("return M")
+    return "\n".join(out) + "\n"
+
+
+def _rel_dir(i: int, spec: SynthSpec) -> Path:
+    # two levels of fan-out keeps directories reasonably sized at 500k files
+    k = spec.dirs_per_level
+    return Path(f"pkg{i % k}") / f"mod{(i // k) % k}"
+
+
+def generate(root: Path, spec: SynthSpec) -> Path:
+    """
+    write the tree for `spec` under root/"synth-repo" and return it.
+    a manifest.json next to the repo records the spec and what was produced.
+    """
+    rng = random.Random(spec.seed)
+    repo = root / "synth-repo"
+    repo.mkdir(parents=True, exist_ok=True)
+
+    counts = {"py": 0, "lua": 0, "excluded": 0, "bytes": 0}
+    lua_by_dir: dict[Path, list[str]] = {}
+    made: set[Path] = set()
+
+    for i in range(spec.files):
+        rel_dir = _rel_dir(i, spec)
+        if rel_dir not in made:
+            (repo / rel_dir).mkdir(parents=True, exist_ok=True)
+            made.add(rel_dir)
+        if rng.random() < spec.py_ratio:
+            name = f"m{i}.py"
+            text = _py_file(rng, spec, i)
+            counts["py"] += 1
+        else:
+            name = f"m{i}.lua"
+            siblings = lua_by_dir.setdefault(rel_dir, [])
+            text = _lua_file(rng, spec, i, [(rel_dir / s).as_posix() for s in siblings[-8:]])
+            siblings.append(name)
+            counts["lua"] += 1
+        data = text.encode("utf-8")
+        (repo / rel_dir / name).write_bytes(data)
+        counts["bytes"] += len(data)
+
+    for t in range(spec.excluded_trees):
+        base = repo / ("node_modules" if t == 0 else f"pkg{t}/node_modules")
+        for i in range(spec.excluded_files):
+            d = base / f"dep{i % 100}" / "lib"
+            d.mkdir(parents=True, exist_ok=True)
+            (d / f"index{i}.js").write_text(f"// TODO vendored {i}\nmodule.exports = {i};\n", encoding="utf-8")
+            counts["excluded"] += 1
+
+    if spec.git:
+        for cmd in (["git", "init", "-q", "-b", "main"], ["git", "add", "."],
+                    ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-qm", "synth"]):
+            run_cmd(cmd, cwd=repo, timeout_s=3600)
+
+    (root / "manifest.json").write_text(json.dumps({"spec": asdict(spec), "counts": counts}, indent=2), encoding="utf-8")
+    return repo
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", type=Path, required=True)
+    for name, default in asdict(SynthSpec()).items():
+        kind = type(default)
+        if kind is bool:
+            ap.add_argument(f"--{name.replace('_', '-')}", action="store_true", default=default)
+        else:
+            ap.add_argument(f"--{name.replace('_', '-')}", type=kind, default=default)
+    args = vars(ap.parse_args())
+    out = args.pop("out")
+    repo = generate(out, SynthSpec(**args))
+    print(repo)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ from __future__ import annotations
 from pathlib import Path
 import pytest
 
+from app import step_logs, test_impact, validate_cache, worktree, worktree_pool
+
 
 @pytest.fixture()
 def tmp_repo(tmp_path: Path) -> Path:
@@ -13,3 +15,18 @@ def tmp_repo(tmp_path: Path) -> Path:
     repo = tmp_path / "repo"
     repo.mkdir()
     return repo
+
+
+@pytest.fixture()
+def work_root(tmp_path: Path, monkeypatch) -> Path:
+    """
+    points worktree creation and gc at a temp WORK_ROOT.
+    """
+    root = tmp_path / "work"
+    monkeypatch.setattr(worktree, "WORK_ROOT", root)
+    monkeypatch.setattr(worktree_pool, "WORK_ROOT", root)
+    monkeypatch.setattr(validate_cache, "WORK_ROOT", root)
+    monkeypatch.setattr(test_impact, "WORK_ROOT", root)
+    monkeypatch.setattr(step_logs, "WORK_ROOT", root)
+    monkeypatch.setattr(worktree, "_detected", {})
+    return root
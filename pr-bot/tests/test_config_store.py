@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+from pathlib import Path
+
+from app import config_store
+from app.config_store import ConfigStore
+
+
+def test_load_is_cached_until_the_file_changes(tmp_path: Path, monkeypatch):
+    path = tmp_path / "repos.json"
+    path.write_text(json.dumps({"repos": {"a": {"path": "a"}}}), encoding="utf-8")
+    store = ConfigStore(path)
+
+    parses = []
+    real_loads = json.loads
+    monkeypatch.setattr(config_store.json, "loads", lambda s: parses.append(1) or real_loads(s))
+
+    assert store.get_repo("a") == {"path": "a"}
+    store.load()["repos"]["a"]["path"] = "mutated"
+    assert store.list_repos() == {"a": {"path": "a"}}
+    assert len(parses) == 1
+
+    # another process rewrites the file
+    path.write_text(json.dumps({"repos": {"b": {"path": "bb"}}}), encoding="utf-8")
+    assert store.list_repos() == {"b": {"path": "bb"}}
+    assert len(parses) == 2
+
+
+def test_writes_are_atomic_and_leave_no_temp_files(tmp_path: Path):
+    path = tmp_path / "cfg" / "repos.json"
+    store = ConfigStore(path)
+    store.upsert_repo("a", {"path": "a"})
+    store.update_repo("a", lambda r: r.update(branch="dev"))
+
+    assert json.loads(path.read_text(encoding="utf-8")) == {"repos": {"a": {"path": "a", "branch": "dev"}}}
+    assert sorted(p.name for p in path.parent.iterdir()) == ["repos.json", "repos.json.lock"]
+
+
+def _add_repos(path: str, worker: int, n: int) -> None:
+    store = ConfigStore(Path(path))
+    for i in range(n):
+        store.upsert_repo(f"w{worker}-{i}", {"path": str(i)})
+
+
+def test_concurrent_upserts_from_several_processes_are_not_lost(tmp_path: Path):
+    path = tmp_path / "repos.json"
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_add_repos, args=(str(path), w, 20)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+
+    assert len(ConfigStore(path).list_repos()) == 80
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from app.diff_utils import strip_to_unified_diff, estimate_diff_churn, diff_paths_are_safe
+from app.diff_utils import strip_to_unified_diff, estimate_diff_churn, diff_paths_are_safe, parse_diff
 
 
 def test_strip_to_unified_diff_prefers_fenced_block():
@@ -45,3 +45,45 @@ def test_diff_paths_are_safe_rejects_absolute_and_traversal():
 
     ok = "diff --git a/cotlua/src/root.lua b/cotlua/src/root.lua\n--- a/cotlua/src/root.lua\n+++ b/cotlua/src/root.lua\n"
     assert diff_paths_are_safe(ok) is True
+
+
+def test_parse_diff_builds_files_and_hunks():
+    diff = (
+        "diff --git a/a.py b/a.py\n"
+        "--- a/a.py\n"
+        "+++ b/a.py\n"
+        "@@ -1,3 +1,3 @@ def f():\n"
+        " x = 1\n"
+        "-y = 2\n"
+        "+y = 3\n"
+        "\n"
+    )
+    parsed = parse_diff(diff)
+    assert parsed.errors == []
+    assert parsed.touched_paths == {"a.py"}
+    hunk = parsed.files[0].hunks[0]
+    assert (hunk.old_start, hunk.old_count, hunk.new_start, hunk.new_count) == (1, 3, 1, 3)
+    # a blank context line is kept as ' '
+    assert hunk.lines == [" x = 1", "-y = 2", "+y = 3", " "]
+    assert parsed.added_lines == ["y = 3"]
+    assert parsed.compact().startswith("diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -1,3 +1,3 @@ def f():\n")
+
+
+def test_parse_diff_counts_added_lines_that_look_like_headers():
+    diff = "diff --git a/a b/a\n--- a/a\n+++ b/a\n@@ -1 +1,2 @@\n x\n+++y\n"
+    assert estimate_diff_churn(diff) == (1, 1, 0)
+
+
+def test_parse_diff_reports_hunk_count_mismatch():
+    truncated = "diff --git a/a b/a\n--- a/a\n+++ b/a\n@@ -1,3 +1,3 @@\n x\n-y\n+z\n"
+    assert "truncated" in parse_diff(truncated).errors[0]
+
+    overlong = "diff --git a/a b/a\n--- a/a\n+++ b/a\n@@ -1 +1 @@\n-y\n+z\n+w\n"
+    assert "outside any hunk" in parse_diff(overlong).errors[0]
+
+
+def test_parse_diff_flags_index_lines():
+    diff = "diff --git a/a b/a\nindex 123..456 100644\n--- a/a\n+++ b/a\n@@ -1 +1 @@\n-reindex x\n+reindex y\n"
+    parsed = parse_diff(diff)
+    assert parsed.has_index_line is True
+    assert "index 123" not in parsed.compact()
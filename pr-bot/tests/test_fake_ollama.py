@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.repo_fs import extract_context
+from app.utils_run import run_cmd
+from benchmarks.fake_ollama import FakeConfig, create_app, diff_from_prompt
+from benchmarks.loadgen import percentile
+
+
+def _client(**kw) -> TestClient:
+    return TestClient(create_app(FakeConfig(latency_ms=0, tokens_per_s=0, **kw)))
+
+
+def test_tags_and_generate_modes_report_stats():
+    client = _client(diffs=["diff --git a/x b/x\n"])
+    assert client.get("/api/tags").json()["models"][0]["name"] == FakeConfig.model
+
+    r = client.post("/api/generate", json={"prompt": "p" * 40, "stream": False})
+    body = r.json()
+    assert body["response"] == "diff --git a/x b/x\n"
+    assert body["done"] and body["prompt_eval_count"] == 10 and body["eval_count"] > 0
+
+    r = client.post("/api/generate", json={"prompt": "p", "stream": True})
+    chunks = [json.loads(line) for line in r.text.splitlines()]
+    assert "".join(c["response"] for c in chunks) == "diff --git a/x b/x\n"
+    assert chunks[-1]["done"] and "eval_duration" in chunks[-1]
+
+
+def test_error_rate_injects_failures():
+    client = _client(error_rate=1.0)
+    r = client.post("/api/generate", json={"prompt": "p", "stream": False})
+    assert r.status_code == 500 and "error" in r.json()
+
+
+def test_synthesized_diff_applies_to_the_prompted_repo(tmp_repo: Path):
+    (tmp_repo / "a.py").write_text("import os\n\n\n# TODO: tidy\nx = 1\n", encoding="utf-8")
+    (tmp_repo / "b.lua").write_text("local M = {}\nglobal_x = 1\nreturn M\n", encoding="utf-8")
+    run_cmd(["git", "init", "-q"], cwd=tmp_repo)
+
+    for ev in ({"path": "a.py", "start": 4, "end": 4}, {"path": "b.lua", "start": 2, "end": 2}):
+        diff = diff_from_prompt("task...\n" + extract_context(tmp_repo, [ev]))
+        assert diff.startswith(f"diff --git a/{ev['path']}")
+        (tmp_repo / "p.diff").write_text(diff, encoding="utf-8")
+        rc, out = run_cmd(["git", "apply", "--check", "p.diff"], cwd=tmp_repo)
+        assert rc == 0, out
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.config_store import ConfigStore
+from app.diff_utils import parse_diff
+from app.hunk_apply import check_diff_applies
+
+
+def _write(repo: Path, n: int = 20) -> None:
+    (repo / "a.py").write_text("".join(f"line{i}\n" for i in range(1, n + 1)), encoding="utf-8")
+
+
+def test_applies_at_declared_position(tmp_repo: Path):
+    _write(tmp_repo)
+    diff = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -4,3 +4,3 @@\n line4\n-line5\n+LINE5\n line6\n"
+
+    res = check_diff_applies(tmp_repo, parse_diff(diff))
+
+    assert res.ok, res.error
+    assert res.contents["a.py"][3:6] == ["line4", "LINE5", "line6"]
+
+
+def test_offset_search_finds_shifted_hunk(tmp_repo: Path):
+    _write(tmp_repo)
+    diff = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -1,3 +1,3 @@\n line10\n-line11\n+X\n line12\n"
+
+    assert check_diff_applies(tmp_repo, parse_diff(diff), max_offset=0).ok is False
+    res = check_diff_applies(tmp_repo, parse_diff(diff), max_offset=20)
+    assert res.ok
+    assert res.contents["a.py"][10] == "X"
+
+
+def test_reports_mismatched_context_line(tmp_repo: Path):
+    _write(tmp_repo)
+    diff = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -4,3 +4,3 @@\n line4\n-line5\n+LINE5\n lineSIX\n"
+
+    res = check_diff_applies(tmp_repo, parse_diff(diff), max_offset=5)
+
+    assert res.ok is False
+    assert "hunk line 3 expects 'lineSIX' but file line 6 is 'line6'" in res.error
+
+
+def test_fuzz_drops_outer_context(tmp_repo: Path):
+    _write(tmp_repo)
+    diff = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -4,3 +4,3 @@\n lineFOUR\n-line5\n+LINE5\n line6\n"
+
+    assert check_diff_applies(tmp_repo, parse_diff(diff)).ok is False
+    res = check_diff_applies(tmp_repo, parse_diff(diff), fuzz=1)
+    assert res.ok
+    assert res.min_context == 0
+    assert res.contents["a.py"][3:6] == ["line4", "LINE5", "line6"]
+
+
+def test_refuses_paths_outside_the_repo(tmp_repo: Path, tmp_path: Path):
+    _write(tmp_repo)
+    (tmp_path / "secret.txt").write_text("root:x:0:0\n", encoding="utf-8")
+    (tmp_repo / "link.py").symlink_to(tmp_path / "secret.txt")
+
+    for path in ("../secret.txt", str(tmp_path / "secret.txt"), "link.py", "../missing.txt"):
+        diff = f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n@@ -1,1 +1,1 @@\n-x\n+y\n"
+        res = check_diff_applies(tmp_repo, parse_diff(diff))
+        assert res.ok is False
+        assert res.error == f"{path}: path is outside the repo"
+        assert "root:x" not in res.error
+
+
+def test_validate_rejects_unsafe_paths_before_reading(tmp_path: Path, monkeypatch):
+    (tmp_path / "repos" / "demo").mkdir(parents=True)
+    store = ConfigStore(tmp_path / "repos.json")
+    store.upsert_repo("demo", {"path": "demo"})
+    monkeypatch.setattr(main, "REPO_ROOT", tmp_path / "repos")
+    monkeypatch.setattr(main, "STORE", store)
+
+    diff = "diff --git a/../../../../etc/passwd b/../../../../etc/passwd\n--- a/../../../../etc/passwd\n+++ b/../../../../etc/passwd\n@@ -1,1 +1,1 @@\n-x\n+y\n"
+    r = TestClient(main.app).post("/validate", json={"repo": "demo", "diff": diff})
+    assert r.status_code == 400
+    assert r.json()["detail"] == "diff contains unsafe paths (absolute or traversal)"
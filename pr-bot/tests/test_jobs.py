@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import main
+from app.jobs import JobQueue
+
+
+def _wait_done(job, timeout_s: float = 5.0) -> None:
+    assert job.done.wait(timeout_s)
+
+
+def test_jobs_run_by_priority_then_fifo():
+    q = JobQueue(workers=1, max_finished=16)
+    gate = threading.Event()
+    order: list[str] = []
+
+    blocker = q.submit("t", lambda job: gate.wait(5))
+    jobs = [
+        q.submit("t", lambda job: order.append("low"), priority="low"),
+        q.submit("t", lambda job: order.append("normal-1")),
+        q.submit("t", lambda job: order.append("high"), priority="high"),
+        q.submit("t", lambda job: order.append("normal-2")),
+    ]
+    gate.set()
+    for job in [blocker, *jobs]:
+        _wait_done(job)
+    assert order == ["high", "normal-1", "normal-2", "low"]
+
+
+def test_cancel_queued_and_running_jobs():
+    q = JobQueue(workers=1, max_finished=16)
+    started = threading.Event()
+
+    def slow(job):
+        started.set()
+        while True:
+            job.progress("generate")
+            time.sleep(0.01)
+
+    running = q.submit("t", slow)
+    queued = q.submit("t", lambda job: "never")
+    assert started.wait(5)
+
+    q.cancel(queued.id)
+    q.cancel(running.id)
+    _wait_done(running)
+    _wait_done(queued)
+    assert running.status == "cancelled"
+    assert queued.status == "cancelled"
+    assert queued.started_at is None
+
+
+def test_failed_job_reraises_the_route_error():
+    q = JobQueue(workers=1, max_finished=16)
+
+    def boom(job):
+        raise HTTPException(status_code=400, detail="diff does not apply")
+
+    job = q.submit("t", boom)
+    _wait_done(job)
+    assert job.status == "failed"
+    try:
+        job.outcome()
+    except HTTPException as e:
+        assert (e.status_code, e.detail) == (400, "diff does not apply")
+    else:
+        raise AssertionError("expected HTTPException")
+
+
+def test_job_endpoints_report_progress_over_sse(monkeypatch):
+    monkeypatch.setattr(main, "JOBS", JobQueue(workers=1, max_finished=16))
+
+    def fake_patch(req, job):
+        for stage in ("scan", "context", "generate", "apply", "validate"):
+            job.progress(stage)
+        return main.PatchResponse(repo=req.repo, candidate_id=req.candidate_id, diff="", notes="{}")
+
+    monkeypatch.setattr(main, "_patch", fake_patch)
+    client = TestClient(main.app)
+
+    r = client.post("/jobs/patch", json={"repo": "r", "candidate_id": "c"}, params={"priority": "low"})
+    job_id = r.json()["job_id"]
+
+    with client.stream("GET", f"/jobs/{job_id}/events") as resp:
+        body = "".join(resp.iter_text())
+    stages = [line.split('"stage": "')[1].split('"')[0] for line in body.splitlines() if line.startswith("data: ")]
+    assert stages == ["scan", "context", "generate", "apply", "validate", "done"]
+
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "succeeded"
+    assert client.get(f"/jobs/{job_id}/result").json()["candidate_id"] == "c"
+    # the synchronous route is a wrapper around the same job
+    assert client.post("/candidate/patch", json={"repo": "r", "candidate_id": "c"}).json()["repo"] == "r"
+
+
+def test_sync_route_cancels_its_job_when_the_client_disconnects(monkeypatch):
+    q = JobQueue(workers=1, max_finished=16)
+    monkeypatch.setattr(main, "JOBS", q)
+    monkeypatch.setattr(main, "DISCONNECT_POLL_S", 0.05)
+    started = threading.Event()
+    jobs = []
+
+    def slow_validate(req, job):
+        jobs.append(job)
+        started.set()
+        while not job.cancel.is_set():
+            time.sleep(0.01)
+
+    monkeypatch.setattr(main, "_validate", slow_validate)
+
+    async def run() -> list[dict]:
+        inbox: asyncio.Queue = asyncio.Queue()
+        sent: list[dict] = []
+        await inbox.put({"type": "http.request", "body": json.dumps({"repo": "r"}).encode(), "more_body": False})
+
+        async def send(message):
+            sent.append(message)
+
+        async def disconnect():
+            # hang up once the job is actually running
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            await inbox.put({"type": "http.disconnect"})
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": "/validate", "raw_path": b"/validate", "root_path": "", "query_string": b"",
+            "headers": [(b"content-type", b"application/json"), (b"host", b"test")],
+            "client": ("127.0.0.1", 1), "server": ("test", 80),
+        }
+        hangup = asyncio.create_task(disconnect())
+        await asyncio.wait_for(main.app(scope, inbox.get, send), timeout=10)
+        await hangup
+        return sent
+
+    sent = asyncio.run(run())
+
+    assert sent[0]["status"] == 499
+    _wait_done(jobs[0])
+    assert jobs[0].status == "cancelled"
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app import main, metrics
+from app.repo_fs import iter_files
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    h.observe(0.05, "scan")
+    h.observe(0.5, "scan")
+    lines = h.render()
+    assert 't_seconds_bucket{stage="scan",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="scan",le="1.0"} 2' in lines
+    assert 't_seconds_bucket{stage="scan",le="+Inf"} 2' in lines
+    assert 't_seconds_count{stage="scan"} 2' in lines
+
+
+def test_timings_follow_the_request_into_copied_contexts():
+    with metrics.collect() as timings:
+        with metrics.timed("outer"):
+            pass
+        ctx = contextvars.copy_context()
+        t = threading.Thread(target=ctx.run, args=(metrics.record, "inner", 0.25))
+        t.start()
+        t.join()
+        stats = metrics.record_ollama({"eval_count": 50, "eval_duration": 2_000_000_000, "load_duration": 10_000_000})
+
+    assert stats["tokens_per_s"] == 25.0
+    assert stats["load_duration_s"] == 0.01
+    out = timings.as_dict()
+    assert set(out["stages"]) == {"outer", "inner"}
+    assert out["ollama"] == [stats]
+    # outside collect() nothing is attributed to a request
+    metrics.record("stray", 1.0)
+    assert "stray" not in timings.as_dict()["stages"]
+
+
+def test_scan_counters_and_metrics_endpoint(tmp_repo: Path):
+    (tmp_repo / "a.py").write_text("x = 1\n", encoding="utf-8")
+    (tmp_repo / "vendor").mkdir()
+    (tmp_repo / "vendor" / "b.py").write_text("y = 2\n", encoding="utf-8")
+
+    files = iter_files(tmp_repo, [], ["vendor/*"])
+    assert [p.name for p in files] == ["a.py"]
+
+    body = TestClient(main.app).get("/metrics").text
+    assert 'prbot_scan_skipped_total{reason="exclude"}' in body
+    assert 'prbot_stage_seconds_count{stage="iter_files"}' in body
+    assert "prbot_worktree_disk_bytes" in body
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+from app import patching
+from app.worktree_pool import WorktreePool
+from app.models import Candidate, Policy, RepoInfo
+
+
+GOOD_DIFF = (
+    "diff --git a/a.lua b/a.lua\n"
+    "--- a/a.lua\n"
+    "+++ b/a.lua\n"
+    "@@ -1,2 +1,2 @@\n"
+    "--- TODO: fix thing\n"
+    "+-- NOTE: fix thing\n"
+    " print('hi')\n"
+)
+
+BAD_CONTEXT_DIFF = GOOD_DIFF.replace(" print('hi')", " print('bye')")
+
+
+def _setup(work_root: Path, tmp_repo: Path, monkeypatch, outputs: list[str]):
+    (tmp_repo / "a.lua").write_text("-- TODO: fix thing\nprint('hi')\n", encoding="utf-8")
+
+    prompts: list[str] = []
+
+    def fake_generate(prompt: str, **kwargs) -> str:
+        prompts.append(prompt)
+        return outputs.pop(0)
+
+    monkeypatch.setattr(patching, "POOL", WorktreePool(size=0))
+    monkeypatch.setattr(patching, "ollama_generate", fake_generate)
+
+    info = RepoInfo(name="r", repo_path=tmp_repo, branch="main", scope=[], exclude=[], policy=Policy())
+    cand = Candidate(
+        id="lua-todo-triage", title="t", rationale="r", language="lua", risk="low", churn_estimate="small",
+        evidence=[{"path": "a.lua", "start": 1, "end": 1, "why": "todo"}],
+    )
+    return info, patching.build_patch_context(info, cand), prompts
+
+
+def test_repair_loop_feeds_apply_error_back(work_root: Path, tmp_repo: Path, monkeypatch):
+    info, pctx, prompts = _setup(work_root, tmp_repo, monkeypatch, [BAD_CONTEXT_DIFF, GOOD_DIFF])
+
+    out = patching.generate_patch(info, pctx, repair_attempts=2)
+
+    assert [a["ok"] for a in out.attempts] == [False, True]
+    # caught by the in-process matcher before any worktree exists
+    assert out.attempts[0]["stage"] == "match"
+    assert "file line 2 is \"print('hi')\"" in out.attempts[0]["error"]
+    assert "print('bye')" in prompts[1]
+    assert prompts[1].startswith(pctx.prompt)
+    assert (out.work / "a.lua").read_text(encoding="utf-8").startswith("-- NOTE")
+
+
+def test_without_repair_first_rejection_is_raised(work_root: Path, tmp_repo: Path, monkeypatch):
+    info, pctx, _ = _setup(work_root, tmp_repo, monkeypatch, [BAD_CONTEXT_DIFF, GOOD_DIFF])
+
+    with pytest.raises(HTTPException) as ei:
+        patching.generate_patch(info, pctx)
+    assert ei.value.status_code == 400
+
+
+def test_best_of_n_returns_first_validated_sample(work_root: Path, tmp_repo: Path, monkeypatch):
+    info, pctx, _ = _setup(work_root, tmp_repo, monkeypatch, [BAD_CONTEXT_DIFF, GOOD_DIFF])
+    monkeypatch.setattr(patching, "validate_worktree", lambda work, **kwargs: (True, []))
+
+    out = patching.sample_patches(info, pctx, samples=2)
+
+    assert out.validation_ok is True
+    assert out.outcome.diff == GOOD_DIFF
+    statuses = sorted(e["status"] for e in out.samples)
+    # the loser is either rejected or still running (reported cancelled) when the winner lands
+    assert statuses in (["rejected", "validated"], ["cancelled", "validated"])
+
+
+def test_first_sample_uses_the_single_shot_options():
+    assert patching.sample_settings(0, 3) == patching.sample_settings(0, 1) == (0.2, None)
+    assert [patching.sample_settings(i, 3)[1] for i in (1, 2)] == [2, 3]
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from app import prefetch
+from app.models import Candidate, Policy, RepoInfo
+from app.patching import PatchContext, PatchLimits, PatchOutcome
+
+
+def _cand(cid: str) -> Candidate:
+    return Candidate(id=cid, title="t", rationale="r", language="lua", risk="low", churn_estimate="small", evidence=[])
+
+
+def _wait_for(fn, timeout_s: float = 5.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        out = fn()
+        if out:
+            return out
+        time.sleep(0.01)
+    return None
+
+
+def test_prefetch_stores_validated_patches_for_top_k(tmp_repo: Path, monkeypatch):
+    generated: list[str] = []
+
+    def fake_context(info, cand, **kwargs):
+        return PatchContext(cand=cand, prompt="p", target_file=None, limits=PatchLimits(8, 250, True, True))
+
+    def fake_generate(info, pctx, cancel=None):
+        generated.append(pctx.cand.id)
+        return PatchOutcome(diff=f"diff for {pctx.cand.id}", work=tmp_repo, files_touched=1, added=1, removed=1)
+
+    monkeypatch.setattr(prefetch, "build_patch_context", fake_context)
+    monkeypatch.setattr(prefetch, "generate_patch", fake_generate)
+    monkeypatch.setattr(prefetch, "validate_patch", lambda pctx, outcome: (True, []))
+    monkeypatch.setattr(prefetch, "release_patch", lambda outcome: None)
+
+    info = RepoInfo(name="r", repo_path=tmp_repo, branch="main", scope=[], exclude=[], policy=Policy())
+    pf = prefetch.Prefetcher(top_k=2, max_entries=8)
+    pf.schedule(info, [_cand("a"), _cand("b"), _cand("c")], "fp1")
+
+    hit = _wait_for(lambda: pf.lookup(prefetch.prefetch_key(info, "fp1", "b")))
+    assert hit is not None
+    assert hit.sampled.outcome.diff == "diff for b"
+    assert sorted(generated) == ["a", "b"]
+    # a different snapshot of the same repo is never served from the old one
+    assert pf.lookup(prefetch.prefetch_key(info, "fp2", "b")) is None
+    # nor is a request that asks for more than the speculative run did
+    for opts in (prefetch.PatchOptions(full_validation=True), prefetch.PatchOptions(samples=4), prefetch.PatchOptions(repair_attempts=1)):
+        assert pf.lookup(prefetch.prefetch_key(info, "fp1", "b", opts)) is None
+    assert pf.lookup(prefetch.prefetch_key(info, "fp1", "b", prefetch.PatchOptions())) is hit
+
+
+def test_interactive_request_preempts_background_generation(tmp_repo: Path, monkeypatch):
+    started = []
+
+    def fake_context(info, cand, **kwargs):
+        return PatchContext(cand=cand, prompt="p", target_file=None, limits=PatchLimits(8, 250, True, True))
+
+    def slow_generate(info, pctx, cancel=None):
+        started.append(pctx.cand.id)
+        cancel.wait(5)
+        raise prefetch.GenerationCancelled()
+
+    monkeypatch.setattr(prefetch, "build_patch_context", fake_context)
+    monkeypatch.setattr(prefetch, "generate_patch", slow_generate)
+
+    info = RepoInfo(name="r", repo_path=tmp_repo, branch="main", scope=[], exclude=[], policy=Policy())
+    pf = prefetch.Prefetcher(top_k=1, max_entries=8)
+    pf.schedule(info, [_cand("a")], "fp")
+    assert _wait_for(lambda: started)
+
+    with pf.interactive():
+        # cancelled job goes back on the queue and waits for the interactive request
+        assert _wait_for(lambda: pf.stats()["queued"] == 1)
+        assert len(started) == 1
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.config_store import ConfigStore
+from app.repo_fs import ScanBudget, iter_files
+from app.sweep import Sweeper, SweepTarget, scan_repo
+
+
+def _repo(root: Path, name: str, files: dict[str, str]) -> Path:
+    repo = root / name
+    for rel, text in files.items():
+        (repo / rel).parent.mkdir(parents=True, exist_ok=True)
+        (repo / rel).write_text(text, encoding="utf-8")
+    return repo
+
+
+def test_scan_budget_stops_the_walk(tmp_repo: Path):
+    for i in range(10):
+        (tmp_repo / f"m{i}.py").write_text("x = 1\n", encoding="utf-8")
+
+    budget = ScanBudget(max_files=3)
+    assert len(iter_files(tmp_repo, [], [], budget=budget)) == 3
+    assert budget.exhausted
+
+    budget = ScanBudget(max_bytes=13)
+    assert len(iter_files(tmp_repo, [], [], budget=budget)) == 2
+    assert budget.exhausted
+
+    budget = ScanBudget(max_files=10)
+    assert len(iter_files(tmp_repo, [], [], budget=budget)) == 10
+    assert not budget.exhausted
+
+
+def test_scan_repo_reports_budget_timeout_and_missing_paths(tmp_path: Path):
+    repo = _repo(tmp_path, "a", {f"m{i}.py": "# TODO: tidy\n" * 50 for i in range(200)})
+    target = SweepTarget(name="a", repo_path=repo, scope=[], exclude=[])
+
+    res = scan_repo(target, timeout_s=0, max_files=5, max_bytes=0)
+    assert res["status"] == "truncated" and res["files"] == 5
+    assert res["candidates"] and all(c["repo"] == "a" for c in res["candidates"])
+
+    assert scan_repo(target, timeout_s=1e-6, max_files=0, max_bytes=0)["status"] == "timeout"
+
+    missing = SweepTarget(name="gone", repo_path=tmp_path / "gone", scope=[], exclude=[])
+    res = scan_repo(missing, timeout_s=0, max_files=0, max_bytes=0)
+    assert res["status"] == "error" and "not found" in res["error"]
+
+
+@pytest.fixture()
+def sweep_client(tmp_path: Path, monkeypatch):
+    root = tmp_path / "repos"
+    _repo(root, "alpha", {"a.py": "try:\n    pass\nexcept:\n    pass\n"})
+    _repo(root, "beta", {"b.py": "# TODO: one\n# FIXME: two\n", "init.lua": "count = 1\n"})
+    _repo(root, "gamma", {"c.py": "x = 1\n"})
+
+    store = ConfigStore(tmp_path / "repos.json")
+    for name in ("alpha", "beta", "gamma"):
+        store.upsert_repo(name, {"path": name, "branch": "main", "scope": [], "exclude": []})
+    sweeper = Sweeper(workers=2)
+    monkeypatch.setattr(main, "REPO_ROOT", root)
+    monkeypatch.setattr(main, "STORE", store)
+    monkeypatch.setattr(main, "SWEEPER", sweeper)
+    yield TestClient(main.app)
+    sweeper.shutdown()
+
+
+def test_sweep_streams_each_repo_then_a_ranked_total(sweep_client: TestClient):
+    r = sweep_client.post("/repos/sweep", json={"top_k": 2})
+    assert r.status_code == 200
+    events = [json.loads(line) for line in r.text.splitlines()]
+
+    repo_events, done = events[:-1], events[-1]
+    assert sorted(ev["repo"] for ev in repo_events) == ["alpha", "beta", "gamma"]
+    assert [ev["completed"] for ev in repo_events] == [1, 2, 3]
+    assert all(len(ev["top"]) <= 2 for ev in repo_events)
+
+    assert done["event"] == "done"
+    assert done["repos"] == {"alpha": "ok", "beta": "ok", "gamma": "ok"}
+    ranked = done["candidates"]
+    assert {c["repo"] for c in ranked} == {"alpha", "beta"}
+    risks = [c["risk"] for c in ranked]
+    assert risks == sorted(risks, key=["low", "medium", "high"].index)
+
+
+def test_sweep_filters_and_rejects_unknown_repos(sweep_client: TestClient):
+    r = sweep_client.post("/repos/sweep", json={"pattern": "[ab]*", "max_files": 1})
+    done = json.loads(r.text.splitlines()[-1])
+    assert done["repos"] == {"alpha": "ok", "beta": "truncated"}
+
+    r = sweep_client.post("/repos/sweep", json={"repos": ["alpha"]})
+    assert json.loads(r.text.splitlines()[-1])["repos"] == {"alpha": "ok"}
+
+    assert sweep_client.post("/repos/sweep", json={"repos": ["nope"]}).status_code == 404
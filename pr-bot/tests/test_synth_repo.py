@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+from app.repo_fs import iter_files
+from benchmarks.synth_repo import EXCLUDE_PATTERNS, SynthSpec, generate
+
+
+def _digest(repo: Path) -> str:
+    h = hashlib.sha1()
+    for p in sorted(repo.rglob("*")):
+        if p.is_file():
+            h.update(p.relative_to(repo).as_posix().encode())
+            h.update(p.read_bytes())
+    return h.hexdigest()
+
+
+def test_generator_is_deterministic_and_excluded_trees_are_skipped(tmp_path: Path):
+    spec = SynthSpec(files=200, excluded_trees=2, excluded_files=30, seed=7)
+    a = generate(tmp_path / "a", spec)
+    b = generate(tmp_path / "b", spec)
+    assert _digest(a) == _digest(b)
+
+    files = iter_files(a, [], EXCLUDE_PATTERNS)
+    assert len(files) == 200
+    assert {p.suffix for p in files} == {".py", ".lua"}
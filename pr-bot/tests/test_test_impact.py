@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+
+from app.test_impact import ImportGraph
+
+
+def _seed(repo: Path) -> None:
+    (repo / "pkg").mkdir()
+    (repo / "tests").mkdir()
+    (repo / "pkg" / "__init__.py").write_text("", encoding="utf-8")
+    (repo / "pkg" / "core.py").write_text("X = 1\n", encoding="utf-8")
+    (repo / "pkg" / "api.py").write_text("from .core import X\n", encoding="utf-8")
+    (repo / "pkg" / "other.py").write_text("Y = 2\n", encoding="utf-8")
+    (repo / "tests" / "test_api.py").write_text("from pkg.api import X\n", encoding="utf-8")
+    (repo / "tests" / "test_other.py").write_text("import pkg.other\n", encoding="utf-8")
+
+
+def test_selects_tests_that_transitively_import_touched_file(tmp_repo: Path, tmp_path: Path):
+    _seed(tmp_repo)
+    g = ImportGraph(tmp_repo, tmp_path / "graph.json")
+    g.refresh()
+
+    assert g.select({"pkg/core.py"}).tests == ["tests/test_api.py"]
+    assert g.select({"pkg/other.py"}).tests == ["tests/test_other.py"]
+
+
+def test_falls_back_to_full_suite_for_config_and_data_files(tmp_repo: Path):
+    _seed(tmp_repo)
+    g = ImportGraph(tmp_repo)
+    g.refresh()
+
+    assert g.select({"tests/conftest.py"}).tests is None
+    assert g.select({"pkg/data.json"}).tests is None
+    assert g.select({"scripts/init.lua"}).tests == []
+
+
+def test_refresh_is_incremental_and_cached_on_disk(tmp_repo: Path, tmp_path: Path):
+    _seed(tmp_repo)
+    cache = tmp_path / "graph.json"
+    assert ImportGraph(tmp_repo, cache).refresh() == 6
+
+    g = ImportGraph(tmp_repo, cache)
+    assert g.refresh() == 0
+
+    (tmp_repo / "tests" / "test_other.py").write_text("import pkg.other\nimport pkg.core\n", encoding="utf-8")
+    assert g.refresh() == 1
+    assert g.select({"pkg/core.py"}).tests == ["tests/test_api.py", "tests/test_other.py"]
+
+
+def test_concurrent_saves_to_one_cache_file_do_not_collide(tmp_repo: Path, tmp_path: Path):
+    _seed(tmp_repo)
+    cache = tmp_path / "graph.json"
+    graphs = [ImportGraph(tmp_repo, cache) for _ in range(4)]
+    for g in graphs:
+        g.refresh()
+    errors: list[BaseException] = []
+
+    def save(g: ImportGraph) -> None:
+        try:
+            for _ in range(200):
+                g._save()
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(g,)) for g in graphs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert len(json.loads(cache.read_text(encoding="utf-8"))["files"]) == 6
+    assert list(tmp_path.glob("*.tmp")) == []
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, step_logs, validate
+from app.config_store import ConfigStore
+from app.sandbox import ResourceLimits, ValidationSlots
+from app.utils_run import run_cmd
+from app.validate import ValidationStep, run_steps
+from app.worktree_pool import WorktreePool
+
+
+@pytest.fixture(autouse=True)
+def slots(monkeypatch) -> ValidationSlots:
+    # the suite should not depend on how many cpus the machine has
+    s = ValidationSlots(4)
+    monkeypatch.setattr(validate, "VALIDATION_SLOTS", s)
+    return s
+
+
+def _sleep(seconds: float) -> list[str]:
+    return [sys.executable, "-c", f"import time; time.sleep({seconds})"]
+
+
+def test_run_cmd_cancel_kills_running_command():
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    t0 = time.monotonic()
+    rc, out = run_cmd(_sleep(10), timeout_s=30, cancel=cancel)
+    assert rc == 130
+    assert "cancelled" in out
+    assert time.monotonic() - t0 < 5
+
+
+def test_steps_run_concurrently_and_keep_planned_order(tmp_path: Path):
+    steps = [ValidationStep(f"s{i}", _sleep(0.5), 30) for i in range(3)]
+    t0 = time.monotonic()
+    report = run_steps(tmp_path, steps, parallelism=3, fail_fast=False)
+    assert time.monotonic() - t0 < 1.4
+    assert [r["step"] for r in report] == ["s0", "s1", "s2"]
+    assert all(r["ok"] and r["duration_s"] >= 0.4 for r in report)
+    assert all(r["ended_at"] >= r["started_at"] for r in report)
+
+
+def test_fail_fast_cancels_remaining_steps(tmp_path: Path):
+    steps = [
+        ValidationStep("slow", _sleep(10), 30),
+        ValidationStep("fails", [sys.executable, "-c", "raise SystemExit(1)"], 30),
+    ]
+    t0 = time.monotonic()
+    report = run_steps(tmp_path, steps, parallelism=2, fail_fast=True)
+    assert time.monotonic() - t0 < 5
+    slow, fails = report
+    assert fails["ok"] is False and "cancelled" not in fails
+    assert slow["ok"] is False and slow["cancelled"] is True
+
+
+def test_run_cmd_keeps_head_and_tail_and_spools_full_log(tmp_path: Path):
+    log_path = tmp_path / "logs" / "noisy.log"
+    script = "import sys\nfor i in range(20000): print(f'line {i}')"
+    rc, out = run_cmd([sys.executable, "-c", script], timeout_s=30, log_path=log_path)
+    assert rc == 0
+    assert out.startswith("line 0\n")
+    assert out.rstrip().endswith("line 19999")
+    assert "bytes truncated" in out
+    assert len(out) < 64 * 1024
+    assert log_path.read_text().count("\n") == 20000
+
+
+def test_run_cmd_timeout_keeps_partial_output_and_kills_children(tmp_path: Path):
+    script = (
+        "import subprocess, sys, time\n"
+        "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])\n"
+        "print('started', flush=True)\n"
+        "time.sleep(30)"
+    )
+    t0 = time.monotonic()
+    rc, out = run_cmd([sys.executable, "-c", script], timeout_s=1)
+    assert rc == 124
+    assert out.startswith("timeout running")
+    assert "started" in out
+    # the grandchild holds the pipe too; returning quickly means the whole group died
+    assert time.monotonic() - t0 < 4
+
+
+def test_run_cmd_applies_resource_limits():
+    script = "import resource; print(resource.getrlimit(resource.RLIMIT_NOFILE)[0])"
+    rc, out = run_cmd([sys.executable, "-c", script], timeout_s=30, limits=ResourceLimits(open_files=64))
+    assert rc == 0
+    assert out.strip() == "64"
+
+    rc, out = run_cmd(["prbot-no-such-tool"], timeout_s=30, limits=ResourceLimits(open_files=64))
+    assert rc == 127
+    assert "failed to run prbot-no-such-tool" in out
+
+
+def test_steps_queue_for_validation_slots(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(validate, "VALIDATION_SLOTS", ValidationSlots(1))
+    steps = [ValidationStep(f"s{i}", _sleep(0.3), 30) for i in range(2)]
+    report = run_steps(tmp_path, steps, parallelism=2, fail_fast=False)
+    waits = sorted(r["queue_wait_s"] for r in report)
+    assert waits[0] < 0.2
+    assert waits[1] >= 0.2
+    assert validate.VALIDATION_SLOTS.stats()["acquired"] == 2
+
+
+def test_log_ref_outlives_a_discarded_worktree(tmp_path: Path, work_root: Path, monkeypatch):
+    (tmp_path / "repos" / "demo").mkdir(parents=True)
+    (tmp_path / "repos" / "demo" / "a.py").write_text("x = 1\n", encoding="utf-8")
+    store = ConfigStore(tmp_path / "repos.json")
+    store.upsert_repo("demo", {"path": "demo"})
+    monkeypatch.setattr(main, "REPO_ROOT", tmp_path / "repos")
+    monkeypatch.setattr(main, "STORE", store)
+    # size 0: every checkin discards the worktree, logs dir included before
+    monkeypatch.setattr(main, "POOL", WorktreePool(size=0))
+    client = TestClient(main.app)
+
+    r = client.post("/validate", json={"repo": "demo", "full_validation": True})
+    assert r.status_code == 200
+    step = r.json()["steps"][0]
+    assert not any(p.name.startswith("worktree-") for p in work_root.iterdir())
+
+    log = client.get(f"/logs/{step['log_ref']}")
+    assert log.status_code == 200
+    assert client.get("/logs/worktree-x/logs/nope.log").status_code == 404
+
+
+def test_prune_logs_keeps_the_newest(work_root: Path):
+    d = step_logs.log_dir()
+    d.mkdir(parents=True)
+    for i in range(5):
+        (d / f"{i}.log").write_text("x", encoding="utf-8")
+        os.utime(d / f"{i}.log", (1_000_000 + i, time.time() - 10 + i))
+    assert step_logs.prune_logs(keep=3, max_age_s=3600) == 2
+    assert sorted(p.name for p in d.iterdir()) == ["2.log", "3.log", "4.log"]
+    assert step_logs.prune_logs(keep=10, max_age_s=7.5) == 1
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from app import validate_cache
+from app.utils_run import run_cmd
+from app.validate_cache import ValidationCache, repo_fingerprint
+from app.validate import cached_result, validate_worktree
+from app.worktree import apply_patch, discard_worktree, make_worktree, source_manifest
+
+DIFF = """diff --git a/a.py b/a.py
+--- a/a.py
++++ b/a.py
+@@ -1,1 +1,1 @@
+-x = 1
++x = 2
+"""
+
+
+def test_key_ignores_formatting_but_tracks_repo_contents(work_root: Path, tmp_repo: Path):
+    (tmp_repo / "a.py").write_text("x = 1\n", encoding="utf-8")
+    cache = ValidationCache(max_bytes=1 << 20)
+    cfg = {"full": False}
+
+    key = cache.key(tmp_repo, DIFF, cfg)
+    with_index = DIFF.replace("--- a/a.py", "index 111..222 100644\n--- a/a.py")
+    assert cache.key(tmp_repo, with_index, cfg) == key
+    assert cache.key(tmp_repo, DIFF, {"full": True}) != key
+
+    (tmp_repo / "a.py").write_text("x = 10\n", encoding="utf-8")
+    assert cache.key(tmp_repo, DIFF, cfg) != key
+
+
+def test_fingerprint_reuses_manifest_and_head_until_a_ref_moves(tmp_repo: Path, monkeypatch):
+    (tmp_repo / "a.py").write_text("x = 1\n", encoding="utf-8")
+    commit = ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "c"]
+    for cmd in (["git", "init", "-q", "-b", "main"], ["git", "add", "."], commit):
+        assert run_cmd(cmd, cwd=tmp_repo)[0] == 0
+
+    calls = []
+
+    def counting_run(cmd, **kw):
+        calls.append(cmd)
+        return run_cmd(cmd, **kw)
+
+    monkeypatch.setattr(validate_cache, "run_cmd", counting_run)
+    fp = repo_fingerprint(tmp_repo, "main")
+    assert repo_fingerprint(tmp_repo, "main", source_manifest(tmp_repo)) == fp
+    assert len(calls) == 1
+
+    assert run_cmd([*commit, "--allow-empty"], cwd=tmp_repo)[0] == 0
+    assert repo_fingerprint(tmp_repo, "main") != fp
+    assert len(calls) == 2
+
+
+def test_hits_with_pruned_logs_drop_the_dangling_log_ref(work_root: Path):
+    cache = ValidationCache(max_bytes=1 << 20)
+    log = work_root / "logs" / "1-pytest.log"
+    log.parent.mkdir(parents=True)
+    log.write_text("ok\n", encoding="utf-8")
+    cache.put("k", True, [{"step": "pytest", "ok": True, "log": "ok", "log_ref": "logs/1-pytest.log", "log_bytes": 3}])
+
+    assert cache.get("k")[1][0]["log_ref"] == "logs/1-pytest.log"
+    log.unlink()
+    step = cache.get("k")[1][0]
+    assert "log_ref" not in step and "log_bytes" not in step
+    assert step["log_expired"] is True
+
+
+def test_hits_are_marked_cached_and_partial_runs_are_not_stored(work_root: Path):
+    cache = ValidationCache(max_bytes=1 << 20)
+    assert cache.get("k") is None
+
+    cache.put("k", True, [{"step": "pytest", "ok": True, "log": ""}])
+    ok, steps = cache.get("k")
+    assert ok is True
+    assert steps == [{"step": "pytest", "ok": True, "log": "", "cached": True}]
+
+    cache.put("c", False, [{"step": "pytest", "ok": False, "cancelled": True, "log": "cancelled (fail-fast)"}])
+    assert cache.get("c") is None
+
+
+def test_store_evicts_least_recently_used(work_root: Path):
+    cache = ValidationCache(max_bytes=300)
+    steps = [{"step": "s", "ok": True, "log": "x" * 100}]
+    cache.put("old", True, steps)
+    os.utime(cache.root / "old.json", (1, 1))
+    cache.put("new", True, steps)
+    cache.put("newer", True, steps)
+
+    assert cache.get("old") is None
+    assert cache.get("newer") is not None
+    assert cache.stats()["evicted"] >= 1
+
+
+def test_patch_path_results_are_safe_to_serve_to_validate(tmp_path: Path, work_root: Path):
+    repo = tmp_path / "scoped"
+    (repo / "src").mkdir(parents=True)
+    (repo / "src" / "a.py").write_text("x = 1\n", encoding="utf-8")
+    (repo / "checks").mkdir()
+    (repo / "checks" / "test_a.py").write_text("def test_ok():\n    pass\n", encoding="utf-8")
+    diff = DIFF.replace("a.py", "src/a.py")
+
+    # /candidate/patch validates a pooled worktree of a repo scanned with scope ["src"]
+    work = make_worktree(repo, strategy="copytree")
+    try:
+        apply_patch(work, diff)
+        ok, steps = validate_worktree(work, touched={"src/a.py"}, source=repo, diff=diff)
+    finally:
+        discard_worktree(work)
+    assert "pytest" in [s["step"] for s in steps]
+
+    # /validate looks the same diff up before building a worktree
+    _, hit = cached_result(repo, diff)
+    assert hit is not None
+    assert [s["step"] for s in hit[1]] == [s["step"] for s in steps]
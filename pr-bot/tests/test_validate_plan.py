@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from app.test_impact import graph_for
+from app.validate import validate_worktree
+from app.validate_plan import imported_modules, plan_validation
+
+
+def test_imported_modules_resolves_relative_imports():
+    text = "import os, json as j\nfrom . import util\nfrom ..core.models import Thing\nfrom pkg.a import (b, c)\n"
+    mods = imported_modules("pkg/sub/mod.py", text)
+    assert {"os", "json", "pkg.sub.util", "pkg.core.models", "pkg.a", "pkg.a.b"} <= mods
+
+
+def test_incremental_plan_lints_touched_files_and_direct_importers(tmp_repo: Path, work_root: Path):
+    (tmp_repo / "pkg").mkdir()
+    (tmp_repo / "pkg" / "__init__.py").write_text("", encoding="utf-8")
+    (tmp_repo / "pkg" / "core.py").write_text("X = 1\n", encoding="utf-8")
+    (tmp_repo / "pkg" / "user.py").write_text("from .core import X\n", encoding="utf-8")
+    (tmp_repo / "other.py").write_text("import json\n", encoding="utf-8")
+
+    plan = plan_validation(tmp_repo, {"pkg/core.py"})
+
+    assert plan.full is False
+    assert plan.compile_files == ["pkg/core.py"]
+    assert plan.lint_files == ["pkg/core.py", "pkg/user.py"]
+    # importers come from the cached graph; unchanged files are not parsed again
+    assert graph_for(tmp_repo).refresh() == 0
+
+    assert plan_validation(tmp_repo, None).full is True
+    assert plan_validation(tmp_repo, {"pkg/core.py"}, full=True).full is True
+
+
+def test_tests_outside_the_scan_scope_are_still_found(tmp_repo: Path, work_root: Path):
+    # a repo scoped to src/ for scanning, with tests elsewhere
+    (tmp_repo / "src").mkdir()
+    (tmp_repo / "src" / "core.py").write_text("X = 1\n", encoding="utf-8")
+    (tmp_repo / "pkg" / "tests").mkdir(parents=True)
+    (tmp_repo / "pkg" / "tests" / "test_core.py").write_text("from src.core import X\n", encoding="utf-8")
+
+    plan = plan_validation(tmp_repo, {"src/core.py"})
+    assert plan.has_tests is True
+    assert plan.lint_files == ["pkg/tests/test_core.py", "src/core.py"]
+    assert plan_validation(tmp_repo, None).has_tests is True
+
+
+def test_incremental_validation_ignores_untouched_broken_files(tmp_repo: Path, work_root: Path):
+    (tmp_repo / "ok.py").write_text("x = 1\n", encoding="utf-8")
+    (tmp_repo / "broken.py").write_text("def (:\n", encoding="utf-8")
+
+    ok, steps = validate_worktree(tmp_repo, touched={"ok.py"}, full=False)
+    assert ok is True
+    assert steps[0]["scope"] == "incremental"
+
+    ok, _ = validate_worktree(tmp_repo, touched={"ok.py"}, full=True)
+    assert ok is False
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, watcher
+from app.candidates import grep_candidates
+from app.config_store import ConfigStore
+from app.models import Policy, RepoInfo
+from app.repo_fs import iter_files
+from app.watcher import WatchManager, inotify_available
+
+
+def _info(repo: Path, **kw) -> RepoInfo:
+    return RepoInfo(name="demo", repo_path=repo, branch="main", scope=kw.get("scope", []), exclude=kw.get("exclude", []), policy=Policy())
+
+
+def _wait_for(fn, timeout_s: float = 5.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        value = fn()
+        if value:
+            return value
+        time.sleep(0.02)
+    raise AssertionError("condition not met in time")
+
+
+def _ids(snap) -> set[str]:
+    return {c.id for c in snap.candidates}
+
+
+@pytest.fixture(params=["inotify", "poll"])
+def backend(request) -> str:
+    if request.param == "inotify" and not inotify_available():
+        pytest.skip("no inotify")
+    return request.param
+
+
+def test_watcher_tracks_edits_adds_and_deletes(tmp_repo: Path, backend: str):
+    (tmp_repo / "a.py").write_text("x = 1\n", encoding="utf-8")
+    (tmp_repo / "vendor").mkdir()
+    (tmp_repo / "vendor" / "v.py").write_text("# TODO: vendored\n", encoding="utf-8")
+
+    manager = WatchManager(enabled=True, backend=backend, debounce_s=0.01, poll_s=0.05, max_dirs=64)
+    info = _info(tmp_repo, exclude=["vendor/*"])
+    w = manager.start(info)
+    try:
+        snap = _wait_for(lambda: manager.snapshot(info))
+        assert w.mode == backend
+        assert _ids(snap) == set() and [p.name for p in snap.files] == ["a.py"]
+
+        (tmp_repo / "a.py").write_text("# TODO: tidy\nx = 1\n", encoding="utf-8")
+        snap = _wait_for(lambda: (s := manager.snapshot(info)) and "todo-triage" in _ids(s) and s)
+        assert snap.candidates[0].evidence[0]["path"] == "a.py"
+
+        (tmp_repo / "pkg" / "deep").mkdir(parents=True)
+        (tmp_repo / "pkg" / "deep" / "m.lua").write_text("count = 1\n", encoding="utf-8")
+        snap = _wait_for(lambda: (s := manager.snapshot(info)) and "lua-implicit-globals" in _ids(s) and s)
+
+        # the in-memory answer matches a cold scan
+        files = iter_files(tmp_repo, [], info.exclude)
+        assert sorted(snap.files) == sorted(files)
+        assert _ids(snap) == {c.id for c in grep_candidates(files, tmp_repo)}
+
+        (tmp_repo / "a.py").unlink()
+        _wait_for(lambda: (s := manager.snapshot(info)) and "todo-triage" not in _ids(s))
+        assert w.stats()["rescans"] < 10
+    finally:
+        manager.stop("demo", wait=True)
+    assert manager.snapshot(info) is None
+
+
+def test_watch_cap_falls_back_to_polling(tmp_repo: Path):
+    if not inotify_available():
+        pytest.skip("no inotify")
+    for d in ("a", "b", "c"):
+        (tmp_repo / d).mkdir()
+    manager = WatchManager(enabled=True, backend="auto", debounce_s=0.01, poll_s=0.05, max_dirs=2)
+    w = manager.start(_info(tmp_repo))
+    try:
+        _wait_for(w.ready.is_set)
+        assert w.mode == "poll"
+        # watches taken before the cap was hit are handed back
+        assert manager.stats()["dirs_in_use"] == 0
+    finally:
+        manager.stop("demo", wait=True)
+
+
+def test_register_and_delete_start_and_stop_watchers(tmp_path: Path, monkeypatch):
+    root = tmp_path / "repos"
+    (root / "demo").mkdir(parents=True)
+    (root / "demo" / "a.py").write_text("# FIXME: later\n", encoding="utf-8")
+    manager = WatchManager(enabled=True, backend="poll", debounce_s=0.01, poll_s=0.05, max_dirs=64)
+    monkeypatch.setattr(main, "REPO_ROOT", root)
+    monkeypatch.setattr(main, "STORE", ConfigStore(tmp_path / "repos.json"))
+    monkeypatch.setattr(main, "WATCHERS", manager)
+    client = TestClient(main.app)
+
+    assert client.post("/repos/register", json={"name": "demo", "path": "demo"}).status_code == 200
+    w = manager.get("demo")
+    assert w is not None
+    _wait_for(w.ready.is_set)
+    assert [c["id"] for c in client.post("/candidates", json={"repo": "demo"}).json()["candidates"]] == ["todo-triage"]
+    assert manager.stats()["repos"]["demo"]["version"] >= 1
+
+    assert client.delete("/repos/demo").status_code == 200
+    assert manager.get("demo") is None
+
+
+def test_overflow_rewatches_directories_created_meanwhile(tmp_repo: Path, monkeypatch):
+    if not inotify_available():
+        pytest.skip("no inotify")
+    (tmp_repo / "a.py").write_text("x = 1\n", encoding="utf-8")
+    overflow = threading.Event()
+    real_read = watcher.Inotify.read
+
+    def lossy_read(self, timeout):
+        events = real_read(self, timeout)
+        if events and overflow.is_set():
+            # the kernel dropped this batch
+            overflow.clear()
+            return [(-1, watcher.IN_Q_OVERFLOW, "")]
+        return events
+
+    monkeypatch.setattr(watcher.Inotify, "read", lossy_read)
+    manager = WatchManager(enabled=True, backend="inotify", debounce_s=0.01, poll_s=60, max_dirs=64)
+    info = _info(tmp_repo)
+    w = manager.start(info)
+    try:
+        _wait_for(lambda: manager.snapshot(info))
+        overflow.set()
+        (tmp_repo / "fresh").mkdir()
+        (tmp_repo / "fresh" / "m.py").write_text("x = 1\n", encoding="utf-8")
+        _wait_for(lambda: w.stats()["resyncs"] >= 2)
+        # m.py may land after the resync walk; then the new watch on fresh/ reports it
+        _wait_for(lambda: "fresh/m.py" in {p.relative_to(tmp_repo).as_posix() for p in manager.snapshot(info).files})
+
+        # only an inotify watch on fresh/ can report this edit
+        (tmp_repo / "fresh" / "m.py").write_text("# TODO: tidy\nx = 1\n", encoding="utf-8")
+        _wait_for(lambda: (s := manager.snapshot(info)) and "todo-triage" in _ids(s))
+        assert w.mode == "inotify"
+    finally:
+        manager.stop("demo", wait=True)
+
+
+def test_poll_mode_snapshots_are_never_a_poll_interval_stale(tmp_repo: Path, monkeypatch):
+    (tmp_repo / "a.py").write_text("x = 1\n", encoding="utf-8")
+    manager = WatchManager(enabled=True, backend="poll", debounce_s=0.01, poll_s=60, max_dirs=64)
+    info = _info(tmp_repo)
+    manager.start(info)
+    try:
+        assert _ids(_wait_for(lambda: manager.snapshot(info))) == set()
+        monkeypatch.setattr(watcher, "POLL_MAX_AGE_S", 0.0)
+        (tmp_repo / "a.py").write_text("# TODO: tidy\nx = 1\n", encoding="utf-8")
+        # the next poll is a minute away; the snapshot walks the tree itself
+        assert "todo-triage" in _ids(manager.snapshot(info))
+    finally:
+        manager.stop("demo", wait=True)
+
+
+def test_removed_and_recreated_scope_root_is_watched_again(tmp_repo: Path):
+    if not inotify_available():
+        pytest.skip("no inotify")
+    (tmp_repo / "src").mkdir()
+    (tmp_repo / "src" / "a.py").write_text("x = 1\n", encoding="utf-8")
+    manager = WatchManager(enabled=True, backend="inotify", debounce_s=0.01, poll_s=60, max_dirs=64)
+    # lib/ does not exist yet when the watcher starts
+    info = _info(tmp_repo, scope=["src", "lib"])
+    w = manager.start(info)
+    try:
+        _wait_for(lambda: manager.snapshot(info))
+
+        # rm -rf src && git checkout src
+        shutil.rmtree(tmp_repo / "src")
+        (tmp_repo / "src").mkdir()
+        (tmp_repo / "src" / "a.py").write_text("# TODO: tidy\nx = 1\n", encoding="utf-8")
+        snap = _wait_for(lambda: (s := manager.snapshot(info)) and "todo-triage" in _ids(s) and s)
+        assert [p.name for p in snap.files] == ["a.py"]
+
+        # later edits inside the new directory arrive as events again
+        (tmp_repo / "src" / "b.lua").write_text("count = 1\n", encoding="utf-8")
+        _wait_for(lambda: (s := manager.snapshot(info)) and "lua-implicit-globals" in _ids(s))
+
+        (tmp_repo / "lib").mkdir()
+        (tmp_repo / "lib" / "c.py").write_text("x = 1\n", encoding="utf-8")
+        _wait_for(lambda: (s := manager.snapshot(info)) and len(s.files) == 3)
+
+        files = iter_files(tmp_repo, info.scope, [])
+        assert _ids(manager.snapshot(info)) == {c.id for c in grep_candidates(files, tmp_repo)}
+        assert w.mode == "inotify" and w.stats()["dirs"] == 2
+    finally:
+        manager.stop("demo", wait=True)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from app import worktree
+from app.utils_run import run_cmd
+
+
+DIFF = "diff --git a/pkg/a.py b/pkg/a.py\n--- a/pkg/a.py\n+++ b/pkg/a.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+
+
+def _seed(repo: Path) -> None:
+    (repo / "pkg").mkdir()
+    (repo / "pkg" / "a.py").write_text("x = 1\n", encoding="utf-8")
+    (repo / "pkg" / "b.py").write_text("y = 1\n", encoding="utf-8")
+    (repo / ".git").mkdir()
+    (repo / ".git" / "HEAD").write_text("ref: refs/heads/main\n", encoding="utf-8")
+
+
+@pytest.mark.parametrize("strategy", ["copytree", "hardlink"])
+def test_strategies_copy_tree_without_git_dir(tmp_repo: Path, work_root: Path, strategy: str):
+    _seed(tmp_repo)
+
+    work = worktree.make_worktree(tmp_repo, strategy=strategy)
+
+    assert (work / "pkg" / "b.py").read_text(encoding="utf-8") == "y = 1\n"
+    assert not (work / ".git").exists()
+    worktree.discard_worktree(work)
+    assert not work.parent.exists()
+
+
+@pytest.mark.parametrize("strategy", ["copytree", "hardlink"])
+def test_fresh_worktree_matches_the_source_manifest(tmp_repo: Path, work_root: Path, strategy: str):
+    _seed(tmp_repo)
+    manifest = worktree.source_manifest(tmp_repo)
+
+    work = worktree.make_worktree(tmp_repo, strategy=strategy)
+    # copies keep the source stats, so the pool needs no baseline walk of its own
+    assert worktree.drifted_files(work, tmp_repo, manifest) == set()
+
+    worktree.apply_patch(work, DIFF)
+    (work / "__pycache__").mkdir()
+    assert worktree.drifted_files(work, tmp_repo, manifest) == {"pkg/a.py", "_patch.diff"}
+    assert not (work / "__pycache__").exists()
+    worktree.discard_worktree(work)
+
+
+def test_hardlink_patch_never_writes_through_to_source(tmp_repo: Path, work_root: Path):
+    _seed(tmp_repo)
+
+    work = worktree.make_worktree(tmp_repo, strategy="hardlink")
+    worktree.apply_patch(work, DIFF)
+
+    assert (work / "pkg" / "a.py").read_text(encoding="utf-8") == "x = 2\n"
+    assert (tmp_repo / "pkg" / "a.py").read_text(encoding="utf-8") == "x = 1\n"
+    # untouched files stay shared with the source
+    assert (work / "pkg" / "b.py").stat().st_ino == (tmp_repo / "pkg" / "b.py").stat().st_ino
+
+
+def test_git_worktree_checks_out_branch(tmp_repo: Path, work_root: Path):
+    (tmp_repo / "a.txt").write_text("committed\n", encoding="utf-8")
+    for cmd in (["git", "init", "-q", "-b", "main"], ["git", "add", "."],
+                ["git", "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"]):
+        rc, out = run_cmd(cmd, cwd=tmp_repo)
+        assert rc == 0, out
+    (tmp_repo / "a.txt").write_text("dirty\n", encoding="utf-8")
+
+    work = worktree.make_worktree(tmp_repo, branch="main", strategy="git-worktree")
+
+    assert (work / "a.txt").read_text(encoding="utf-8") == "committed\n"
+    worktree.discard_worktree(work)
+    rc, out = run_cmd(["git", "worktree", "list"], cwd=tmp_repo)
+    assert str(work) not in out
+
+
+def test_auto_detection_falls_back_from_reflink(tmp_repo: Path, work_root: Path):
+    _seed(tmp_repo)
+    assert worktree.detect_strategy(tmp_repo) in ("reflink", "copytree")
+
+
+def test_auto_worktree_writes_to_untouched_files_stay_private(tmp_repo: Path, work_root: Path):
+    _seed(tmp_repo)
+    work = worktree.make_worktree(tmp_repo, strategy="auto")
+    worktree.apply_patch(work, DIFF)
+
+    # what a test run or formatter does to files the diff never touched
+    with open(work / "pkg" / "b.py", "w", encoding="utf-8") as f:
+        f.write("y = 99\n")
+
+    assert (tmp_repo / "pkg" / "b.py").read_text(encoding="utf-8") == "y = 1\n"
+    assert (work / "pkg" / "b.py").stat().st_ino != (tmp_repo / "pkg" / "b.py").stat().st_ino
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from app.worktree import LEASE_NAME, apply_patch, lease_state, new_workdir, release_workdir
+from app.worktree_pool import WorktreePool
+
+
+def _seed(repo: Path) -> None:
+    (repo / "a.py").write_text("x = 1\n", encoding="utf-8")
+    (repo / "b.py").write_text("y = 1\n", encoding="utf-8")
+
+
+def _wait_idle(pool: WorktreePool, n: int) -> None:
+    deadline = time.monotonic() + 5
+    while pool.stats()["idle"] < n and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_checkin_resets_touched_files_and_reuses_worktree(tmp_repo: Path, work_root: Path):
+    _seed(tmp_repo)
+    pool = WorktreePool(size=1)
+
+    work = pool.checkout(tmp_repo)
+    apply_patch(work, (
+        "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+        "diff --git a/new.py b/new.py\nnew file mode 100644\n--- /dev/null\n+++ b/new.py\n@@ -0,0 +1 @@\n+z = 1\n"
+    ))
+    assert (work / "new.py").exists()
+    pool.checkin(work, {"a.py", "new.py"})
+
+    again = pool.checkout(tmp_repo)
+    assert again == work
+    assert (again / "a.py").read_text(encoding="utf-8") == "x = 1\n"
+    assert not (again / "new.py").exists()
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_checkin_undoes_files_the_validation_run_left_behind(tmp_repo: Path, work_root: Path):
+    _seed(tmp_repo)
+    pool = WorktreePool(size=1)
+
+    work = pool.checkout(tmp_repo)
+    # untouched by the patch, but rewritten / created by the repo's own tools
+    (work / "b.py").write_text("y = 'formatted'\n", encoding="utf-8")
+    (work / ".pytest_cache" / "v").mkdir(parents=True)
+    (work / ".pytest_cache" / "v" / "lastfailed").write_text("{}", encoding="utf-8")
+    (work / "a.py").unlink()
+    pool.checkin(work, set())
+
+    again = pool.checkout(tmp_repo)
+    assert again == work
+    assert (again / "b.py").read_text(encoding="utf-8") == "y = 1\n"
+    assert (again / "a.py").read_text(encoding="utf-8") == "x = 1\n"
+    assert not (again / ".pytest_cache").exists()
+
+
+def test_checkout_syncs_source_changes_into_idle_worktree(tmp_repo: Path, work_root: Path):
+    _seed(tmp_repo)
+    pool = WorktreePool(size=1)
+    pool.prewarm(tmp_repo)
+    _wait_idle(pool, 1)
+
+    (tmp_repo / "b.py").write_text("y = 22\n", encoding="utf-8")
+    (tmp_repo / "a.py").unlink()
+    work = pool.checkout(tmp_repo)
+
+    assert pool.stats()["hits"] == 1
+    assert (work / "b.py").read_text(encoding="utf-8") == "y = 22\n"
+    assert not (work / "a.py").exists()
+
+
+def test_gc_removes_only_old_orphans(tmp_repo: Path, work_root: Path):
+    _seed(tmp_repo)
+    pool = WorktreePool(size=1)
+    owned = pool.checkout(tmp_repo)
+
+    orphan = work_root / "worktree-orphan"
+    (orphan / "repo").mkdir(parents=True)
+    fresh = work_root / "worktree-fresh"
+    fresh.mkdir()
+    old = time.time() - 7200
+    os.utime(orphan, (old, old))
+    os.utime(owned.parent, (old, old))
+
+    out = pool.gc(max_age_s=3600, max_bytes=0)
+
+    assert out["removed"] == 1
+    assert not orphan.exists()
+    assert fresh.exists()
+    assert owned.exists()
+
+
+def test_gc_quota_never_removes_leased_dirs(tmp_repo: Path, work_root: Path):
+    _seed(tmp_repo)
+    pool = WorktreePool(size=0)
+    in_use = pool.checkout(tmp_repo)
+    building = new_workdir("worktree-")
+
+    # leased by another worker process
+    other = work_root / "worktree-other"
+    other.mkdir()
+    holder = subprocess.Popen(
+        [sys.executable, "-c", (
+            "import fcntl, os, sys\n"
+            f"fd = os.open({str(other / LEASE_NAME)!r}, os.O_RDWR | os.O_CREAT)\n"
+            "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+            "print('locked', flush=True)\n"
+            "sys.stdin.read()\n"
+        )],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        orphan = work_root / "worktree-orphan"
+        orphan.mkdir()
+        (orphan / LEASE_NAME).touch()
+        assert lease_state(other) == "held" and lease_state(orphan) == "free"
+
+        pool.gc(max_age_s=3600, max_bytes=1)
+
+        assert not orphan.exists()
+        assert in_use.exists() and building.exists() and other.exists()
+    finally:
+        holder.stdin.close()
+        holder.wait(timeout=10)
+        release_workdir(building)
+
+    assert lease_state(other) == "free"
+    pool.gc(max_age_s=3600, max_bytes=1)
+    assert not other.exists() and not building.exists()
+    assert in_use.exists()